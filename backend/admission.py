@@ -0,0 +1,182 @@
+# admission.py
+"""Admission control in front of the LLM provider.
+
+Token buckets for the instance's requests/minute and tokens/minute budget,
+plus a smaller requests/minute bucket per uid so one user can't take the
+whole budget. A call reserves from every bucket at once; if the buckets
+run dry, the reservation goes negative and the caller sleeps until its turn
+(first come, first served). If that sleep would go past the deadline, or
+the wait queue is full, the reservation is refunded and AdmissionRejected
+is raised immediately with a retry-after hint.
+
+    ticket = controller.admit(uid, est_tokens)   # may sleep or raise
+    ... call the model ...
+    ticket.settle(actual_tokens)                  # true up the token bucket
+
+A ticket taken ahead of time for a call that then never reached the
+provider (cache hit, coalesced, breaker open) is handed back with release().
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from metrics import observe, inc
+
+
+class AdmissionRejected(RuntimeError):
+    """Too busy to start this call within the deadline."""
+
+    def __init__(self, reason: str, retry_after_s: float):
+        super().__init__(f"{reason}; retry in ~{retry_after_s:.0f}s")
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_s: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_s)
+        self.level = self.capacity
+        self._t = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._t) * self.rate)
+        self._t = now
+
+    def reserve(self, n: float, now: float) -> float:
+        """Take n (may go negative); returns seconds until the debt is repaid."""
+        self._refill(now)
+        self.level -= n
+        return max(0.0, -self.level / self.rate)
+
+    def refund(self, n: float):
+        self.level = min(self.capacity, self.level + n)
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.level >= self.capacity
+
+
+class Ticket:
+    def __init__(self, controller: "AdmissionController", tokens: float, uid: Optional[str] = None):
+        self._controller = controller
+        self.tokens = tokens
+        self.uid = uid
+
+    def settle(self, actual_tokens: Optional[int]):
+        """Replace the token estimate with the call's real usage."""
+        if actual_tokens:
+            self._controller._adjust_tokens(actual_tokens - self.tokens)
+
+    def release(self):
+        """Refund the whole reservation: the call was never made."""
+        self._controller._release(self)
+
+
+class AdmissionController:
+    def __init__(self, rpm: float, tpm: float, user_share: float = 0.25, max_queue: int = 100,
+                 deadline_s: float = 10.0, burst_s: float = 10.0, max_users: int = 4096):
+        """rpm / tpm <= 0 disable that bucket; user_share <= 0 disables per-user limits."""
+        self._lock = threading.Lock()
+        self._rpm = TokenBucket(rpm, burst_s) if rpm > 0 else None
+        self._tpm = TokenBucket(tpm, burst_s) if tpm > 0 else None
+        self._user_rpm = rpm * user_share if rpm > 0 and user_share > 0 else 0
+        self._burst_s = burst_s
+        self._users: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.max_users = max_users
+        self.max_queue = max_queue
+        self.deadline_s = deadline_s
+        self._waiting = 0
+        self._counters = {"admitted": 0, "queued": 0, "rejected_deadline": 0, "rejected_queue_full": 0,
+                          "released": 0}
+
+    def _user_bucket(self, uid: str) -> TokenBucket:
+        bucket = self._users.get(uid)
+        if bucket is None:
+            bucket = self._users[uid] = TokenBucket(self._user_rpm, self._burst_s)
+            if len(self._users) > self.max_users:
+                # idle users' buckets are full again; forgetting them loses nothing
+                now = time.monotonic()
+                for key in [k for k, b in self._users.items() if k != uid and b.full(now)]:
+                    del self._users[key]
+        self._users.move_to_end(uid)
+        return bucket
+
+    def admit(self, uid: Optional[str], tokens: float, deadline_s: Optional[float] = None) -> Ticket:
+        deadline_s = self.deadline_s if deadline_s is None else deadline_s
+        now = time.monotonic()
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self._counters["rejected_queue_full"] += 1
+                inc("admission_rejected")
+                raise AdmissionRejected("LLM wait queue is full", self._burst_s)
+            taken = self._buckets(uid, tokens)
+            wait = max([bucket.reserve(n, now) for bucket, n in taken] or [0.0])
+            if wait > deadline_s:
+                for bucket, n in taken:
+                    bucket.refund(n)
+                self._counters["rejected_deadline"] += 1
+                inc("admission_rejected")
+                raise AdmissionRejected("LLM capacity exhausted", wait)
+            self._counters["admitted"] += 1
+            if wait > 0:
+                self._counters["queued"] += 1
+                self._waiting += 1
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+        observe("admission.wait", wait * 1000)
+        return Ticket(self, tokens, uid)
+
+    def try_admit(self, uid: Optional[str], tokens: float) -> Optional[Ticket]:
+        """A ticket if there is capacity right now, else None (nothing is
+        reserved or counted as rejected; call admit() to queue)."""
+        now = time.monotonic()
+        with self._lock:
+            taken = self._buckets(uid, tokens)
+            if max([bucket.reserve(n, now) for bucket, n in taken] or [0.0]) > 0:
+                for bucket, n in taken:
+                    bucket.refund(n)
+                return None
+            self._counters["admitted"] += 1
+        observe("admission.wait", 0.0)
+        return Ticket(self, tokens, uid)
+
+    def _buckets(self, uid: Optional[str], tokens: float) -> list:
+        # caller holds self._lock; (bucket, amount) pairs one call reserves
+        taken = []
+        if self._rpm:
+            taken.append((self._rpm, 1))
+        if self._tpm:
+            taken.append((self._tpm, tokens))
+        if self._user_rpm and uid:
+            taken.append((self._user_bucket(uid), 1))
+        return taken
+
+    def _adjust_tokens(self, delta: float):
+        if not self._tpm:
+            return
+        with self._lock:
+            if delta < 0:
+                self._tpm.refund(-delta)
+            else:
+                self._tpm.reserve(delta, time.monotonic())
+
+    def _release(self, ticket: Ticket):
+        with self._lock:
+            if self._rpm:
+                self._rpm.refund(1)
+            if self._tpm:
+                self._tpm.refund(ticket.tokens)
+            bucket = self._users.get(ticket.uid) if ticket.uid else None
+            if bucket is not None:
+                bucket.refund(1)
+            self._counters["released"] += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {**self._counters, "queue_depth": self._waiting, "users_tracked": len(self._users)}
@@ -0,0 +1,153 @@
+# autosave.py
+"""Debounced, coalescing autosave for versioned text.
+
+Each key (one per session + generation) holds at most one pending snapshot.
+submit() only replaces it, so rapid edits collapse into a single write. A
+background thread persists a key once it has been quiet for `window_s`, or
+`max_wait_s` after its oldest unsaved edit so a user who never pauses still
+gets saved. flush() persists immediately on the caller's thread.
+
+persist(snapshot, version, prev_text) receives the next version number and
+the text of the last persisted version. If it raises, the version is not
+consumed (the next save diffs against the last one that actually landed)
+and the snapshot is retried after another window.
+
+Keys idle for `idle_evict_s` are dropped, but a key that has saved versions
+keeps a small checkpoint (version, last text, last result) so an edit after
+the eviction continues the chain instead of starting over at version 1.
+Checkpoints are themselves bounded: at most `max_checkpoints` (least
+recently evicted go first), each kept for `checkpoint_ttl_s`.
+"""
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class _Entry:
+    def __init__(self, base_text: str):
+        self.lock = threading.Lock()   # serializes persist() per key
+        self.pending: Optional[dict] = None
+        self.coalesced = 0
+        self.first_pending_at = 0.0
+        self.last_submit_at = 0.0
+        self.version = 0
+        self.last_text = base_text
+        self.last_result: Any = None
+
+
+class AutosaveScheduler:
+    def __init__(self, persist: Callable[[dict, int, str], Any], window_s: float = 3.0,
+                 max_wait_s: float = 15.0, idle_evict_s: float = 3600.0,
+                 max_checkpoints: int = 4096, checkpoint_ttl_s: float = 86400.0):
+        self._persist = persist
+        self.window_s = window_s
+        self.max_wait_s = max_wait_s
+        self.idle_evict_s = idle_evict_s
+        self.max_checkpoints = max_checkpoints
+        self.checkpoint_ttl_s = checkpoint_ttl_s
+        self._entries: Dict[str, _Entry] = {}
+        # evicted key -> (version, last_text, last_result, evicted_at), oldest first
+        self._checkpoints: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._counters = {"submitted": 0, "persisted": 0, "failed": 0}
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush_all)
+
+    def submit(self, key: str, snapshot: dict, base_text: str = ""):
+        """Record the latest snapshot for `key`. `base_text` is what version 1
+        is diffed against (the draft) and is only used when the key is new."""
+        now = time.monotonic()
+        with self._cond:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(base_text)
+                if key in self._checkpoints:
+                    entry.version, entry.last_text, entry.last_result, _ = self._checkpoints.pop(key)
+            if entry.pending is None:
+                entry.first_pending_at = now
+                entry.coalesced = 0
+            entry.pending = snapshot
+            entry.coalesced += 1
+            entry.last_submit_at = now
+            self._counters["submitted"] += 1
+            self._cond.notify()
+
+    def flush(self, key: str) -> Any:
+        """Persist `key`'s pending snapshot now. Returns the latest persist()
+        result for the key (None if nothing was ever saved)."""
+        with self._cond:
+            entry = self._entries.get(key)
+            if entry is None:
+                checkpoint = self._checkpoints.get(key)
+                return checkpoint[2] if checkpoint else None
+        self._save(entry)
+        return entry.last_result
+
+    def flush_all(self):
+        with self._cond:
+            entries = list(self._entries.values())
+        for entry in entries:
+            self._save(entry)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            pending = sum(1 for e in self._entries.values() if e.pending is not None)
+            return {**self._counters, "keys": len(self._entries), "pending": pending,
+                    "checkpoints": len(self._checkpoints)}
+
+    def _save(self, entry: _Entry):
+        with entry.lock:
+            with self._cond:
+                snapshot, entry.pending = entry.pending, None
+                coalesced = entry.coalesced
+            if snapshot is None:
+                return
+            version = entry.version + 1
+            try:
+                result = self._persist({**snapshot, "coalesced_edits": coalesced}, version, entry.last_text)
+            except Exception as e:
+                print("Autosave failed:", e)
+                with self._cond:
+                    self._counters["failed"] += 1
+                    if entry.pending is None:
+                        # retry one window from now unless a newer edit arrived
+                        entry.pending = snapshot
+                        entry.first_pending_at = entry.last_submit_at = time.monotonic()
+                return
+            entry.version = version
+            entry.last_text = snapshot.get("text", "")
+            entry.last_result = result
+            with self._cond:
+                self._counters["persisted"] += 1
+
+    def _due(self, now: float) -> list:
+        # caller holds self._cond
+        due = []
+        for key, e in list(self._entries.items()):
+            if e.pending is None:
+                if now - e.last_submit_at > self.idle_evict_s and not e.lock.locked():
+                    if e.version:
+                        self._checkpoints[key] = (e.version, e.last_text, e.last_result, now)
+                    del self._entries[key]
+            elif now - e.last_submit_at >= self.window_s or now - e.first_pending_at >= self.max_wait_s:
+                due.append(e)
+        while self._checkpoints and (len(self._checkpoints) > self.max_checkpoints
+                                     or now - next(iter(self._checkpoints.values()))[3] > self.checkpoint_ttl_s):
+            self._checkpoints.popitem(last=False)
+        return due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = self._due(now)
+                if not due:
+                    waits = [min(e.last_submit_at + self.window_s, e.first_pending_at + self.max_wait_s) - now
+                             for e in self._entries.values() if e.pending is not None]
+                    self._cond.wait(timeout=max(min(waits), 0.01) if waits else None)
+                    continue
+            for entry in due:
+                self._save(entry)
@@ -0,0 +1,68 @@
+# benchmarks/cold_start.py
+"""Cold-start cost of the Firestore/Firebase setup, each sample in a fresh
+interpreter (like a new Cloud Run instance).
+
+  legacy  - what importing db_ops used to do: settings.get_db() style Admin
+            init + firestore.client(), a second firestore.Client(project=...),
+            and a third gcf.Client() just to print the project
+  shared  - import db_ops (now creates nothing) + firebase_init.get_firestore()
+
+Client construction needs credentials (ADC or the service-account file) but
+sends no requests.
+
+    python backend/benchmarks/cold_start.py --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+_LEGACY = """
+import time
+t0 = time.perf_counter()
+import firebase_admin
+from firebase_admin import firestore
+from google.cloud import firestore as gcf
+from settings import PROJECT_ID
+if not firebase_admin._apps:
+    firebase_admin.initialize_app(options={"projectId": PROJECT_ID})
+firestore.client()
+gcf.Client(project=PROJECT_ID)
+gcf.Client().project
+print((time.perf_counter() - t0) * 1000)
+"""
+
+_SHARED = """
+import time
+t0 = time.perf_counter()
+import db_ops
+import firebase_init
+firebase_init.get_firestore()
+print((time.perf_counter() - t0) * 1000)
+"""
+
+
+def _run(code: str) -> float:
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    result = {}
+    for name, code in (("legacy", _LEGACY), ("shared", _SHARED)):
+        samples = [_run(code) for _ in range(args.runs)]
+        result[name] = {"median_ms": round(statistics.median(samples), 1), "samples_ms": [round(s, 1) for s in samples]}
+    result["saved_ms"] = round(result["legacy"]["median_ms"] - result["shared"]["median_ms"], 1)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# benchmarks/load_test.py
+"""Multi-session load test of home.py, fully offline.
+
+Drives N concurrent Streamlit sessions with AppTest (one thread each).
+Every session runs: load -> paste resume/JD -> Generate -> k edits ->
+thumbs up/down. The LLM is the FAKE provider and storage is the memory (or
+SQLite) backend, so the run measures this instance's own overhead. Results
+are written as JSON so runs can be diffed:
+
+    python backend/benchmarks/load_test.py --sessions 20 --edits 5 --out load.json
+
+Each session signs in as its own dev user, so the per-user admission share
+(LLM_USER_SHARE) applies per session as it would in production. A rerun
+that shows the "try again" warning (admission control or the circuit
+breaker turned the draft away) counts as an error.
+
+Reported: rerun latency percentiles, storage operations per rerun, LLM
+calls per session, admission / breaker counters and peak RSS.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+# must be set before settings is imported (by us or by home.py)
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("LLM_PROVIDER", "FAKE")
+sys.path.insert(0, str(BACKEND))
+
+from streamlit.testing.v1 import AppTest
+
+import core_llm
+import db_ops
+import storage
+from settings import AUTOSAVE_WINDOW_S
+
+_RESUME = "Senior data analyst. Built dashboards, led A/B tests, shipped pricing models.\n" * 30
+_JD = "We are hiring a product analyst to own experimentation and metrics.\n" * 20
+# home.py's warnings when a draft is turned away (admission / breaker)
+_REJECTED = ("Please try again in about",)
+
+
+class CountingStorage(storage.Storage):
+    """Wraps the real backend and counts calls per operation."""
+
+    def __init__(self, inner: storage.Storage):
+        self.inner = inner
+        self.name = f"counting:{inner.name}"
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def _count(self, op: str, n: int = 1):
+        with self._lock:
+            self.counts[op] = self.counts.get(op, 0) + n
+
+    def new_id(self) -> str:
+        return self.inner.new_id()
+
+    async def set(self, path, data, merge=False):
+        self._count("set")
+        await self.inner.set(path, data, merge)
+
+    async def add(self, collection, data):
+        self._count("add")
+        return await self.inner.add(collection, data)
+
+    async def get(self, path):
+        self._count("get")
+        return await self.inner.get(path)
+
+    async def get_many(self, paths):
+        self._count("get_many")
+        return await self.inner.get_many(paths)
+
+    async def latest(self, collection, field, value, order_by):
+        self._count("latest")
+        return await self.inner.latest(collection, field, value, order_by)
+
+    async def commit(self, writes):
+        writes = list(writes)
+        self._count("commit")
+        self._count("commit_docs", len(writes))
+        await self.inner.commit(writes)
+
+
+def _percentiles(samples: list) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"p50_ms": round(pick(0.50), 1), "p95_ms": round(pick(0.95), 1),
+            "p99_ms": round(pick(0.99), 1), "max_ms": round(ordered[-1], 1), "n": len(ordered)}
+
+
+def _session(idx: int, edits: int, timeout: float, rerun_ms: list, errors: list, lock: threading.Lock):
+    rng = random.Random(idx)
+    local = []
+
+    def rerun(at):
+        t0 = time.perf_counter()
+        at.run(timeout=timeout)
+        local.append((time.perf_counter() - t0) * 1000)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        for warning in at.warning:
+            if any(marker in warning.value for marker in _REJECTED):
+                raise RuntimeError(f"rejected: {warning.value}")
+
+    try:
+        at = AppTest.from_file(str(BACKEND / "home.py"), default_timeout=timeout)
+        # one user per session, restored like a signed-in session
+        email = f"loadtest{idx}@example.com"
+        at.session_state["user"] = {"uid": db_ops.uid_from_email(email), "email": email}
+        rerun(at)
+        at.text_area(key="resume").input(_RESUME + f"session {idx}")
+        at.text_area(key="jd").input(_JD)
+        at.button(key="gen_btn").click()
+        rerun(at)
+        text = at.text_area(key="EDIT_DRAFT").value or ""
+        for k in range(edits):
+            text += f" edit {k}-{rng.randrange(1000)}"
+            at.text_area(key="EDIT_DRAFT").input(text)
+            rerun(at)
+        at.button(key=rng.choice(("thumbs_up", "thumbs_down"))).click()
+        rerun(at)
+    except Exception as e:
+        with lock:
+            errors.append(f"session {idx}: {type(e).__name__}: {e}")
+    with lock:
+        rerun_ms.extend(local)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sessions", type=int, default=10)
+    ap.add_argument("--edits", type=int, default=5)
+    ap.add_argument("--timeout", type=float, default=60.0, help="per-rerun timeout (s)")
+    ap.add_argument("--out", default="load_test.json")
+    args = ap.parse_args()
+
+    counting = CountingStorage(storage.get_storage())
+    storage._storage = counting
+
+    rerun_ms, errors, lock = [], [], threading.Lock()
+    threads = [threading.Thread(target=_session, args=(i, args.edits, args.timeout, rerun_ms, errors, lock))
+               for i in range(args.sessions)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall_s = time.perf_counter() - t0
+    # let debounced autosaves land so their writes are counted
+    time.sleep(AUTOSAVE_WINDOW_S + 0.5)
+    db_ops.flush_interactions()
+
+    storage_ops = sum(v for k, v in counting.counts.items() if k != "commit_docs")
+    result = {
+        "config": {
+            "sessions": args.sessions, "edits": args.edits,
+            "storage_backend": counting.inner.name, "llm_provider": core_llm.LLM_PROVIDER,
+        },
+        "wall_s": round(wall_s, 2),
+        "reruns": len(rerun_ms),
+        "rerun_latency": _percentiles(rerun_ms),
+        "storage_ops": counting.counts,
+        "storage_ops_per_rerun": round(storage_ops / len(rerun_ms), 2) if rerun_ms else None,
+        "llm_calls_per_session": round(core_llm.get_fake_llm().calls / args.sessions, 2),
+        "llm_cache": core_llm.cache_stats(),
+        "interaction_log": db_ops.interaction_log_stats(),
+        "admission": core_llm.admission_stats(),
+        "llm_breaker": core_llm.breaker_stats(),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "rejected_sessions": sum("rejected:" in e for e in errors),
+        "errors": errors,
+    }
+    Path(args.out).write_text(json.dumps(result, indent=2))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# benchmarks/micro.py
+"""Micro-benchmarks for the hot paths, with a stored baseline.
+
+    python backend/benchmarks/micro.py --save-baseline   # record baseline.json
+    python backend/benchmarks/micro.py                   # compare, exit 1 on regression
+    python backend/benchmarks/micro.py --threshold 10 --only levenshtein
+    python backend/benchmarks/micro.py --log-lines 100000,1000000,10000000
+
+Cases:
+  prompt.*      build_prompt_cover_letter / build_prompt_suggestion on large resumes
+  levenshtein.* edit distance as upsert_final_and_metric computes it, 1-20 KB letters
+  log.*         interaction-log doc serialization and enqueue cost
+  evaluate_logs.load  parsing synthetic JSON-lines logs
+
+Each case reports the best per-call time over several repeats (least
+noisy). A case regresses when it is more than --threshold percent slower
+than its baseline. The committed baseline.json was recorded on a 1-vCPU
+Linux box; timings are machine-specific, so re-run --save-baseline on the
+machine you compare on (e.g. before your change) and diff from there.
+
+The default log sizes stop at 10^6 lines: load_records keeps every record
+in memory (~650 MB at 10^6), so 10^7 needs ~7 GB and about a minute per
+repeat. Pass --log-lines 100000,1000000,10000000 to include it.
+"""
+import argparse
+import itertools
+import json
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from Levenshtein import distance as lev
+
+import core_llm
+import evaluate_logs
+from edit_distance import IncrementalDistance
+from interaction_logger import BatchedWriter
+
+BASELINE = Path(__file__).with_name("baseline.json")
+_WORDS = "led built shipped data team product customers impact growth metrics platform design".split()
+
+
+def _text(n_bytes: int, seed: int) -> str:
+    rng = random.Random(seed)
+    out, size = [], 0
+    while size < n_bytes:
+        w = rng.choice(_WORDS)
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)[:n_bytes]
+
+
+def _edit(text: str, fraction: float, seed: int) -> str:
+    rng = random.Random(seed)
+    chars = list(text)
+    for _ in range(max(1, int(len(chars) * fraction))):
+        i = rng.randrange(len(chars))
+        chars[i] = rng.choice("xyz ")
+    return "".join(chars)
+
+
+def _timeit(fn, repeat: int = 5, min_time: float = 0.05) -> float:
+    """Best per-call seconds; calls per repeat are scaled to fill min_time."""
+    t0 = time.perf_counter()
+    fn()
+    once = time.perf_counter() - t0
+    number = max(1, int(min_time / once)) if once > 0 else 1000
+    best = float("inf")
+    for _ in range(repeat if once < 1 else 1):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best
+
+
+def _prompt_case(builder, kb: int):
+    resume, jd = _text(kb * 1024, 1), _text(8 * 1024, 2)
+    args = dict(resume=resume, jd=jd, highlights="sql, experimentation", length_style="2-3 paragraphs",
+                format_style="Formal cover letter")
+    return lambda: builder(**args)
+
+
+def _lev_full_case(kb: int):
+    draft = _text(kb * 1024, 3)
+    final = _edit(draft, 0.05, 4)
+    return lambda: lev(draft, final)
+
+
+def _lev_incremental_case(kb: int):
+    draft = _text(kb * 1024, 3)
+    final = _edit(draft, 0.05, 4)
+    tracker = IncrementalDistance(draft)
+    tracker.update(final)
+    # alternate between two snapshots one small edit apart, as autosave sees them
+    snapshots = itertools.cycle([final[:-10] + "tweaked!!!", final]).__next__
+    return lambda: tracker.update(snapshots())
+
+
+def _log_doc() -> dict:
+    payload = {
+        "gen_id": "0" * 32, "gen_num": 3, "resume": _text(6 * 1024, 5), "job_description": _text(4 * 1024, 6),
+        "highlights": "sql, experimentation", "length_pref": "2-3 paragraphs", "format_choice": "Formal cover letter",
+        "model": "gemini-2.5-flash", "draft_text": _text(2 * 1024, 7), "suggestions_text": _text(3 * 1024, 8),
+        "timings_ms": {"draft": 2100.0, "suggestions": 3400.0, "wall": 3410.0},
+    }
+    return {"uid": "u" * 28, "user_email": "a@b.c", "session_id": "s" * 20, "event_type": "draft_generated",
+            "details": payload, "client_ts": datetime.utcnow()}
+
+
+def _log_serialize_case():
+    doc = _log_doc()
+    return lambda: json.dumps(doc, default=str)
+
+
+def _log_enqueue_case():
+    doc = _log_doc()
+    writer = BatchedWriter(lambda docs: None, max_queue=1_000_000, put_timeout_s=0)
+    return lambda: writer.submit(doc)
+
+
+def _evaluate_logs_case(n: int, tmp: Path):
+    path = tmp / f"logs_{n}.txt"
+    generation = json.dumps({"event": "generation", "prompt_snippet": "p" * 80, "response_snippet": "r" * 120})
+    with path.open("w", encoding="utf-8") as f:
+        for i in range(n):
+            if i % 3:
+                f.write(generation + "\n")
+            else:
+                f.write(json.dumps({"event": "feedback", "rating": "up" if i % 2 else "down"}) + "\n")
+    return lambda: evaluate_logs.load_records(path)
+
+
+def _cases(log_lines: list, tmp: Path):
+    """(name, setup) pairs; setup() builds the data and returns the timed callable."""
+    for kb in (50, 200):
+        yield f"prompt.cover_letter[{kb}KB]", lambda kb=kb: _prompt_case(core_llm.build_prompt_cover_letter, kb)
+        yield f"prompt.suggestion[{kb}KB]", lambda kb=kb: _prompt_case(core_llm.build_prompt_suggestion, kb)
+    for kb in (1, 5, 20):
+        yield f"levenshtein.full[{kb}KB]", lambda kb=kb: _lev_full_case(kb)
+        yield f"levenshtein.incremental[{kb}KB]", lambda kb=kb: _lev_incremental_case(kb)
+    yield "log.serialize[draft_generated]", _log_serialize_case
+    yield "log.enqueue", _log_enqueue_case
+    for n in log_lines:
+        yield f"evaluate_logs.load[{n}]", lambda n=n: _evaluate_logs_case(n, tmp)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--threshold", type=float, default=15.0, help="allowed slowdown in percent")
+    ap.add_argument("--only", default="", help="run cases whose name contains this")
+    ap.add_argument("--log-lines", default="100000,1000000", help="comma-separated synthetic log sizes")
+    args = ap.parse_args()
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    results, regressions = {}, []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, setup in _cases([int(n) for n in args.log_lines.split(",") if n], Path(tmp)):
+            if args.only not in name:
+                continue
+            results[name] = _timeit(setup())
+            base = baseline.get(name)
+            change = f"{(results[name] / base - 1) * 100:+6.1f}%" if base else "   new"
+            print(f"{name:<36} {results[name] * 1e6:>14.2f} us  {change}")
+            if base and results[name] > base * (1 + args.threshold / 100):
+                regressions.append(name)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({**baseline, **results}, indent=2, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return
+    if not baseline:
+        print("no baseline yet; run with --save-baseline first")
+    if regressions:
+        print(f"REGRESSION (> {args.threshold}% slower): " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/model_init.py
+"""Per-request Vertex setup cost: old path vs the shared model registry.
+
+The old generate_cover_letter ran vertexai.init() and built a fresh
+GenerativeModel on every call. core_llm.get_model() does that once per
+process. No request is sent to Gemini, so only setup overhead is measured.
+
+    python backend/benchmarks/model_init.py --iterations 200
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import vertexai
+from vertexai.generative_models import GenerativeModel
+
+import core_llm
+from settings import VERTEX_MODEL, VERTEX_REGION
+
+
+def _legacy_setup():
+    vertexai.init(location=VERTEX_REGION)
+    return GenerativeModel(VERTEX_MODEL)
+
+
+def _time_us(fn, iterations: int) -> list:
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return samples
+
+
+def _summary(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "mean_us": round(statistics.fmean(ordered), 2),
+        "p50_us": round(ordered[len(ordered) // 2], 2),
+        "p95_us": round(ordered[int(len(ordered) * 0.95) - 1], 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--iterations", type=int, default=200)
+    args = ap.parse_args()
+
+    core_llm.get_model()  # warm the registry, as the first request would
+    legacy = _summary(_time_us(_legacy_setup, args.iterations))
+    registry = _summary(_time_us(core_llm.get_model, args.iterations))
+    saved = legacy["mean_us"] - registry["mean_us"]
+    print(json.dumps({
+        "iterations": args.iterations,
+        "legacy_init_per_call": legacy,
+        "registry_lookup": registry,
+        "saved_per_request_us": round(saved, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
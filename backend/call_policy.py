@@ -0,0 +1,233 @@
+# call_policy.py
+"""Retries, fallback regions and hedging for one logical LLM call.
+
+    policy = CallPolicy(["us-central1", "us-east4"], attempt_timeout_s=60, max_attempts=3)
+    result, region = policy.run(lambda region: call_model(region, prompt))
+
+  - each attempt runs on a worker thread and gets its own deadline; an
+    attempt that misses it is abandoned (Python can't cancel the thread, so
+    its answer is simply dropped) and counts as a retryable failure
+  - retryable failures (429 / 5xx / timeouts) are retried after a jittered
+    exponential backoff ("full jitter": uniform(0, min(max, base * 2^n))),
+    each retry moving to the next region in the list
+  - with hedging on, an attempt still running after the recent p95 latency
+    gets a twin in the next region; whichever succeeds first wins. Hedges
+    are capped at max_hedge_ratio of calls so an overload can't double it,
+    and need two regions (with one, hedging is turned off at construction).
+  - with a circuit breaker, every attempt asks it first (BreakerOpen if it
+    says no) and reports how it went; client errors (non-retryable) count
+    as the provider answering
+  - run(fn, admit=...) charges admission control for every retry and hedge
+    (the first attempt is the caller's to admit): a retry may wait for
+    capacity within the call's deadline, a hedge is only sent if capacity
+    is there right away
+  - discard(result) receives what hedges that lost and abandoned attempts
+    return once they finish, e.g. to close a stream nobody will read
+"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from circuit_breaker import BreakerOpen, CircuitBreaker
+from metrics import inc
+
+# HTTP statuses worth another try (google.api_core exceptions and FakeLLMError carry .code)
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class AttemptTimeout(TimeoutError):
+    """One attempt ran past its deadline."""
+
+
+def is_retryable(e: BaseException) -> bool:
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(e, "code", None)
+    return isinstance(code, int) and code in RETRYABLE_CODES
+
+
+class LatencyWindow:
+    """Quantiles over the most recent successful latencies."""
+
+    def __init__(self, size: int = 200):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CallPolicy:
+    def __init__(self, regions: List[str], attempt_timeout_s: float = 60.0, max_attempts: int = 3,
+                 backoff_base_s: float = 0.5, backoff_max_s: float = 8.0, deadline_s: float = 0.0,
+                 hedge: bool = False, hedge_quantile: float = 0.95, hedge_min_samples: int = 20,
+                 max_hedge_ratio: float = 0.05, executor: Optional[ThreadPoolExecutor] = None,
+                 breaker: Optional[CircuitBreaker] = None, discard: Optional[Callable[[Any], None]] = None,
+                 name: str = "llm", seed: Optional[int] = None):
+        """deadline_s bounds the whole call across attempts (0 = attempts x timeout)."""
+        self.regions = list(regions)
+        self.attempt_timeout_s = attempt_timeout_s
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.deadline_s = deadline_s
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.breaker = breaker
+        if hedge and len(set(self.regions)) < 2:
+            # a twin in the same region only doubles the load on a slow region
+            print(f"{name}: hedging needs at least two regions; turning it off")
+            hedge = False
+        self.hedge = hedge
+        self.discard = discard
+        self.name = name
+        self.latency = LatencyWindow()
+        self._executor = executor or ThreadPoolExecutor(max_workers=16, thread_name_prefix=f"{name}-attempt")
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "attempts": 0, "retries": 0, "timeouts": 0, "failures": 0,
+                          "fallbacks": 0, "hedges": 0, "hedge_wins": 0, "hedges_refused": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+        inc(f"{self.name}_{name}")
+
+    def backoff_s(self, retry: int) -> float:
+        """Sleep before retry number `retry` (1-based)."""
+        with self._lock:
+            return self._rng.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** (retry - 1)))
+
+    def hedge_delay_s(self) -> Optional[float]:
+        """When to send a hedge, or None (off, still warming up, or over the hedge budget)."""
+        if not self.hedge:
+            return None
+        with self._lock:
+            if self._counters["hedges"] >= self.max_hedge_ratio * max(1, self._counters["calls"]):
+                return None
+        return self.latency.quantile(self.hedge_quantile, self.hedge_min_samples)
+
+    def run(self, fn: Callable[[str], Any], admit: Optional[Callable[[float], Any]] = None,
+            started_at: Optional[float] = None) -> Tuple[Any, str]:
+        """(fn(region)'s result, region that produced it). Raises the last
+        error once attempts, regions or the overall deadline run out.
+        admit(max_wait_s) runs before each retry and hedge; it may sleep up to
+        max_wait_s and raises to refuse (refused retries end the call).
+        started_at (time.monotonic()) is when the call began, so time already
+        spent on it (e.g. queued for admission) counts against the deadline."""
+        self._count("calls")
+        deadline = ((started_at if started_at is not None else time.monotonic())
+                    + (self.deadline_s or self.attempt_timeout_s * self.max_attempts))
+        for attempt in range(self.max_attempts):
+            region = self.regions[attempt % len(self.regions)]
+            if attempt:
+                self._count("fallbacks" if region != self.regions[0] else "retries")
+            if self.breaker is not None and not self.breaker.allow():
+                self._count("failures")
+                raise BreakerOpen(self.breaker.retry_after_s())
+            if attempt and admit is not None:
+                try:
+                    admit(max(0.0, deadline - time.monotonic()))
+                except Exception:
+                    self._count("failures")
+                    raise
+            try:
+                return self._attempt(fn, attempt, min(self.attempt_timeout_s, deadline - time.monotonic()), admit)
+            except Exception as e:
+                if not is_retryable(e) or attempt + 1 >= self.max_attempts:
+                    self._count("failures")
+                    raise
+                pause = self.backoff_s(attempt + 1)
+                if time.monotonic() + pause >= deadline:
+                    self._count("failures")
+                    raise
+                print(f"LLM attempt {attempt + 1} in {region} failed, retrying:", e)
+                time.sleep(pause)
+
+    def _attempt(self, fn: Callable[[str], Any], attempt: int, timeout_s: float,
+                 admit: Optional[Callable[[float], Any]] = None) -> Tuple[Any, str]:
+        t0 = time.monotonic()
+        deadline = t0 + max(0.0, timeout_s)
+        regions = [self.regions[(attempt + i) % len(self.regions)] for i in range(2)]
+        hedge_at = self.hedge_delay_s()
+        hedge_at = t0 + hedge_at if hedge_at is not None else None
+        self._count("attempts")
+        pending = {self._executor.submit(fn, regions[0]): regions[0]}
+        hedge, error = None, None
+        while pending:
+            now = time.monotonic()
+            until = deadline if hedge is not None or hedge_at is None else min(deadline, hedge_at)
+            done, _ = wait(pending, timeout=max(0.0, until - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                region = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self._report(not is_retryable(e), time.monotonic() - t0)
+                    error = e
+                    continue
+                self._report(True, time.monotonic() - t0)
+                self.latency.add(time.monotonic() - t0)
+                if future is hedge:
+                    self._count("hedge_wins")
+                self._drop(pending)
+                return result, region
+            if done:
+                continue
+            if time.monotonic() >= deadline:
+                self._count("timeouts")
+                self._report(False, time.monotonic() - t0)
+                self._drop(pending)
+                raise AttemptTimeout(f"LLM attempt exceeded {timeout_s:.1f}s")
+            if hedge is None:
+                # the first try is slower than usual: race it against a twin elsewhere
+                if admit is not None:
+                    try:
+                        admit(0.0)
+                    except Exception:
+                        # no spare capacity: a hedge would only add load
+                        self._count("hedges_refused")
+                        hedge_at = None
+                        continue
+                self._count("hedges")
+                hedge = self._executor.submit(fn, regions[1])
+                pending[hedge] = regions[1]
+        raise error
+
+    def _drop(self, pending: Dict):
+        """Hand the results of attempts nobody waits for any more to discard()."""
+        if self.discard is None:
+            return
+        for future in pending:
+            future.add_done_callback(self._discard_result)
+
+    def _discard_result(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        try:
+            self.discard(future.result())
+        except Exception as e:
+            print("Discarding an LLM attempt failed:", e)
+
+    def _report(self, ok: bool, seconds: float):
+        if self.breaker is not None:
+            self.breaker.record(ok, seconds)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            out = dict(self._counters)
+        p95 = self.latency.quantile(self.hedge_quantile)
+        out["p95_ms"] = round(p95 * 1000, 1) if p95 is not None else 0.0
+        return out
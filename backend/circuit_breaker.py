@@ -0,0 +1,172 @@
+# circuit_breaker.py
+"""Circuit breaker for the LLM provider.
+
+Every provider attempt reports its outcome: failed (error or timeout),
+slow (succeeded after slow_call_s) or fine. Over a rolling window_s, once
+at least min_calls attempts were made, the breaker opens if the failure
+rate reaches error_rate or the slow rate reaches slow_rate:
+
+    closed --(too many failures / slow calls)--> open
+    open   --(open_s elapsed)------------------> half_open
+    half_open: up to `probes` calls go through; that many successes close
+               it, any failure opens it again for another open_s
+
+While open, allow() returns False without touching the provider, so
+callers can answer right away (see core_llm's degraded responses) instead
+of waiting out a timeout on every click.
+
+    if not breaker.allow():
+        raise BreakerOpen(breaker.retry_after_s())
+    ... call ...; breaker.record(ok, seconds)
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from metrics import inc
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class BreakerOpen(RuntimeError):
+    """The provider is failing; the call was not attempted."""
+
+    def __init__(self, retry_after_s: float):
+        super().__init__(f"LLM provider unavailable; retry in ~{retry_after_s:.0f}s")
+        self.retry_after_s = retry_after_s
+
+
+class CircuitBreaker:
+    def __init__(self, window_s: float = 60.0, min_calls: int = 10, error_rate: float = 0.5,
+                 slow_call_s: float = 30.0, slow_rate: float = 0.8, open_s: float = 30.0, probes: int = 2,
+                 on_transition: Optional[Callable[[str, str, Dict], None]] = None):
+        """on_transition(old_state, new_state, details) runs outside the lock."""
+        self.window_s = window_s
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_s = slow_call_s
+        self.slow_rate = slow_rate
+        self.open_s = open_s
+        self.probes = max(1, probes)
+        self.on_transition = on_transition
+        self._lock = threading.Lock()
+        self._calls = deque()  # (t, failed, slow, seconds)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_out = 0
+        self._probe_successes = 0
+        self._counters = {"opened": 0, "rejected": 0, "probes": 0}
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def rejecting(self) -> bool:
+        """True (and counted as a rejection) while open and not yet due for a
+        probe; unlike allow() it never uses up a probe."""
+        with self._lock:
+            if self._state != OPEN or time.monotonic() - self._opened_at >= self.open_s:
+                return False
+            self._counters["rejected"] += 1
+        inc("llm_breaker_rejected")
+        return True
+
+    def retry_after_s(self) -> float:
+        with self._lock:
+            return max(1.0, self._opened_at + self.open_s - time.monotonic())
+
+    def allow(self) -> bool:
+        transition = None
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_s:
+                    self._counters["rejected"] += 1
+                    inc("llm_breaker_rejected")
+                    return False
+                transition = self._move(HALF_OPEN, "cool-down elapsed")
+            if self._state == HALF_OPEN:
+                if self._probes_out >= self.probes:
+                    self._counters["rejected"] += 1
+                    inc("llm_breaker_rejected")
+                    allowed = False
+                else:
+                    self._probes_out += 1
+                    self._counters["probes"] += 1
+                    allowed = True
+            else:
+                allowed = True
+        self._notify(transition)
+        return allowed
+
+    def record(self, ok: bool, seconds: float):
+        now = time.monotonic()
+        slow = ok and seconds >= self.slow_call_s
+        transition = None
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_out = max(0, self._probes_out - 1)
+                if not ok or slow:
+                    transition = self._move(OPEN, "probe failed" if not ok else "probe was slow")
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.probes:
+                        transition = self._move(CLOSED, "probes succeeded")
+            elif self._state == CLOSED:
+                self._calls.append((now, not ok, slow, seconds))
+                self._trim(now)
+                n = len(self._calls)
+                if n >= self.min_calls:
+                    failed = sum(c[1] for c in self._calls) / n
+                    slowed = sum(c[2] for c in self._calls) / n
+                    if failed >= self.error_rate:
+                        transition = self._move(OPEN, f"error rate {failed:.0%} over {n} calls")
+                    elif slowed >= self.slow_rate:
+                        transition = self._move(OPEN, f"slow-call rate {slowed:.0%} over {n} calls")
+            # results landing while open (hedges, abandoned attempts) change nothing
+        self._notify(transition)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            self._trim(time.monotonic())
+            n = len(self._calls)
+            latencies = sorted(c[3] for c in self._calls)
+            return {
+                **self._counters,
+                "state": {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[self._state],
+                "window_calls": n,
+                "error_rate": round(sum(c[1] for c in self._calls) / n, 3) if n else 0.0,
+                "slow_rate": round(sum(c[2] for c in self._calls) / n, 3) if n else 0.0,
+                "p95_ms": round(latencies[min(n - 1, int(0.95 * n))] * 1000, 1) if n else 0.0,
+            }
+
+    # --- callers hold self._lock ---
+    def _trim(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_s:
+            self._calls.popleft()
+
+    def _move(self, state: str, reason: str) -> tuple:
+        old, self._state = self._state, state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self._counters["opened"] += 1
+            inc("llm_breaker_opened")
+        n = len(self._calls)
+        details = {"reason": reason, "window_calls": n,
+                   "error_rate": round(sum(c[1] for c in self._calls) / n, 3) if n else 0.0}
+        if state in (HALF_OPEN, CLOSED):
+            self._probes_out = 0
+            self._probe_successes = 0
+        if state == CLOSED:
+            self._calls.clear()
+        return old, state, details
+
+    def _notify(self, transition: Optional[tuple]):
+        if transition is None:
+            return
+        print("LLM circuit breaker {} -> {}: {}".format(transition[0], transition[1], transition[2]["reason"]))
+        if self.on_transition is not None:
+            try:
+                self.on_transition(*transition)
+            except Exception as e:
+                print("Circuit breaker listener failed:", e)
@@ -0,0 +1,173 @@
+# context_cache.py
+"""Reuse of the resume + JD prompt prefix across calls (Vertex context caching).
+
+Every template starts with the same resume/JD block (prompts.INPUT_PREFIX),
+so the draft, the suggestions and each regeneration on unchanged inputs
+can point Gemini at one server-side cached copy instead of re-sending and
+re-processing it. ContextCacheManager does the bookkeeping:
+
+  - key = sha256(model, prefix); a prefix's second use within the TTL
+    starts the create on a background thread and calls after it lands use
+    the cache, so one-off prompts never pay for it and no request waits on
+    the create round-trip (timed as context_cache.create)
+  - entries expire after ttl_s (Vertex drops them server-side too) and the
+    least recently used are deleted beyond max_entries
+  - concurrent callers never wait on a create: they just go uncached
+
+The backend does the actual create/delete: VertexContextBackend, or
+LocalContextBackend for offline runs (FAKE provider), which only records
+what would have been cached.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from metrics import observe
+
+
+class LocalContextBackend:
+    """In-process stand-in: handles are names, contents kept for inspection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contents: Dict[str, str] = {}
+        self.creates = 0
+        self.deletes = 0
+
+    def create(self, model_name: str, prefix: str, ttl_s: float) -> str:
+        with self._lock:
+            self.creates += 1
+            name = f"local-cache-{self.creates}"
+            self.contents[name] = prefix
+        return name
+
+    def delete(self, handle: str):
+        with self._lock:
+            self.deletes += 1
+            self.contents.pop(handle, None)
+
+
+class VertexContextBackend:
+    """vertexai CachedContent; handles are CachedContent objects."""
+
+    def create(self, model_name: str, prefix: str, ttl_s: float):
+        # imported lazily, like the rest of the Vertex SDK (see core_llm.get_model)
+        from vertexai.preview import caching
+        return caching.CachedContent.create(
+            model_name=model_name, contents=[prefix], ttl=timedelta(seconds=ttl_s),
+        )
+
+    def delete(self, handle):
+        handle.delete()
+
+
+class ContextCacheManager:
+    def __init__(self, backend, ttl_s: float = 600.0, max_entries: int = 64):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (handle, expires_at); handle is None while its create is in flight
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._seen: Dict[str, float] = {}  # key -> first sighting, for second-use creation
+        self._counters = {"hits": 0, "misses": 0, "creates": 0, "create_failures": 0,
+                          "deletes": 0, "expirations": 0, "cached_tokens": 0}
+
+    @staticmethod
+    def key(model_name: str, prefix: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{prefix}".encode("utf-8")).hexdigest()
+
+    def lookup(self, model_name: str, prefix: str, prefix_tokens: int = 0) -> Optional[Any]:
+        """Handle for `prefix` if cached, else None (on its second use the
+        create starts in the background)."""
+        key = self.key(model_name, prefix)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] is None:
+                    self._counters["misses"] += 1
+                    return None
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                self._counters["cached_tokens"] += prefix_tokens
+                return entry[0]
+            self._counters["misses"] += 1
+            if key not in self._seen:
+                self._seen[key] = now
+                return None
+            self._entries[key] = (None, now + self.ttl_s)  # placeholder: others skip while we create
+        threading.Thread(target=self._create, args=(key, model_name, prefix),
+                         name="context-cache-create", daemon=True).start()
+        return None
+
+    def _create(self, key: str, model_name: str, prefix: str):
+        t0 = time.perf_counter()
+        try:
+            handle = self.backend.create(model_name, prefix, self.ttl_s)
+        except Exception as e:
+            print("Context cache create failed:", e)
+            with self._lock:
+                self._entries.pop(key, None)
+                self._counters["create_failures"] += 1
+            return
+        finally:
+            observe("context_cache.create", (time.perf_counter() - t0) * 1000)
+        with self._lock:
+            self._seen.pop(key, None)
+            # a little short of the server TTL so we never hand out a handle it just dropped
+            self._entries[key] = (handle, time.monotonic() + self.ttl_s * 0.95)
+            self._counters["creates"] += 1
+            evicted = self._evict()
+        self._delete(evicted)
+
+    def cleanup(self):
+        """Delete every cached prefix (process exit)."""
+        with self._lock:
+            handles = [h for h, _ in self._entries.values() if h is not None]
+            self._entries.clear()
+            self._seen.clear()
+        self._delete(handles, wait=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._counters, "entries": len(self._entries)}
+
+    # --- callers hold self._lock ---
+    def _expire(self, now: float):
+        for key in [k for k, (_, expires) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+            self._counters["expirations"] += 1
+        for key in [k for k, seen in self._seen.items() if now - seen > self.ttl_s]:
+            del self._seen[key]
+
+    def _evict(self) -> list:
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            handle, _ = self._entries.popitem(last=False)[1]
+            if handle is not None:
+                evicted.append(handle)
+        return evicted
+
+    def _delete(self, handles: list, wait: bool = False):
+        # storage is billed per hour, so evicted entries are deleted rather than
+        # left to expire; off the request path unless we're shutting down
+        def run():
+            for handle in handles:
+                try:
+                    self.backend.delete(handle)
+                except Exception as e:
+                    print("Context cache delete failed:", e)
+                    continue
+                with self._lock:
+                    self._counters["deletes"] += 1
+        if not handles:
+            return
+        if wait:
+            run()
+        else:
+            threading.Thread(target=run, name="context-cache-delete", daemon=True).start()
@@ -8,44 +8,291 @@ Original file is located at
 """
 
 # core_llm.py
-from typing import Optional, Dict, Any
-from settings import LLM_PROVIDER, VERTEX_MODEL, VERTEX_REGION
-from prompts import BASE_PROMPT, SUGGESTION_PROMPT
-import vertexai
-from settings import PROJECT_ID, VERTEX_REGION
-vertexai.init(project=PROJECT_ID, location=VERTEX_REGION)
-import vertexai
-from vertexai.generative_models import GenerativeModel
-        
+import atexit
+import hashlib
+import json
+import string
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import TYPE_CHECKING, Optional, Dict, Any, Iterator
+from settings import PROJECT_ID, LLM_PROVIDER, VERTEX_MODEL, VERTEX_REGION, LLM_MAX_WORKERS
+from settings import INPUT_COMPACTION, PROMPT_TOKEN_BUDGET_DRAFT, PROMPT_TOKEN_BUDGET_SUGGESTIONS
+from settings import LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL_S, LLM_CACHE_DB, LLM_CACHE_DB_MAX_ROWS
+from settings import (FAKE_LLM_LATENCY, FAKE_LLM_TAIL_PROB, FAKE_LLM_TAIL_MULT,
+                      FAKE_LLM_TOKENS_PER_S, FAKE_LLM_ERROR_RATE, FAKE_LLM_SEED, FAKE_LLM_BAD_JSON_RATE)
+from settings import GENERATION_MODE
+from settings import LLM_ROUTING, LLM_LIGHT_MODEL, LLM_LIGHT_MAX_INPUT_TOKENS
+from settings import (LLM_RPM, LLM_TPM, LLM_USER_SHARE, LLM_QUEUE_MAX, LLM_ADMISSION_DEADLINE_S,
+                      LLM_EXPECTED_OUTPUT_TOKENS)
+from settings import CONTEXT_CACHE, CONTEXT_CACHE_TTL_S, CONTEXT_CACHE_MAX_ENTRIES, CONTEXT_CACHE_MIN_TOKENS
+from settings import (LLM_MAX_ATTEMPTS, LLM_ATTEMPT_TIMEOUT_S, LLM_STREAM_FIRST_CHUNK_TIMEOUT_S, LLM_CALL_DEADLINE_S,
+                      LLM_BACKOFF_BASE_S, LLM_BACKOFF_MAX_S, LLM_FALLBACK_REGIONS, LLM_HEDGE, LLM_HEDGE_QUANTILE,
+                      LLM_HEDGE_MAX_RATIO)
+from settings import (LLM_BREAKER, LLM_BREAKER_WINDOW_S, LLM_BREAKER_MIN_CALLS, LLM_BREAKER_ERROR_RATE,
+                      LLM_BREAKER_SLOW_CALL_S, LLM_BREAKER_SLOW_RATE, LLM_BREAKER_OPEN_S, LLM_BREAKER_PROBES,
+                      LLM_DEGRADED_MODEL, LLM_DEGRADED_TIMEOUT_S, LLM_DEGRADED_MIN_CALLS)
+from prompts import BASE_PROMPT, SUGGESTION_PROMPT, COMBINED_PROMPT, COMBINED_RESPONSE_SCHEMA, PROMPT_VERSION
+from prompts import INPUTS_END
+from llm_cache import LLMCache, SQLiteTier, cache_key
+from fake_llm import FakeLLM
+from llm_usage import UsageAggregator, make_usage
+from input_compaction import compact, estimate_tokens
+from context_cache import ContextCacheManager, LocalContextBackend, VertexContextBackend
+from single_flight import SingleFlight
+from admission import AdmissionController, AdmissionRejected, Ticket
+from call_policy import AttemptTimeout, CallPolicy
+from circuit_breaker import CircuitBreaker, BreakerOpen
+from metrics import timed, observe, inc, register_collector
+
+if TYPE_CHECKING:
+    # annotations only; the SDK itself is imported lazily in get_model
+    from vertexai.generative_models import GenerativeModel
+
+# ---------- process-wide Vertex model registry ----------
+# Streamlit imports this module once per process, so these globals are shared
+# by every session. vertexai.init() runs once, for the primary region, and
+# never changes afterwards: fallback-region models get a full resource name,
+# which pins their location without touching the global SDK config that
+# context-cache creates and from_cached_content read on other threads.
+_vertex_lock = threading.Lock()
+_vertex_ready = False
+_models: Dict[tuple, Any] = {}
+
+def _config_key(generation_config: Optional[Dict[str, Any]]) -> str:
+    # configs can nest (response_schema), so key on canonical JSON
+    return json.dumps(generation_config or {}, sort_keys=True)
+
+def _model_resource(model_name: str, region: str) -> str:
+    if region == VERTEX_REGION or model_name.startswith("projects/"):
+        return model_name
+    return f"projects/{PROJECT_ID}/locations/{region}/publishers/google/models/{model_name}"
+
+def get_model(model_name: str = VERTEX_MODEL, region: str = VERTEX_REGION,
+              generation_config: Optional[Dict[str, Any]] = None) -> "GenerativeModel":
+    """Return the shared GenerativeModel for (model, region, generation config)."""
+    global _vertex_ready
+    key = (model_name, region, _config_key(generation_config))
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _vertex_lock:
+        model = _models.get(key)
+        if model is None:
+            # imported lazily: the Vertex SDK is slow to import and FAKE runs never need it
+            import vertexai
+            from vertexai.generative_models import GenerativeModel
+            if not _vertex_ready:
+                vertexai.init(project=PROJECT_ID, location=VERTEX_REGION)
+                _vertex_ready = True
+            model = GenerativeModel(_model_resource(model_name, region), generation_config=generation_config)
+            _models[key] = model
+    return model
+
+def _compacted(template: str, budget: int, resume: str, jd: str, report: Optional[Dict[str, Any]],
+               **fields) -> Dict[str, str]:
+    """resume/jd after input_compaction, sized so the whole prompt fits `budget`.
+    Fills `report` with tokens_before/after/saved, dropped sections, truncated."""
+    if not INPUT_COMPACTION:
+        return {"resume": resume, "jd": jd}
+    overhead = estimate_tokens(template.format(resume="", jd="", **fields))
+    out = compact(resume, jd, budget_tokens=budget, overhead_tokens=overhead)
+    inc("prompt_tokens_saved", out["tokens_saved"])
+    if report is not None:
+        report.update({k: v for k, v in out.items() if k not in ("resume", "jd")})
+    return {"resume": out["resume"], "jd": out["jd"]}
+
 def build_prompt_cover_letter(resume: str, jd: str, highlights: str,
-                 length_style: str, format_style: str, feedback: Optional[str] = None) -> str:
+                 length_style: str, format_style: str, feedback: Optional[str] = None,
+                 report: Optional[Dict[str, Any]] = None) -> str:
     # Exactly your placeholder keys from prompts.py
+    fields = dict(length_style=length_style, format_style=format_style, highlights=highlights)
     return BASE_PROMPT.format(
-        length_style=length_style,
-        format_style=format_style,
-        highlights=highlights,
-        resume=resume,
-        jd=jd,
+        **fields,
+        **_compacted(BASE_PROMPT, PROMPT_TOKEN_BUDGET_DRAFT, resume, jd, report, **fields),
     )
 
 def build_prompt_suggestion(resume: str, jd: str, highlights: str,
-                 length_style: str, format_style: str, feedback: Optional[str] = None) -> str:
+                 length_style: str, format_style: str, feedback: Optional[str] = None,
+                 report: Optional[Dict[str, Any]] = None) -> str:
     # Exactly your placeholder keys from prompts.py
+    fields = dict(length_style=length_style, format_style=format_style, highlights=highlights)
     return SUGGESTION_PROMPT.format(
-        length_style=length_style,
-        format_style=format_style,
-        highlights=highlights,
-        resume=resume,
-        jd=jd,
+        **fields,
+        **_compacted(SUGGESTION_PROMPT, PROMPT_TOKEN_BUDGET_SUGGESTIONS, resume, jd, report, **fields),
+    )
+
+# ---------- model routing ----------
+# (format_choice, length_pref, prompt size) -> model, output cap, temperature.
+# The first matching row wins; "*" matches anything, max_input_tokens 0 any
+# size, model None is VERTEX_MODEL and max_output_tokens 0 means no cap.
+# Gemini 2.5 Flash counts its thinking toward max_output_tokens, so its cap
+# is generous; Flash-Lite doesn't think unless asked to.
+ROUTES = [
+    # name, format_choice, length_pref, max_input_tokens, model, max_output_tokens, temperature
+    ("chat_short", "Short message in chat", "one-paragraph", LLM_LIGHT_MAX_INPUT_TOKENS, LLM_LIGHT_MODEL, 512, 0.7),
+    ("chat", "Short message in chat", "*", LLM_LIGHT_MAX_INPUT_TOKENS, LLM_LIGHT_MODEL, 1024, 0.7),
+    ("blurb_short", "blurb for referral", "one-paragraph", LLM_LIGHT_MAX_INPUT_TOKENS, LLM_LIGHT_MODEL, 512, 0.7),
+    ("blurb", "blurb for referral", "*", LLM_LIGHT_MAX_INPUT_TOKENS, LLM_LIGHT_MODEL, 1536, 0.7),
+    ("letter", "Formal cover letter", "*", 0, None, 8192, 0.6),
+    ("default", "*", "*", 0, None, 0, None),
+]
+
+def choose_route(format_style: str, length_style: str, prompt: str) -> Dict[str, Any]:
+    """{"name", "model", "max_output_tokens", "temperature"} for a draft prompt
+    (the "default" row for everything when LLM_ROUTING is off)."""
+    input_tokens = estimate_tokens(prompt)
+    for name, fmt, length, max_input, model, max_output, temperature in (ROUTES if LLM_ROUTING else ROUTES[-1:]):
+        if fmt in ("*", format_style) and length in ("*", length_style) and (not max_input or input_tokens <= max_input):
+            return {"name": name, "model": model, "max_output_tokens": max_output, "temperature": temperature}
+    raise ValueError("ROUTES has no catch-all row")
+
+def _routed(route: Optional[Dict[str, Any]], generation_config: Optional[Dict[str, Any]]) -> tuple:
+    """(model_name or None, generation config with the route's cap and temperature)."""
+    if not route:
+        return None, generation_config
+    config = dict(generation_config or {})
+    if route.get("max_output_tokens"):
+        config["max_output_tokens"] = route["max_output_tokens"]
+    if route.get("temperature") is not None:
+        config["temperature"] = route["temperature"]
+    return route.get("model"), config or None
+
+# ---------- prompt input dependencies ----------
+# Which inputs each output actually reads, taken from the template
+# placeholders. SUGGESTION_PROMPT only uses {resume} and {jd}, so changing
+# format/length/highlights leaves the suggestions valid.
+PROMPT_TEMPLATES = {"draft": BASE_PROMPT, "suggestions": SUGGESTION_PROMPT}
+
+def template_fields(template: str) -> frozenset:
+    return frozenset(f for _, f, _, _ in string.Formatter().parse(template) if f)
+
+PROMPT_DEPENDENCIES = {name: template_fields(t) for name, t in PROMPT_TEMPLATES.items()}
+
+def input_fingerprint(name: str, inputs: Dict[str, str]) -> str:
+    """Hash of just the inputs that output `name` depends on."""
+    h = hashlib.sha256(PROMPT_VERSION.encode())
+    for field in sorted(PROMPT_DEPENDENCIES[name]):
+        h.update(b"\0" + field.encode() + b"=" + (inputs.get(field) or "").encode("utf-8"))
+    return h.hexdigest()
+
+def stale_outputs(inputs: Dict[str, str], previous: Dict[str, str]) -> Dict[str, str]:
+    """Return {name: new_fingerprint} for outputs whose inputs changed since
+    `previous` (a {name: fingerprint} map from the last successful run)."""
+    stale = {}
+    for name in PROMPT_TEMPLATES:
+        fp = input_fingerprint(name, inputs)
+        if previous.get(name) != fp:
+            stale[name] = fp
+    return stale
+
+# ---------- offline provider ----------
+_fake_llm: Optional[FakeLLM] = None
+
+def get_fake_llm() -> FakeLLM:
+    global _fake_llm
+    if _fake_llm is None:
+        _fake_llm = FakeLLM(
+            latency=FAKE_LLM_LATENCY, tail_prob=FAKE_LLM_TAIL_PROB, tail_mult=FAKE_LLM_TAIL_MULT,
+            tokens_per_s=FAKE_LLM_TOKENS_PER_S, error_rate=FAKE_LLM_ERROR_RATE, seed=FAKE_LLM_SEED,
+            bad_json_rate=FAKE_LLM_BAD_JSON_RATE,
+        )
+    return _fake_llm
+
+def _model_name() -> str:
+    return get_fake_llm().model_name if LLM_PROVIDER == "FAKE" else VERTEX_MODEL
+
+def _region() -> str:
+    return "local" if LLM_PROVIDER == "FAKE" else VERTEX_REGION
+
+def _regions() -> list:
+    """The primary region, then LLM_FALLBACK_REGIONS (labels only for FAKE)."""
+    return list(dict.fromkeys([_region()] + LLM_FALLBACK_REGIONS))
+
+def _vertex_usage(response, usage: Dict[str, Any]):
+    """Copy token counts and finish reason from a Vertex response (or final stream chunk)."""
+    meta = getattr(response, "usage_metadata", None)
+    if meta is not None and getattr(meta, "total_token_count", 0):
+        usage["prompt_tokens"] = getattr(meta, "prompt_token_count", 0) or 0
+        usage["output_tokens"] = getattr(meta, "candidates_token_count", 0) or 0
+        usage["thinking_tokens"] = getattr(meta, "thoughts_token_count", 0) or 0
+        usage["context_cached_tokens"] = getattr(meta, "cached_content_token_count", 0) or 0
+    candidates = getattr(response, "candidates", None) or []
+    reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+    if reason:
+        usage["finish_reason"] = getattr(reason, "name", str(reason))
+
+def _finish_usage(raw: Dict[str, Any], t0: float) -> Dict[str, Any]:
+    return make_usage(
+        raw.get("model") or _model_name(), raw.get("region") or _region(),
+        prompt_tokens=raw.get("prompt_tokens", 0), output_tokens=raw.get("output_tokens", 0),
+        thinking_tokens=raw.get("thinking_tokens", 0), finish_reason=raw.get("finish_reason"),
+        latency_ms=round((time.perf_counter() - t0) * 1000, 1),
+        context_cached_tokens=raw.get("context_cached_tokens", 0),
     )
 
-def generate_cover_letter(prompt: str) -> str:
+# ---------- context cache for the resume/JD prefix ----------
+_context_cache = ContextCacheManager(
+    LocalContextBackend() if LLM_PROVIDER == "FAKE" else VertexContextBackend(),
+    ttl_s=CONTEXT_CACHE_TTL_S,
+    max_entries=CONTEXT_CACHE_MAX_ENTRIES,
+)
+atexit.register(_context_cache.cleanup)
+
+def context_cache_stats() -> Dict[str, int]:
+    """hits / misses / creates / create_failures / deletes / expirations / cached_tokens / entries"""
+    return _context_cache.stats()
+
+register_collector("context_cache", context_cache_stats)
+
+def _with_context_cache(prompt: str, region: Optional[str] = None, model_name: Optional[str] = None) -> tuple:
+    """(handle, rest_of_prompt, prefix_tokens) when the prompt's resume/JD
+    prefix is served from the context cache, else (None, prompt, 0). Cached
+    contents live in the primary region; other regions get the prompt inline."""
+    end = prompt.find(INPUTS_END)
+    if not CONTEXT_CACHE or end < 0 or (region or _region()) != _region():
+        return None, prompt, 0
+    end += len(INPUTS_END)
+    prefix_tokens = estimate_tokens(prompt[:end])
+    if prefix_tokens < CONTEXT_CACHE_MIN_TOKENS:
+        return None, prompt, 0
+    handle = _context_cache.lookup(model_name or _model_name(), prompt[:end], prefix_tokens)
+    if handle is None:
+        return None, prompt, 0
+    return handle, prompt[end:].lstrip("\n"), prefix_tokens
+
+def _vertex_model(handle, generation_config: Optional[Dict[str, Any]] = None, region: str = VERTEX_REGION,
+                  model_name: str = VERTEX_MODEL):
+    if handle is None:
+        return get_model(model_name, region=region, generation_config=generation_config)
+    from vertexai.generative_models import GenerativeModel
+    return GenerativeModel.from_cached_content(cached_content=handle, generation_config=generation_config)
+
+@timed("llm.provider_call")
+def _call_provider(prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                   region: Optional[str] = None, model_name: Optional[str] = None) -> Dict[str, Any]:
+    """One attempt in `region` (default: primary) on `model_name` (default:
+    VERTEX_MODEL). Returns {"text", "usage"} (see llm_usage.make_usage)."""
+    t0 = time.perf_counter()
+    region = region or _region()
 
     if LLM_PROVIDER == "VERTEX":
-        vertexai.init(location=VERTEX_REGION)  # project inferred from ADC
-        model = GenerativeModel(VERTEX_MODEL)
-        out = model.generate_content(prompt)
-        return (out.text or "").strip()
+        get_model()  # vertexai.init before any CachedContent call
+        handle, rest, _ = _with_context_cache(prompt, region, model_name)
+        model = _vertex_model(handle, generation_config, region, model_name or VERTEX_MODEL)
+        out = model.generate_content(rest)
+        raw = {"region": region, "model": model_name}
+        _vertex_usage(out, raw)
+        return {"text": (out.text or "").strip(), "usage": _finish_usage(raw, t0)}
+
+    if LLM_PROVIDER == "FAKE":
+        # the answer depends on the whole prompt; the cache only changes accounting
+        _, _, prefix_tokens = _with_context_cache(prompt, region, model_name)
+        config = generation_config or {}
+        raw = get_fake_llm().generate(prompt, response_schema=config.get("response_schema"),
+                                      max_output_tokens=config.get("max_output_tokens"))
+        raw.update(context_cached_tokens=prefix_tokens, region=region, model=model_name)
+        return {"text": raw["text"], "usage": _finish_usage(raw, t0)}
 
     # If you add openai to requirements later, you can enable this:
     # elif LLM_PROVIDER == "OPENAI":
@@ -57,6 +304,574 @@ def generate_cover_letter(prompt: str) -> str:
     #                   {"role":"user","content":prompt}],
     #         temperature=0.7,
     #     )
-    #     return resp.choices[0].message.content.strip()
+    #     return {"text": resp.choices[0].message.content.strip()}
     
     raise ValueError(f"Unsupported LLM_PROVIDER={LLM_PROVIDER}")
+
+def _stream_provider(prompt: str, raw_usage: Optional[Dict[str, Any]] = None, region: Optional[str] = None,
+                     model_name: Optional[str] = None,
+                     generation_config: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Yield text chunks; token counts / finish reason land in raw_usage at the end."""
+    raw_usage = {} if raw_usage is None else raw_usage
+    raw_usage["region"] = region = region or _region()
+    raw_usage["model"] = model_name
+    if LLM_PROVIDER == "FAKE":
+        fake = get_fake_llm()
+        _, _, prefix_tokens = _with_context_cache(prompt, region, model_name)
+        parts = []
+        for chunk in fake.stream(prompt, max_output_tokens=(generation_config or {}).get("max_output_tokens")):
+            parts.append(chunk)
+            yield chunk
+        text = "".join(parts)
+        raw_usage.update(prompt_tokens=fake.count_tokens(prompt), context_cached_tokens=prefix_tokens,
+                         output_tokens=fake.count_tokens(text),
+                         finish_reason="STOP" if text == fake.text_for(prompt) else "MAX_TOKENS")
+        return
+    if LLM_PROVIDER != "VERTEX":
+        raise ValueError(f"Unsupported LLM_PROVIDER={LLM_PROVIDER}")
+    get_model()
+    handle, rest, _ = _with_context_cache(prompt, region, model_name)
+    model = _vertex_model(handle, generation_config, region, model_name or VERTEX_MODEL)
+    responses = model.generate_content(rest, stream=True)
+    try:
+        for chunk in responses:
+            # usage_metadata is cumulative; the last chunk carries the totals
+            _vertex_usage(chunk, raw_usage)
+            try:
+                yield chunk.text
+            except ValueError:
+                # chunks carrying only finish_reason / safety info have no text part
+                continue
+    finally:
+        # closed early (lost hedge, reader gone): end the HTTP stream now, not at GC
+        close = getattr(responses, "close", None)
+        if close is not None:
+            close()
+
+# ---------- usage accounting ----------
+_usage = UsageAggregator()
+
+def record_usage(uid: Optional[str], usage: Optional[Dict[str, Any]]):
+    """Add one call's usage to the process-wide and per-user running totals."""
+    _usage.record(uid, usage)
+
+def usage_totals(uid: Optional[str] = None) -> Dict[str, float]:
+    return _usage.totals(uid)
+
+register_collector("llm_usage", usage_totals)
+
+
+# ---------- response cache ----------
+_cache = LLMCache(
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    max_bytes=LLM_CACHE_MAX_BYTES,
+    ttl_s=LLM_CACHE_TTL_S,
+    persistent=SQLiteTier(LLM_CACHE_DB, LLM_CACHE_TTL_S, LLM_CACHE_DB_MAX_ROWS) if LLM_CACHE_DB else None,
+)
+
+def _cache_key(prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+               model_name: Optional[str] = None) -> str:
+    model = (model_name or _model_name()) + (f"|{_config_key(generation_config)}" if generation_config else "")
+    return cache_key(prompt, model, PROMPT_VERSION)
+
+def cache_stats() -> Dict[str, int]:
+    """hits / misses / persistent_hits / evictions / expirations / entries / bytes"""
+    return _cache.stats()
+
+register_collector("llm_cache", cache_stats)
+
+# ---------- admission control ----------
+# Only calls that actually reach the provider are admitted: cache hits and
+# coalesced followers never queue.
+_admission = AdmissionController(
+    rpm=LLM_RPM, tpm=LLM_TPM, user_share=LLM_USER_SHARE,
+    max_queue=LLM_QUEUE_MAX, deadline_s=LLM_ADMISSION_DEADLINE_S,
+)
+
+def admission_stats() -> Dict[str, float]:
+    """admitted / queued / rejected_deadline / rejected_queue_full / queue_depth / users_tracked"""
+    return _admission.stats()
+
+register_collector("admission", admission_stats)
+
+def _admit(uid: Optional[str], prompt: str, deadline_s: Optional[float] = None):
+    """Wait for capacity (raises AdmissionRejected if it won't come in time).
+    Also passed to the call policies, which charge each retry and hedge."""
+    return _admission.admit(uid, _admission_tokens(prompt), deadline_s)
+
+def _admission_tokens(prompt: str) -> int:
+    return estimate_tokens(prompt) + LLM_EXPECTED_OUTPUT_TOKENS
+
+def _admitted_stream(key: str, prompt: str, raw_usage: Dict[str, Any], uid: Optional[str],
+                     model_name: Optional[str] = None,
+                     generation_config: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """The provider stream, retried/hedged up to its first chunk. While the
+    breaker is open it yields one degraded answer instead, with its
+    "degraded" kind and finished "usage" left in raw_usage."""
+    try:
+        _check_breaker()
+        started_at = time.monotonic()
+        ticket = _admit(uid, prompt)
+        (head, rest, usage), _ = _stream_policy.run(
+            lambda region: _open_stream(prompt, region, model_name, generation_config),
+            admit=lambda wait_s: _admit(uid, prompt, wait_s), started_at=started_at)
+    except BreakerOpen as e:
+        result = _degraded(key, prompt, generation_config, e, uid, model_name)
+        raw_usage.update(degraded=result["degraded"], usage=result["usage"])
+        yield result["text"]
+        return
+    if head:
+        yield head
+    # past the first chunk retries are over, but the call's deadline still holds
+    yield from (_within(rest, started_at + LLM_CALL_DEADLINE_S) if LLM_CALL_DEADLINE_S > 0 else rest)
+    raw_usage.update(usage)
+    ticket.settle(raw_usage.get("prompt_tokens", 0) + raw_usage.get("output_tokens", 0)
+                  + raw_usage.get("thinking_tokens", 0))
+
+def _open_stream(prompt: str, region: str, model_name: Optional[str] = None,
+                 generation_config: Optional[Dict[str, Any]] = None) -> tuple:
+    """(text up to the first non-blank chunk, rest of the stream, its raw usage)."""
+    usage, head = {}, []
+    chunks = _stream_provider(prompt, usage, region, model_name, generation_config)
+    for chunk in chunks:
+        head.append(chunk)
+        if chunk.strip():
+            break
+    return "".join(head), chunks, usage
+
+_STREAM_END = object()
+
+def _within(chunks: Iterator[str], deadline: float) -> Iterator[str]:
+    """`chunks`, each read on the attempt pool so a stream that stalls past
+    `deadline` (time.monotonic()) raises AttemptTimeout instead of hanging
+    the script thread. The stalled stream is closed once its read returns."""
+    try:
+        while True:
+            future = _attempt_executor.submit(next, chunks, _STREAM_END)
+            try:
+                chunk = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                future.add_done_callback(lambda _: chunks.close())
+                inc("llm_stream_stalled")
+                raise AttemptTimeout(f"LLM stream stalled past its {LLM_CALL_DEADLINE_S:.0f}s deadline")
+            if chunk is _STREAM_END:
+                return
+            yield chunk
+    except GeneratorExit:
+        chunks.close()  # reader went away between chunks
+        raise
+
+def _close_stream(opened: tuple):
+    # a hedge that lost or an attempt abandoned at its deadline: hang up on it
+    opened[1].close()
+
+# ---------- circuit breaker ----------
+def _log_breaker_transition(old: str, new: str, details: Dict[str, Any]):
+    # imported lazily: db_ops pulls in the storage backend, which offline tools don't need
+    from db_ops import log_interaction
+    log_interaction("system", "", "", "llm_breaker", {
+        "from": old, "to": new, **details, "provider": LLM_PROVIDER, "model": _model_name(),
+    })
+
+_breaker = CircuitBreaker(
+    window_s=LLM_BREAKER_WINDOW_S, min_calls=LLM_BREAKER_MIN_CALLS, error_rate=LLM_BREAKER_ERROR_RATE,
+    slow_call_s=LLM_BREAKER_SLOW_CALL_S, slow_rate=LLM_BREAKER_SLOW_RATE, open_s=LLM_BREAKER_OPEN_S,
+    probes=LLM_BREAKER_PROBES, on_transition=_log_breaker_transition,
+)
+
+# the degraded model runs on the same provider; when it fails too, stop
+# trying it so an outage answers "try again" without a wait per request
+_degraded_breaker = CircuitBreaker(
+    window_s=LLM_BREAKER_WINDOW_S, min_calls=LLM_DEGRADED_MIN_CALLS, error_rate=LLM_BREAKER_ERROR_RATE,
+    slow_call_s=LLM_DEGRADED_TIMEOUT_S, slow_rate=LLM_BREAKER_SLOW_RATE, open_s=LLM_BREAKER_OPEN_S, probes=1,
+)
+
+def breaker_stats() -> Dict[str, float]:
+    """state (0 closed, 1 half-open, 2 open) / opened / rejected / probes / window_calls /
+    error_rate / slow_rate / p95_ms, and the same prefixed degraded_ for the degraded model's"""
+    return {**_breaker.stats(), **{f"degraded_{k}": v for k, v in _degraded_breaker.stats().items()}}
+
+register_collector("llm_breaker", breaker_stats)
+
+def _check_breaker():
+    # before admission, so an open breaker answers without queueing
+    if LLM_BREAKER and _breaker.rejecting():
+        raise BreakerOpen(_breaker.retry_after_s())
+
+def _degraded(key: str, prompt: str, generation_config: Optional[Dict[str, Any]], error: BreakerOpen,
+              uid: Optional[str], model_name: Optional[str] = None) -> Dict[str, Any]:
+    """What to serve while the breaker is open: the cached answer (even for a
+    forced regeneration), else one quick try on LLM_DEGRADED_MODEL (unless
+    its own breaker is open). Re-raises `error` if neither works, for the
+    caller's "try again shortly" message. Degraded answers are never
+    written to the cache."""
+    text = _cache.get(key)
+    if text is not None:
+        inc("llm_degraded_cache")
+        return {"text": text, "cached": True, "coalesced": False, "degraded": "cache",
+                "usage": make_usage(model_name or _model_name(), _region(), cached=True)}
+    if LLM_DEGRADED_MODEL and _degraded_breaker.allow():
+        ticket = _admit(uid, prompt)
+        t0 = time.monotonic()
+        try:
+            future = _attempt_executor.submit(_call_provider, prompt, generation_config, None, LLM_DEGRADED_MODEL)
+            result = future.result(timeout=LLM_DEGRADED_TIMEOUT_S)
+        except Exception as e:
+            _degraded_breaker.record(False, time.monotonic() - t0)
+            ticket.release()
+            print("Degraded model failed:", e)
+        else:
+            _degraded_breaker.record(True, time.monotonic() - t0)
+            ticket.settle(result["usage"]["total_tokens"])
+            inc("llm_degraded_model")
+            return {**result, "cached": False, "coalesced": False, "degraded": "model"}
+    inc("llm_degraded_unavailable")
+    raise error
+
+# ---------- retries, fallback regions, hedging ----------
+# Attempts run on their own pool: generate() is itself called from _executor
+# threads, and an attempt abandoned at its deadline keeps its thread until
+# the provider answers.
+_attempt_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS * 4, thread_name_prefix="llm-attempt")
+_policy_args = dict(
+    max_attempts=LLM_MAX_ATTEMPTS, deadline_s=LLM_CALL_DEADLINE_S,
+    backoff_base_s=LLM_BACKOFF_BASE_S, backoff_max_s=LLM_BACKOFF_MAX_S,
+    hedge=LLM_HEDGE, hedge_quantile=LLM_HEDGE_QUANTILE, max_hedge_ratio=LLM_HEDGE_MAX_RATIO,
+    executor=_attempt_executor, breaker=_breaker if LLM_BREAKER else None,
+)
+_call_policy = CallPolicy(_regions(), attempt_timeout_s=LLM_ATTEMPT_TIMEOUT_S, name="llm", **_policy_args)
+# a stream's attempt ends at its first chunk: once text is on screen it can't be retried
+_stream_policy = CallPolicy(_regions(), attempt_timeout_s=LLM_STREAM_FIRST_CHUNK_TIMEOUT_S,
+                            discard=_close_stream, name="llm_stream", **_policy_args)
+
+def call_policy_stats() -> Dict[str, float]:
+    """calls / attempts / retries / fallbacks / timeouts / failures / hedges / hedge_wins /
+    hedges_refused / p95_ms,
+    prefixed generate_ and stream_"""
+    return {**{f"generate_{k}": v for k, v in _call_policy.stats().items()},
+            **{f"stream_{k}": v for k, v in _stream_policy.stats().items()}}
+
+register_collector("call_policy", call_policy_stats)
+
+
+# ---------- in-flight coalescing ----------
+# A double-clicked Generate or two tabs of one session ask for the same
+# prompt at the same time; the cache can't help until the first call lands,
+# so identical in-flight calls share one provider call instead.
+_flights = SingleFlight()
+
+def single_flight_stats() -> Dict[str, int]:
+    """leaders / coalesced / shared_errors / in_flight"""
+    return _flights.stats()
+
+register_collector("single_flight", single_flight_stats)
+
+def _from_cache(key: str, model_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    text = _cache.get(key)
+    if text is None:
+        return None
+    return {"text": text, "cached": True, "coalesced": False, "degraded": None,
+            "usage": make_usage(model_name or _model_name(), _region(), cached=True)}
+
+def _release(tickets: list):
+    # admission taken ahead of a call that never reached the provider
+    while tickets:
+        tickets.pop().release()
+
+def _coalesced(text: str, degraded: Optional[str] = None) -> Dict[str, Any]:
+    # the leader's call is accounted for once, on the leader's side
+    return {"text": text, "cached": False, "coalesced": True, "degraded": degraded, "usage": None}
+
+class _LeaderAbandoned(RuntimeError):
+    """The leading stream was dropped mid-way; followers make their own call."""
+
+def _follow(flight, prompt: str, force: bool, uid: Optional[str], raw_usage: Dict[str, Any],
+            route: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    try:
+        result = _flights.wait(flight)
+    except _LeaderAbandoned:
+        result = generate(prompt, force=force, uid=uid, route=route)
+    raw_usage["degraded"] = result.get("degraded")
+    yield result["text"]
+
+@timed("core_llm.generate")
+def generate(prompt: str, force: bool = False, generation_config: Optional[Dict[str, Any]] = None,
+             uid: Optional[str] = None, route: Optional[Dict[str, Any]] = None,
+             ticket: Optional[Ticket] = None, started_at: Optional[float] = None) -> Dict[str, Any]:
+    """Generate text for `prompt`, serving identical prompts from the cache.
+
+    Returns {"text", "cached", "coalesced", "degraded", "route", "usage"}.
+    `route` (see choose_route) picks the model, output cap and temperature;
+    without one the call uses VERTEX_MODEL as configured. force=True skips the
+    cache lookup (the fresh answer still replaces the cached one). A call
+    made while an identical one is in flight waits for and shares its result
+    (or error); it comes back with coalesced=True and usage=None. Calls
+    that reach the provider go through admission control for `uid` and may
+    queue briefly or raise AdmissionRejected; the provider call itself is
+    retried, moved to fallback regions and hedged per call_policy. While the
+    circuit breaker is open the answer is degraded ("cache" or "model", see
+    _degraded) or BreakerOpen is raised. `ticket` is admission already
+    granted (see submit_generation; released if no provider call is made)
+    and `started_at` the time.monotonic() the call began: time since then
+    comes off both the admission wait (LLM_ADMISSION_DEADLINE_S) and
+    LLM_CALL_DEADLINE_S.
+    """
+    route_name = route["name"] if route else "default"
+    model_name, generation_config = _routed(route, generation_config)
+    key = _cache_key(prompt, generation_config, model_name)
+    admitted = [ticket] if ticket is not None else []
+    if not force:
+        result = _from_cache(key, model_name)
+        if result is not None:
+            _release(admitted)
+            return {**result, "route": route_name}
+
+    def call():
+        held = admitted.pop() if admitted else None
+        try:
+            _check_breaker()
+            begun = started_at if started_at is not None else time.monotonic()
+            held = held or _admit(uid, prompt, max(0.0, LLM_ADMISSION_DEADLINE_S - (time.monotonic() - begun)))
+            result, _ = _call_policy.run(
+                lambda region: _call_provider(prompt, generation_config, region, model_name),
+                admit=lambda wait_s: _admit(uid, prompt, wait_s), started_at=begun)
+        except BreakerOpen as e:
+            if held is not None:
+                held.release()
+            return _degraded(key, prompt, generation_config, e, uid, model_name)
+        held.settle(result["usage"]["total_tokens"])
+        _cache.put(key, result["text"])
+        return {**result, "cached": False, "coalesced": False, "degraded": None}
+
+    while True:
+        try:
+            result, shared = _flights.do(key, call)
+            break
+        except _LeaderAbandoned:
+            continue  # only followers see this; the next attempt leads or joins a live call
+        except Exception:
+            _release(admitted)
+            raise
+    _release(admitted)  # a follower: the identical in-flight call was admitted instead
+    if shared:
+        return {**_coalesced(result["text"], result["degraded"]), "route": route_name}
+    return {**result, "route": route_name}
+
+@timed("core_llm.generate_cover_letter")
+def generate_cover_letter(prompt: str, force: bool = False, uid: Optional[str] = None) -> str:
+    return generate(prompt, force=force, uid=uid)["text"]
+
+def stream_cover_letter(prompt: str, stats: Optional[Dict[str, Any]] = None, force: bool = False,
+                        uid: Optional[str] = None, route: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Yield text chunks as Gemini produces them (works for any prompt), on
+    the model / output cap / temperature of `route` (see choose_route).
+
+    Pass a dict as `stats` to receive ttft_ms (time to first chunk),
+    latency_ms, cached, coalesced, degraded, route and usage once the stream
+    is exhausted.
+    A cache hit, or a stream that joined an identical in-flight call, is
+    yielded as a single chunk. Joined chunks equal what
+    generate_cover_letter would return, minus the final strip().
+    """
+    t0 = time.perf_counter()
+    model_name, generation_config = _routed(route, None)
+    key = _cache_key(prompt, generation_config, model_name)
+    cached = None if force else _cache.get(key)
+    raw_usage = {}
+    flight, leader = (None, False) if cached is not None else _flights.begin(key)
+    if cached is not None:
+        chunks = [cached]
+    elif leader:
+        chunks = _admitted_stream(key, prompt, raw_usage, uid, model_name, generation_config)
+    else:
+        chunks = _follow(flight, prompt, force, uid, raw_usage, route)
+    parts = []
+    done = False
+    try:
+        for text in chunks:
+            if not parts:
+                text = text.lstrip()
+                if not text:
+                    continue
+                ttft_ms = (time.perf_counter() - t0) * 1000
+                observe("core_llm.stream_cover_letter.ttft", ttft_ms)
+                if stats is not None:
+                    stats["ttft_ms"] = round(ttft_ms, 1)
+            parts.append(text)
+            yield text
+        done = True
+    except Exception as e:
+        observe("core_llm.stream_cover_letter", (time.perf_counter() - t0) * 1000, error=True)
+        if leader:
+            _flights.end(key, flight, error=e)
+            leader = False
+        raise
+    finally:
+        # stream abandoned mid-way (e.g. Streamlit stopped the script): release followers
+        if leader and not done:
+            _flights.end(key, flight, error=_LeaderAbandoned("leading stream was abandoned"))
+    text = "".join(parts).strip()
+    if leader:
+        if not raw_usage.get("degraded"):
+            _cache.put(key, text)
+        _flights.end(key, flight, result={"text": text, "degraded": raw_usage.get("degraded")})
+    latency_ms = (time.perf_counter() - t0) * 1000
+    observe("core_llm.stream_cover_letter", latency_ms)
+    if stats is not None:
+        stats["latency_ms"] = round(latency_ms, 1)
+        stats["cached"] = cached is not None
+        stats["coalesced"] = flight is not None and not leader
+        stats["degraded"] = raw_usage.get("degraded")
+        stats["route"] = route["name"] if route else "default"
+        if cached is not None:
+            stats["usage"] = make_usage(model_name or _model_name(), _region(), cached=True)
+        elif "usage" in raw_usage:
+            stats["usage"] = raw_usage["usage"]  # degraded answer, accounted for already
+        else:
+            stats["usage"] = _finish_usage(raw_usage, t0) if leader else None
+
+
+# ---------- concurrent generation ----------
+# One pool per process, shared by every Streamlit session. Gemini calls are
+# network-bound, so threads give real overlap without any asyncio plumbing.
+_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="llm")
+
+def _failed_generation(route: Optional[Dict[str, Any]], e: Exception) -> Dict[str, Any]:
+    result = {"text": "", "cached": False, "coalesced": False, "degraded": None,
+              "route": route["name"] if route else "default", "usage": None,
+              "error": f"{type(e).__name__}: {e}"}
+    if isinstance(e, (AdmissionRejected, BreakerOpen)):
+        result["retry_after_s"] = e.retry_after_s
+        result["provider_unavailable"] = isinstance(e, BreakerOpen)
+    return result
+
+def _timed_generate(prompt: str, force: bool = False, uid: Optional[str] = None,
+                    route: Optional[Dict[str, Any]] = None, ticket: Optional[Ticket] = None,
+                    started_at: Optional[float] = None) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    try:
+        result = generate(prompt, force=force, uid=uid, route=route, ticket=ticket, started_at=started_at)
+        result["error"] = None
+    except Exception as e:
+        result = _failed_generation(route, e)
+    result["latency_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return result
+
+def submit_generation(prompt: str, force: bool = False, uid: Optional[str] = None,
+                      route: Optional[Dict[str, Any]] = None) -> Future:
+    """Start a generation in the background. The future never raises; it
+    resolves to the generate() dict plus "error" and "latency_ms" (and
+    "retry_after_s" if admission control or the circuit breaker turned it
+    away; "provider_unavailable" tells the two apart).
+
+    Cache hits are answered here. If admission is free right now it is
+    taken here, so the common case never queues on a pool thread; a call
+    that has to queue does so on the worker, never on the calling (script)
+    thread, with its admission deadline and LLM_CALL_DEADLINE_S counted
+    from submission."""
+    t0 = time.perf_counter()
+    started_at = time.monotonic()
+    model_name, config = _routed(route, None)
+    key = _cache_key(prompt, config, model_name)
+    cached = None if force else _from_cache(key, model_name)
+    if cached is not None:
+        future = Future()
+        future.set_result({**cached, "route": route["name"] if route else "default", "error": None,
+                           "latency_ms": round((time.perf_counter() - t0) * 1000, 1)})
+        return future
+    ticket = _admission.try_admit(uid, _admission_tokens(prompt))
+    # force=True: the cache was just checked
+    return _executor.submit(_timed_generate, prompt, True, uid, route, ticket, started_at)
+
+def generate_concurrently(prompts: Dict[str, str], force: bool = False, uid: Optional[str] = None,
+                          routes: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """Fire all prompts at once and wait for every result (`routes` maps
+    prompt names to choose_route() results; the rest use the default).
+
+    Each call fails independently, so one broken prompt never hides the
+    others; check result["error"] per key. Wall-clock time is roughly the
+    slowest call rather than the sum.
+    """
+    routes = routes or {}
+    futures = {name: submit_generation(p, force, uid, routes.get(name)) for name, p in prompts.items()}
+    return {name: f.result() for name, f in futures.items()}
+
+
+# ---------- combined draft + suggestions ----------
+COMBINED_CONFIG = {"response_mime_type": "application/json", "response_schema": COMBINED_RESPONSE_SCHEMA}
+
+def generation_mode(uid: Optional[str] = None) -> str:
+    """"combined" or "two_call" per GENERATION_MODE; "ab" splits users by uid hash."""
+    if GENERATION_MODE == "ab":
+        digest = hashlib.sha256((uid or "").encode()).digest()
+        return "combined" if digest[0] % 2 else "two_call"
+    return "combined" if GENERATION_MODE == "combined" else "two_call"
+
+def build_prompt_combined(resume: str, jd: str, highlights: str,
+                          length_style: str, format_style: str, feedback: Optional[str] = None,
+                          report: Optional[Dict[str, Any]] = None) -> str:
+    fields = dict(length_style=length_style, format_style=format_style, highlights=highlights)
+    budget = max(PROMPT_TOKEN_BUDGET_DRAFT, PROMPT_TOKEN_BUDGET_SUGGESTIONS)
+    return COMBINED_PROMPT.format(**fields, **_compacted(COMBINED_PROMPT, budget, resume, jd, report, **fields))
+
+def parse_combined(text: str) -> Dict[str, str]:
+    """{"draft", "suggestions"} from a combined answer; ValueError if unusable."""
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("combined answer is not a JSON object")
+    out = {}
+    for field in COMBINED_RESPONSE_SCHEMA["required"]:
+        value = data.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"combined answer has no usable {field!r}")
+        out[field] = value.strip()
+    return out
+
+@timed("core_llm.generate_combined")
+def generate_combined(inputs: Dict[str, str], force: bool = False,
+                      report: Optional[Dict[str, Any]] = None, uid: Optional[str] = None) -> Dict[str, Any]:
+    """Draft and suggestions from one JSON-mode call, or from the two-call
+    path if that call fails or its JSON doesn't validate.
+
+    Returns {"mode": "combined" | "two_call", "fallback_reason", "usage",
+    "draft", "suggestions"}; draft/suggestions are shaped like
+    submit_generation results. "usage" is the combined call's (it is paid
+    for even when we fall back); after a fallback each part has its own.
+    The combined call also writes the suggestions, so it stays on the
+    default route; after a fallback the draft is routed like a streamed one.
+    Pass a dict as `report` for the combined prompt's compaction report.
+    """
+    t0 = time.perf_counter()
+    prompt = build_prompt_combined(**inputs, report=report)
+    usage, reason = None, None
+    try:
+        res = generate(prompt, force=force, generation_config=COMBINED_CONFIG, uid=uid)
+        usage = res["usage"]
+        parts = parse_combined(res["text"])
+    except (AdmissionRejected, BreakerOpen) as e:
+        # two more calls would only be turned away too
+        failed = {"text": "", "cached": False, "coalesced": False, "degraded": None, "route": "default",
+                  "usage": None, "error": f"{type(e).__name__}: {e}", "retry_after_s": e.retry_after_s,
+                  "provider_unavailable": isinstance(e, BreakerOpen),
+                  "latency_ms": round((time.perf_counter() - t0) * 1000, 1)}
+        return {"mode": "combined", "fallback_reason": None, "usage": None,
+                "draft": failed, "suggestions": dict(failed)}
+    except Exception as e:
+        reason = f"{type(e).__name__}: {e}"
+        print("Combined generation failed, using two calls:", reason)
+    else:
+        latency_ms = round((time.perf_counter() - t0) * 1000, 1)
+        return {
+            "mode": "combined", "fallback_reason": None, "usage": usage,
+            **{name: {"text": text, "cached": res["cached"], "degraded": res["degraded"], "route": res["route"],
+                      "usage": None, "error": None, "latency_ms": latency_ms} for name, text in parts.items()},
+        }
+    # don't serve an unusable answer from the cache next time
+    _cache.discard(_cache_key(prompt, COMBINED_CONFIG))
+    draft_prompt = build_prompt_cover_letter(**inputs)
+    results = generate_concurrently({
+        "draft": draft_prompt,
+        "suggestions": build_prompt_suggestion(**inputs),
+    }, force=force, uid=uid,
+        routes={"draft": choose_route(inputs["format_style"], inputs["length_style"], draft_prompt)})
+    return {"mode": "two_call", "fallback_reason": reason, "usage": usage, **results}
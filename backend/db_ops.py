@@ -8,120 +8,143 @@ Original file is located at
 """
 
 # db_ops.py
+"""Sync data-layer API used by home.py.
+
+Each function is a thin wrapper that runs its db_ops_async counterpart on
+the shared Firestore event loop. start_session / submit_feedback batch the
+independent writes of a page load / thumbs click into one round-trip.
+"""
 from datetime import datetime
 from typing import Optional, Dict, Any
 import hashlib
 
-from firebase_admin import firestore
-from google.cloud import firestore as gcf
-from Levenshtein import distance as lev
-import firebase_init 
-from settings import get_db
-_db = get_db()
-
-import os
-from google.cloud import firestore
-
-import firebase_admin
-from firebase_admin import credentials, firestore
-
-_PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")# or "hallowed-cortex-474405-b4"
-_db = firestore.Client(project="genie-hi-front")
-
-if not firebase_admin._apps:
-    # Use default creds, but pin project to the same one:
-    firebase_admin.initialize_app(options={
-        "projectId": "genie-hi-front"
-    })
-
-try:
-    from google.cloud import firestore as gcf
-    _tmp_client = gcf.Client()
-    print("DEBUG Firestore project =", _tmp_client.project)
-except Exception as e:
-    print("DEBUG Firestore project lookup failed:", e)
+import db_ops_async as aio
+from storage import SERVER_TIMESTAMP
+from settings import LOG_QUEUE_MAX, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL_S, LOG_PUT_TIMEOUT_S
+from interaction_logger import BatchedWriter
+from metrics import timed, register_collector
 
 def uid_from_email(email: str) -> str:
     return hashlib.sha1((email or "anon@example.com").strip().lower().encode()).hexdigest()
 
+@timed("db_ops.ensure_user_profile")
 def ensure_user_profile(uid: str, email: str):
-    _db.collection("users").document(uid).set(
-        {"email": email, "created_at": firestore.SERVER_TIMESTAMP}, merge=True
-    )
+    aio.run(aio.ensure_user_profile(uid, email))
 
+@timed("db_ops.create_session")
 def create_session(uid: str, resume_text: str, jd_text: str,
                    tone_pref: str="", length_pref: str="", highlights: str="",
                    model: str="llm", prompt_version: str="p1.0") -> str:
-    ref = _db.collection("users").document(uid).collection("sessions").document()
-    ref.set({
-        "resume_raw": resume_text,
-        "jd_raw": jd_text,
-        "tone_pref": tone_pref,
-        "length_pref": length_pref,
-        "highlights": highlights,
-        "model": model,
-        "prompt_version": prompt_version,
-        "created_at": datetime.utcnow(),
-    })
-    return ref.id
+    return aio.run(aio.create_session(uid, resume_text, jd_text, tone_pref, length_pref,
+                                      highlights, model, prompt_version))
 
+@timed("db_ops.start_session")
+def start_session(uid: str, email: str, **session_fields) -> str:
+    """ensure_user_profile + create_session concurrently; returns the session id."""
+    return aio.run(aio.start_session(uid, email, **session_fields))
+
+@timed("db_ops.save_letter")
 def save_letter(uid: str, session_id: str, text: str, kind: str):
-    assert kind.startswith("edit_v") or kind in ("draft", "final", "suggestions")
-    _db.collection("users").document(uid).collection("sessions").document(session_id) \
-      .collection("letters").add({"type": kind, "text": text, "created_at": datetime.utcnow()})
+    aio.run(aio.save_letter(uid, session_id, text, kind))
 
-def get_latest_draft(uid: str, session_id: str) -> Optional[str]:
-    docs = _db.collection("users").document(uid).collection("sessions").document(session_id) \
-        .collection("letters").where("type","==","draft") \
-        .order_by("created_at", direction=gcf.Query.DESCENDING).limit(1).get()
-    return docs[0].to_dict().get("text") if docs else None
-
-def upsert_final_and_metric(uid: str, session_id: str, final_text: str) -> float:
-    draft_text = get_latest_draft(uid, session_id) or ""
-    d = float(lev(draft_text, final_text or ""))
-
-    # single latest-final doc
-    _db.collection("users").document(uid).collection("sessions").document(session_id) \
-      .collection("letters").document("latest_final").set({
-        "type": "final",
-        "text": final_text or "",
-        "created_at": datetime.utcnow()
-      })
-
-    # metric trail
-    _db.collection("users").document(uid).collection("sessions").document(session_id) \
-      .collection("metrics").add({
-        "name": "edit_distance", "value": d, "created_at": datetime.utcnow()
-      })
-    return d
+@timed("db_ops.save_edit_version")
+def save_edit_version(uid: str, session_id: str, gen_id: str, version: int,
+                      text: str, prev_text: str, force_full: bool = False) -> Dict[str, Any]:
+    """See db_ops_async.save_edit_version."""
+    return aio.run(aio.save_edit_version(uid, session_id, gen_id, version, text, prev_text, force_full))
 
-def save_feedback(uid: str, user_email: str, session_id: str, thumb: int, reason: str=""):
-    _db.collection("users").document(uid).collection("sessions").document(session_id) \
-      .collection("feedback").add({"thumb": int(thumb), "reason": reason, "created_at": datetime.utcnow()})
+@timed("db_ops.get_edit_version")
+def get_edit_version(uid: str, session_id: str, gen_id: str, version: int) -> Optional[str]:
+    """Rebuild the full text of an edit version (None if a version is missing)."""
+    return aio.run(aio.get_edit_version(uid, session_id, gen_id, version))
 
-def promote_exemplar(uid: str, final_text: str):
-    _db.collection("users").document(uid).collection("exemplars").add({
-        "text": final_text or "", "approved_at": datetime.utcnow()
-    })
+@timed("db_ops.get_latest_draft")
+def get_latest_draft(uid: str, session_id: str) -> Optional[str]:
+    return aio.run(aio.get_latest_draft(uid, session_id))
+
+@timed("db_ops.upsert_final_and_metric")
+def upsert_final_and_metric(uid: str, session_id: str, final_text: str,
+                            draft_text: Optional[str] = None) -> float:
+    """See db_ops_async.upsert_final_and_metric."""
+    return aio.run(aio.upsert_final_and_metric(uid, session_id, final_text, draft_text))
+
+@timed("db_ops.persist_edit_snapshot")
+def persist_edit_snapshot(snapshot: Dict[str, Any], version: int, prev_text: str) -> Dict[str, Any]:
+    """Autosave one coalesced edit: edit version + latest final/metric + log.
+
+    Used as the AutosaveScheduler persist callback, so it runs off the
+    Streamlit thread. Raises only if the edit version itself failed to save.
+    """
+    uid, sid, gen_id, text = snapshot["uid"], snapshot["sid"], snapshot["gen_id"], snapshot["text"]
+    saved = aio.run(aio.persist_edit_snapshot(snapshot, version, prev_text))
+    record = saved["record"]
+    try:
+        log_interaction(uid, snapshot.get("user_email", ""), sid, "edit_version", {
+            "gen_id": gen_id,
+            "gen_num": snapshot.get("gen_num"),
+            "version": version,
+            "timestamp": snapshot.get("timestamp"),
+            "coalesced_edits": snapshot.get("coalesced_edits", 1),
+            "encoding": record["encoding"],
+            # full text only on keyframes; rebuild others with get_edit_version
+            **({"edited_text": record["text"]} if record["encoding"] == "full" else {"delta": record["delta"]}),
+        })
+    except Exception as e:
+        print("Logging edit_version failed:", e)
+    return {"text": text, "version": version, "edit_distance": saved["edit_distance"]}
+
+@timed("db_ops.save_feedback")
+def save_feedback(uid: str, user_email: str, session_id: str, thumb: int, reason: str=""):
+    aio.run(aio.save_feedback(uid, user_email, session_id, thumb, reason))
 
+@timed("db_ops.submit_feedback")
+def submit_feedback(uid: str, user_email: str, session_id: str, thumb: int, reason: str = "",
+                    final_text: Optional[str] = None, draft_text: Optional[str] = None) -> Optional[float]:
+    """save_feedback + upsert_final_and_metric concurrently; returns the edit distance."""
+    return aio.run(aio.submit_feedback(uid, user_email, session_id, thumb, reason, final_text, draft_text))
 
-def log_interaction(uid: str, user_email: str,session_id: str, event_type: str, payload: dict):
+@timed("db_ops.promote_exemplar")
+def promote_exemplar(uid: str, final_text: str):
+    aio.run(aio.promote_exemplar(uid, final_text))
+
+
+@timed("db_ops.commit_interaction_batch")
+def _commit_interaction_batch(docs: list):
+    aio.run(aio.commit_interaction_batch(docs))
+
+# analytics writes happen on a background thread, never on the rerun
+_interaction_logger = BatchedWriter(
+    _commit_interaction_batch,
+    max_queue=LOG_QUEUE_MAX,
+    batch_size=LOG_BATCH_SIZE,
+    flush_interval_s=LOG_FLUSH_INTERVAL_S,
+    put_timeout_s=LOG_PUT_TIMEOUT_S,
+)
+register_collector("interaction_log", lambda: _interaction_logger.stats())
+
+@timed("db_ops.log_interaction")
+def log_interaction(uid: str, user_email: str,session_id: str, event_type: str, payload: dict) -> bool:
+    """Queue an interaction event; returns False if the queue was full and it was dropped."""
     doc = {
         "uid": uid,
         "user_email": user_email,
         "session_id": session_id,
         "event_type": event_type,
         "details": payload,
-        "ts": firestore.SERVER_TIMESTAMP,
+        "client_ts": datetime.utcnow(),  # event time; ts is set when the batch lands
+        "ts": SERVER_TIMESTAMP,
     }
     # single canonical collection name
-    return _db.collection("interaction_logs").add(doc)
+    return _interaction_logger.submit(doc)
+
+def flush_interactions(timeout: float = 5.0) -> bool:
+    return _interaction_logger.flush(timeout)
 
+def interaction_log_stats() -> Dict[str, float]:
+    """enqueued / written / dropped / failed / batches / queue_depth / latency"""
+    return _interaction_logger.stats()
+
+@timed("db_ops.log_sign_in")
 def log_sign_in(uid):
-    """Log a successful sign-in event to Firestore."""
-    db = firestore.client()
-    db.collection("user_signin_logs").add({
-        "uid": uid,
-        "timestamp": firestore.SERVER_TIMESTAMP,
-        "event": "sign_in"
-    })
+    """Log a successful sign-in event."""
+    aio.run(aio.log_sign_in(uid))
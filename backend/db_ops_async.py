@@ -0,0 +1,252 @@
+# db_ops_async.py
+"""Async data layer over the configured storage backend (see storage.py).
+
+Same operations as db_ops, as coroutines, so independent writes can share
+one round-trip via asyncio.gather (see start_session / submit_feedback).
+Firestore's AsyncClient gRPC channel is bound to the loop it was created
+on, so every coroutine here runs on one background event loop; run() and
+submit() hand work to it from sync code (Streamlit script thread, autosave
+and logger threads). db_ops wraps these for its sync API.
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Optional, Dict, Any, Coroutine
+
+from storage import get_storage as _store, SERVER_TIMESTAMP
+from settings import EDIT_KEYFRAME_INTERVAL, EDIT_DISTANCE_CUTOFF
+from edit_distance import IncrementalDistance
+from text_delta import make_delta, apply_delta
+
+# ---------- background event loop ----------
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="db-async", daemon=True).start()
+                _loop = loop
+    return _loop
+
+def submit(coro: Coroutine) -> Future:
+    """Schedule a coroutine on the data-layer loop; returns a concurrent Future."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+def run(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the data-layer loop and block for its result."""
+    return submit(coro).result(timeout)
+
+def _session(uid: str, session_id: str) -> str:
+    return f"users/{uid}/sessions/{session_id}"
+
+# ---------- profile / session ----------
+async def ensure_user_profile(uid: str, email: str):
+    await _store().set(
+        f"users/{uid}", {"email": email, "created_at": SERVER_TIMESTAMP}, merge=True
+    )
+
+async def create_session(uid: str, resume_text: str, jd_text: str,
+                         tone_pref: str="", length_pref: str="", highlights: str="",
+                         model: str="llm", prompt_version: str="p1.0") -> str:
+    return await _store().add(f"users/{uid}/sessions", {
+        "resume_raw": resume_text,
+        "jd_raw": jd_text,
+        "tone_pref": tone_pref,
+        "length_pref": length_pref,
+        "highlights": highlights,
+        "model": model,
+        "prompt_version": prompt_version,
+        "created_at": datetime.utcnow(),
+    })
+
+async def start_session(uid: str, email: str, **session_fields) -> str:
+    """Page load: profile upsert and new session in parallel. Returns the session id."""
+    _, sid = await asyncio.gather(
+        ensure_user_profile(uid, email),
+        create_session(uid, session_fields.pop("resume_text", ""), session_fields.pop("jd_text", ""), **session_fields),
+    )
+    return sid
+
+# ---------- letters ----------
+async def save_letter(uid: str, session_id: str, text: str, kind: str):
+    assert kind.startswith("edit_v") or kind in ("draft", "final", "suggestions")
+    letters = f"{_session(uid, session_id)}/letters"
+    if kind != "draft":
+        await _store().add(letters, {"type": kind, "text": text, "created_at": datetime.utcnow()})
+        return
+    # drafts also refresh the latest_draft pointer (read by id, no query/index)
+    # and the in-process cache used by upsert_final_and_metric
+    now = datetime.utcnow()
+    await _store().commit([
+        (f"{letters}/{_store().new_id()}", {"type": "draft", "text": text, "created_at": now}),
+        (f"{letters}/latest_draft", {"type": "latest_draft", "text": text, "created_at": now}),
+    ])
+    _remember_draft(uid, session_id, text)
+
+def _edit_doc_id(gen_id: str, version: int) -> str:
+    return f"{gen_id}_edit_v{version}"
+
+async def save_edit_version(uid: str, session_id: str, gen_id: str, version: int,
+                            text: str, prev_text: str, force_full: bool = False) -> Dict[str, Any]:
+    """Store edit `version` of generation `gen_id` as a delta against `prev_text`
+    (the text of version-1). Every EDIT_KEYFRAME_INTERVAL versions, starting
+    at v1, the full text is stored instead so reconstruction stays short.
+    Pass force_full=True if the previous version failed to save.
+    Returns the stored fields ({"encoding", and "delta" or "text"})."""
+    keyframe = force_full or (version - 1) % EDIT_KEYFRAME_INTERVAL == 0
+    delta = None if keyframe else make_delta(prev_text or "", text or "")
+    if delta is None or len(delta) >= len(text or ""):
+        body = {"encoding": "full", "text": text or ""}
+    else:
+        body = {"encoding": "delta", "delta": delta}
+    await _store().set(f"{_session(uid, session_id)}/letters/{_edit_doc_id(gen_id, version)}", {
+        "type": f"edit_v{version}", "gen_id": gen_id, "version": version,
+        **body, "created_at": datetime.utcnow(),
+    })
+    return body
+
+async def get_edit_version(uid: str, session_id: str, gen_id: str, version: int) -> Optional[str]:
+    """Rebuild the full text of an edit version from its nearest keyframe.
+    Returns None if a needed version is missing."""
+    letters = f"{_session(uid, session_id)}/letters"
+    first = version - (version - 1) % EDIT_KEYFRAME_INTERVAL
+    found = await _store().get_many([f"{letters}/{_edit_doc_id(gen_id, v)}" for v in range(first, version + 1)])
+    docs = {path.rsplit("/", 1)[1]: doc for path, doc in found.items()}
+
+    # walk back to the closest full snapshot (forced keyframes can sit mid-window)
+    start = version
+    while start >= first:
+        doc = docs.get(_edit_doc_id(gen_id, start))
+        if doc is None:
+            return None
+        if doc.get("encoding", "full") == "full":
+            break
+        start -= 1
+    else:
+        return None
+
+    text = docs[_edit_doc_id(gen_id, start)].get("text", "")
+    for v in range(start + 1, version + 1):
+        doc = docs[_edit_doc_id(gen_id, v)]
+        text = doc.get("text", "") if doc.get("encoding") == "full" else apply_delta(text, doc["delta"])
+    return text
+
+# ---------- session-scoped draft cache ----------
+# (uid, sid) -> IncrementalDistance against that session's latest draft.
+# Lets autosave skip the draft lookup and reuse the previous snapshot's
+# distance; bounded so long-lived instances don't grow without limit.
+_draft_lock = threading.Lock()
+_draft_trackers: "OrderedDict[tuple, IncrementalDistance]" = OrderedDict()
+_DRAFT_CACHE_MAX = 4096
+
+def _remember_draft(uid: str, session_id: str, draft_text: str) -> IncrementalDistance:
+    tracker = IncrementalDistance(draft_text, cutoff=EDIT_DISTANCE_CUTOFF)
+    with _draft_lock:
+        _draft_trackers[(uid, session_id)] = tracker
+        _draft_trackers.move_to_end((uid, session_id))
+        while len(_draft_trackers) > _DRAFT_CACHE_MAX:
+            _draft_trackers.popitem(last=False)
+    return tracker
+
+async def _draft_tracker(uid: str, session_id: str, draft_text: Optional[str] = None) -> IncrementalDistance:
+    with _draft_lock:
+        tracker = _draft_trackers.get((uid, session_id))
+    if tracker is not None and (draft_text is None or tracker.reference == draft_text):
+        return tracker
+    if draft_text is None:
+        draft_text = await get_latest_draft(uid, session_id) or ""
+    return _remember_draft(uid, session_id, draft_text)
+
+async def get_latest_draft(uid: str, session_id: str) -> Optional[str]:
+    letters = f"{_session(uid, session_id)}/letters"
+    pointer = await _store().get(f"{letters}/latest_draft")
+    if pointer is not None:
+        return pointer.get("text")
+    # sessions written before the pointer existed
+    doc = await _store().latest(letters, "type", "draft", order_by="created_at")
+    return doc.get("text") if doc else None
+
+async def upsert_final_and_metric(uid: str, session_id: str, final_text: str,
+                                  draft_text: Optional[str] = None, metric_id: Optional[str] = None) -> float:
+    """Save the latest final and record its edit distance from the draft.
+    Pass draft_text when the caller already has it (skips any lookup), and
+    metric_id to make a retried write replace its metric doc instead of
+    adding a second one. Distances above EDIT_DISTANCE_CUTOFF are stored as
+    cutoff + 1, capped=True."""
+    tracker = await _draft_tracker(uid, session_id, draft_text)
+    # CPU-bound on long texts; keep it off the shared event-loop thread
+    d = await asyncio.to_thread(tracker.update, final_text or "")
+    session = _session(uid, session_id)
+    await _store().commit([
+        # single latest-final doc
+        (f"{session}/letters/latest_final", {
+            "type": "final",
+            "text": final_text or "",
+            "created_at": datetime.utcnow()
+        }),
+        # metric trail
+        (f"{session}/metrics/{metric_id or _store().new_id()}", {
+            "name": "edit_distance", "value": float(d), "similarity": round(tracker.similarity(d), 4),
+            "capped": tracker.capped(d), "created_at": datetime.utcnow()
+        }),
+    ])
+    return float(d)
+
+async def persist_edit_snapshot(snapshot: Dict[str, Any], version: int, prev_text: str) -> Dict[str, Any]:
+    """Edit version and latest final/metric for one autosave, written in
+    parallel. Raises only if the edit version failed; a failed metric comes
+    back as edit_distance=None. The metric doc is keyed by gen_id and
+    version, so the autosave retry after a failed edit version overwrites it
+    rather than counting the snapshot twice."""
+    uid, sid, text = snapshot["uid"], snapshot["sid"], snapshot["text"]
+    record, edit_distance = await asyncio.gather(
+        save_edit_version(uid, sid, snapshot["gen_id"], version, text, prev_text),
+        upsert_final_and_metric(uid, sid, text, metric_id=f"{snapshot['gen_id']}_v{version}"),
+        return_exceptions=True,
+    )
+    if isinstance(record, BaseException):
+        raise record
+    if isinstance(edit_distance, BaseException):
+        print("Autosave (upsert_final_and_metric) failed:", edit_distance)
+        edit_distance = None
+    return {"record": record, "edit_distance": edit_distance}
+
+# ---------- feedback / exemplars ----------
+async def save_feedback(uid: str, user_email: str, session_id: str, thumb: int, reason: str=""):
+    await _store().add(
+        f"{_session(uid, session_id)}/feedback",
+        {"thumb": int(thumb), "reason": reason, "created_at": datetime.utcnow()},
+    )
+
+async def submit_feedback(uid: str, user_email: str, session_id: str, thumb: int, reason: str = "",
+                          final_text: Optional[str] = None, draft_text: Optional[str] = None) -> Optional[float]:
+    """Thumbs click: save the final (if given) and the feedback in one
+    round-trip. Returns the edit distance, or None if no final was saved."""
+    jobs = [save_feedback(uid, user_email, session_id, thumb, reason)]
+    if final_text:
+        jobs.append(upsert_final_and_metric(uid, session_id, final_text, draft_text))
+    results = await asyncio.gather(*jobs)
+    return results[1] if final_text else None
+
+async def promote_exemplar(uid: str, final_text: str):
+    await _store().add(f"users/{uid}/exemplars", {
+        "text": final_text or "", "approved_at": datetime.utcnow()
+    })
+
+# ---------- logs ----------
+async def commit_interaction_batch(docs: list):
+    store = _store()
+    await store.commit((f"interaction_logs/{store.new_id()}", doc) for doc in docs)
+
+async def log_sign_in(uid):
+    await _store().add("user_signin_logs", {
+        "uid": uid,
+        "timestamp": SERVER_TIMESTAMP,
+        "event": "sign_in"
+    })
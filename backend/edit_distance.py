@@ -0,0 +1,96 @@
+# edit_distance.py
+"""Edit-distance helpers for the draft -> final quality metric.
+
+Full Levenshtein is O(n*m). These helpers keep autosave cheap on long
+letters: common prefix/suffix are trimmed first, an optional cutoff turns
+the computation into a banded one (results above it come back as
+cutoff + 1), and IncrementalDistance uses the previous snapshot's distance
+to bound the next one.
+"""
+import threading
+from typing import Optional, Tuple
+from Levenshtein import distance as lev
+
+
+def _common_prefix(a: str, b: str) -> int:
+    # binary search over slice comparisons: O(n log n) but at memcmp speed
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _trim(a: str, b: str) -> Tuple[str, str]:
+    start = _common_prefix(a, b)
+    a, b = a[start:], b[start:]
+    end = _common_prefix(a[::-1], b[::-1])
+    return a[:len(a) - end], b[:len(b) - end]
+
+
+def changed_span(a: str, b: str) -> int:
+    """Upper bound on distance(a, b): the size of the differing middle."""
+    a, b = _trim(a, b)
+    return max(len(a), len(b))
+
+
+def bounded_distance(a: str, b: str, cutoff: Optional[int] = None, hint: Optional[int] = None) -> int:
+    """Levenshtein distance, or cutoff + 1 as soon as it must exceed cutoff.
+    `hint` is an expected distance that lets the banded search start narrow."""
+    if cutoff is not None and abs(len(a) - len(b)) > cutoff:
+        return cutoff + 1
+    # Levenshtein trims the common prefix/suffix itself
+    return lev(a, b, score_cutoff=cutoff, score_hint=hint)
+
+
+def similarity(a: str, b: str, cutoff: Optional[int] = None) -> float:
+    """1.0 for identical texts, 0.0 for completely different ones."""
+    longest = max(len(a), len(b))
+    if not longest:
+        return 1.0
+    return max(0.0, 1.0 - bounded_distance(a, b, cutoff) / longest)
+
+
+class IncrementalDistance:
+    """Distance from a fixed reference text (the draft) to a series of
+    snapshots of the same document.
+
+    Consecutive snapshots usually differ by a small edit, and by the
+    triangle inequality distance(ref, new) <= distance(ref, prev) + changed
+    span(prev, new). That bound becomes the band limit, so each update costs
+    roughly O(len * edit) rather than O(len^2), and an unchanged snapshot
+    costs O(len).
+    """
+
+    def __init__(self, reference: str, cutoff: Optional[int] = None):
+        self.reference = reference or ""
+        self.cutoff = cutoff
+        self._last_text: Optional[str] = None
+        self._last_distance = 0
+        self._lock = threading.Lock()  # updates may come from worker threads
+
+    def update(self, text: str) -> int:
+        text = text or ""
+        with self._lock:
+            if self._last_text is None:
+                d = bounded_distance(self.reference, text, self.cutoff)
+            else:
+                step = changed_span(self._last_text, text)
+                if step == 0:
+                    return self._last_distance
+                limit = self._last_distance + step
+                if self.cutoff is not None:
+                    limit = min(limit, self.cutoff)
+                d = bounded_distance(self.reference, text, limit, hint=self._last_distance)
+            self._last_text, self._last_distance = text, d
+        return d
+
+    def capped(self, d: int) -> bool:
+        return self.cutoff is not None and d > self.cutoff
+
+    def similarity(self, d: int) -> float:
+        longest = max(len(self.reference), len(self._last_text or ""))
+        return max(0.0, 1.0 - d / longest) if longest else 1.0
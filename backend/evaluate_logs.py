@@ -8,56 +8,199 @@ Original file is located at
 """
 
 import json
+import sys
 from pathlib import Path
 from collections import Counter
 
-log_path = Path("logs.txt")
-
-if not log_path.exists():
-    print("No logs.txt found. Run the app and generate a few letters first.")
-    exit()
-
-# Load JSON lines
-records = []
-for line in log_path.read_text().splitlines():
-    try:
-        obj = json.loads(line)
-        # give old records a default event type
-        if "event" not in obj:
-            obj["event"] = "unknown"
-        records.append(obj)
-    except json.JSONDecodeError:
-        pass
-
-print(f"✅ Loaded {len(records)} total records")
-
-# Split by event type
-events = Counter(r["event"] for r in records)
-print("\nEvent counts:")
-for k, v in events.items():
-    print(f"  {k:<18} {v}")
-
-# --- Compute feedback summary ---
-feedback = [r for r in records if r["event"] == "feedback"]
-if feedback:
-    ratings = Counter(r["rating"] for r in feedback)
-    ups = ratings.get("up", 0)
-    downs = ratings.get("down", 0)
-    total_fb = ups + downs
-    print("\nFeedback summary:")
-    print(f"  👍 {ups}")
-    print(f"  👎 {downs}")
-    if total_fb:
-        print(f"  Approval rate: {ups / total_fb * 100:.1f}%")
-
-# --- Average lengths for generations ---
-gens = [r for r in records if r["event"] == "generation"]
-if gens:
-    avg_prompt = sum(len(r["prompt_snippet"]) for r in gens) / len(gens)
-    avg_resp = sum(len(r["response_snippet"]) for r in gens) / len(gens)
-    print("\nAverage lengths (generation events):")
-    print(f"  Prompt snippet:  {avg_prompt:.1f}")
-    print(f"  Response snippet: {avg_resp:.1f}")
-
-print("\nSample last record:")
-print(json.dumps(records[-1], indent=2)[:800])
+def load_records(log_path: Path) -> list:
+    """Parse a JSON-lines log; malformed lines are skipped."""
+    records = []
+    with log_path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            # exported interaction_logs docs carry event_type; old records have neither
+            if "event" not in obj:
+                obj["event"] = obj.get("event_type", "unknown")
+            records.append(obj)
+    return records
+
+def summarize(records: list):
+    print(f"✅ Loaded {len(records)} total records")
+
+    # Split by event type
+    events = Counter(r["event"] for r in records)
+    print("\nEvent counts:")
+    for k, v in events.items():
+        print(f"  {k:<18} {v}")
+
+    # --- Compute feedback summary ---
+    feedback = [r for r in records if r["event"] == "feedback"]
+    if feedback:
+        ratings = Counter(r["rating"] for r in feedback)
+        ups = ratings.get("up", 0)
+        downs = ratings.get("down", 0)
+        total_fb = ups + downs
+        print("\nFeedback summary:")
+        print(f"  👍 {ups}")
+        print(f"  👎 {downs}")
+        if total_fb:
+            print(f"  Approval rate: {ups / total_fb * 100:.1f}%")
+
+    # --- Average lengths for generations ---
+    gens = [r for r in records if r["event"] == "generation"]
+    if gens:
+        avg_prompt = sum(len(r["prompt_snippet"]) for r in gens) / len(gens)
+        avg_resp = sum(len(r["response_snippet"]) for r in gens) / len(gens)
+        print("\nAverage lengths (generation events):")
+        print(f"  Prompt snippet:  {avg_prompt:.1f}")
+        print(f"  Response snippet: {avg_resp:.1f}")
+
+    usage_report(records)
+    usage_report(records, by=("generation_mode",))
+    usage_report(records, by=("route",))
+    route_report(records)
+
+    # --- LLM circuit breaker ---
+    transitions = [r for r in records if r["event"] == "llm_breaker"]
+    if transitions:
+        print("\nLLM circuit breaker transitions:")
+        for r in transitions:
+            d = r.get("details", r)
+            print(f"  {str(r.get('client_ts', ''))[:19]:<19} {d.get('from')} -> {d.get('to')}  ({d.get('reason')})")
+    degraded = Counter((r.get("details", r).get("degraded") or {}).get("draft")
+                       for r in records if r["event"] == "draft_generated")
+    degraded.pop(None, None)
+    if degraded:
+        print("  degraded drafts: " + ", ".join(f"{k}={v}" for k, v in degraded.items()))
+
+    if records:
+        print("\nSample last record:")
+        print(json.dumps(records[-1], indent=2)[:800])
+
+def _pct(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+def usage_report(records: list, by: tuple = ("format_choice", "length_pref")) -> dict:
+    """Tokens, latency and cost of draft_generated events grouped by the
+    `by` detail fields (e.g. ("generation_mode",) to compare combined vs two-call).
+
+    Cache hits count as requests but add no tokens or cost. Returns the
+    table it prints so callers can reuse it.
+    """
+    groups = {}
+    for r in records:
+        if r["event"] != "draft_generated":
+            continue
+        details = r.get("details", r)
+        key = tuple(str(details.get(field) or "?") for field in by)
+        g = groups.setdefault(key, {"n": 0, "prompt_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+                                    "cache_hits": 0, "draft_ms": [], "wall_ms": []})
+        g["n"] += 1
+        for call in (details.get("usage") or {}).values():
+            if not call:
+                continue
+            g["prompt_tokens"] += call.get("prompt_tokens") or 0
+            g["output_tokens"] += (call.get("output_tokens") or 0) + (call.get("thinking_tokens") or 0)
+            g["cost_usd"] += call.get("cost_usd") or 0.0
+            g["cache_hits"] += bool(call.get("cached"))
+        timings = details.get("timings_ms") or {}
+        for name in ("draft", "wall"):
+            if timings.get(name) is not None:
+                g[f"{name}_ms"].append(timings[name])
+    if not groups:
+        return {}
+
+    print(f"\nLLM usage by {' / '.join(by)} (draft_generated events):")
+    print(f"  {'group':<40} {'n':>5} {'in tok/req':>10} {'out tok/req':>11} {'draft p50':>9} {'p95':>7} "
+          f"{'wall p50':>8} {'p95':>7} {'cost $':>10} {'$/req':>9} {'cache':>6}")
+    table = {}
+    for key, g in sorted(groups.items(), key=lambda kv: -kv[1]["cost_usd"]):
+        row = {
+            "n": g["n"],
+            "prompt_tokens_per_req": g["prompt_tokens"] / g["n"],
+            "output_tokens_per_req": g["output_tokens"] / g["n"],
+            "draft_p50_ms": _pct(g["draft_ms"], 0.5),
+            "draft_p95_ms": _pct(g["draft_ms"], 0.95),
+            "wall_p50_ms": _pct(g["wall_ms"], 0.5),
+            "wall_p95_ms": _pct(g["wall_ms"], 0.95),
+            "cost_usd": g["cost_usd"],
+            "cost_per_req_usd": g["cost_usd"] / g["n"],
+            "cache_hits": g["cache_hits"],
+        }
+        table[key] = row
+        label = " / ".join(key)
+        print(f"  {label[:40]:<40} {row['n']:>5} {row['prompt_tokens_per_req']:>10.0f} "
+              f"{row['output_tokens_per_req']:>11.0f} {row['draft_p50_ms']:>9.0f} {row['draft_p95_ms']:>7.0f} "
+              f"{row['wall_p50_ms']:>8.0f} {row['wall_p95_ms']:>7.0f} "
+              f"{row['cost_usd']:>10.4f} {row['cost_per_req_usd']:>9.5f} {row['cache_hits']:>6}")
+    return table
+
+def route_report(records: list) -> dict:
+    """Quality signals per model route (the draft_generated "route" field):
+    thumbs-up rate from feedback_submitted, share of drafts kept without
+    edits and share cut off at the output cap (MAX_TOKENS). Events are
+    matched to their draft by gen_id. A draft counts as edited once an
+    edit_version, or a final_saved with a non-zero edit_distance, is logged
+    for it before its first feedback_submitted (the app's no_edit event
+    fires on the generation rerun, so it says nothing here). For latency
+    and cost per route use usage_report(records, by=("route",))."""
+    route_of, groups = {}, {}
+    for r in records:
+        if r["event"] != "draft_generated":
+            continue
+        details = r.get("details", r)
+        route = str(details.get("route") or "?")
+        g = groups.setdefault(route, {"n": 0, "truncated": 0, "up": 0, "down": 0, "edited": 0})
+        g["n"] += 1
+        usage = (details.get("usage") or {}).get("draft") or {}
+        g["truncated"] += usage.get("finish_reason") == "MAX_TOKENS"
+        if details.get("gen_id"):
+            route_of[details["gen_id"]] = route
+    edited, rated_ids = set(), set()
+    for r in records:
+        details = r.get("details", r)
+        gen_id = details.get("gen_id")
+        g = groups.get(route_of.get(gen_id))
+        if g is None:
+            continue
+        if r["event"] == "feedback_submitted":
+            g["up" if (details.get("thumb") or 0) > 0 else "down"] += 1
+            rated_ids.add(gen_id)
+        elif gen_id in rated_ids or gen_id in edited:
+            continue
+        elif r["event"] == "edit_version" or (r["event"] == "final_saved" and details.get("edit_distance")):
+            g["edited"] += 1
+            edited.add(gen_id)
+    if not groups:
+        return {}
+
+    print("\nDraft quality by route:")
+    print(f"  {'route':<16} {'n':>5} {'👍 rate':>8} {'rated':>6} {'no edit':>8} {'truncated':>10}")
+    table = {}
+    for route, g in sorted(groups.items(), key=lambda kv: -kv[1]["n"]):
+        rated = g["up"] + g["down"]
+        row = {
+            "n": g["n"],
+            "rated": rated,
+            "thumbs_up_rate": g["up"] / rated if rated else None,
+            "no_edit_rate": 1 - g["edited"] / g["n"],
+            "truncated_rate": g["truncated"] / g["n"],
+        }
+        table[route] = row
+        up = f"{row['thumbs_up_rate'] * 100:.0f}%" if rated else "-"
+        print(f"  {route[:16]:<16} {row['n']:>5} {up:>8} {rated:>6} {row['no_edit_rate'] * 100:>7.0f}% "
+              f"{row['truncated_rate'] * 100:>9.0f}%")
+    return table
+
+def main(log_path: Path = Path("logs.txt")):
+    if not log_path.exists():
+        print("No logs.txt found. Run the app and generate a few letters first.")
+        exit()
+    summarize(load_records(log_path))
+
+if __name__ == "__main__":
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else Path("logs.txt"))
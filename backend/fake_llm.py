@@ -0,0 +1,142 @@
+# fake_llm.py
+"""Deterministic stand-in for Gemini (LLM_PROVIDER=FAKE).
+
+The text is derived only from the prompt (same prompt -> same text), so
+caching, coalescing and the UI behave as they would against Vertex. Latency,
+streaming speed and failures are configurable and drawn from a seeded RNG,
+so a benchmark run can be repeated exactly:
+
+  FAKE_LLM_LATENCY    fixed:0.8 | lognormal:<median_s>,<sigma>   time to first token
+  FAKE_LLM_TAIL_PROB  chance a call gets a latency spike
+  FAKE_LLM_TAIL_MULT  spike multiplier
+  FAKE_LLM_TOKENS_PER_S  output speed after the first token
+  FAKE_LLM_ERROR_RATE chance a call fails with FakeLLMError
+  FAKE_LLM_BAD_JSON_RATE chance a JSON-mode answer comes back truncated
+  FAKE_LLM_SEED       RNG seed
+"""
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+_WORDS = (
+    "experience team led built shipped customers data product impact role growth design "
+    "delivered launched improved scaled analysis results partners platform strategy clear "
+    "metrics users quality roadmap collaborated owned passionate excited opportunity skills"
+).split()
+
+
+class FakeLLMError(RuntimeError):
+    """Injected failure; `code` mimics the HTTP status Vertex would return."""
+
+    def __init__(self, code: int = 503):
+        super().__init__(f"fake provider injected error ({code})")
+        self.code = code
+
+
+def _parse_latency(spec: str):
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: rng.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"Unsupported FAKE_LLM_LATENCY={spec}")
+
+
+class FakeLLM:
+    def __init__(self, latency: str = "fixed:0.5", tail_prob: float = 0.0, tail_mult: float = 5.0,
+                 tokens_per_s: float = 80.0, error_rate: float = 0.0, seed: int = 0,
+                 model_name: str = "fake", bad_json_rate: float = 0.0):
+        self._sample_latency = _parse_latency(latency)
+        self.tail_prob = tail_prob
+        self.tail_mult = tail_mult
+        self.tokens_per_s = tokens_per_s
+        self.error_rate = error_rate
+        self.bad_json_rate = bad_json_rate
+        self.model_name = model_name
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def text_for(self, prompt: str) -> str:
+        """The deterministic response for `prompt` (no latency, no errors)."""
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+        n_words = 120 + rng.randrange(200)
+        words = [rng.choice(_WORDS) for _ in range(n_words)]
+        paragraphs = [" ".join(words[i:i + 60]).capitalize() + "." for i in range(0, n_words, 60)]
+        return "\n\n".join(paragraphs)
+
+    def _plan(self) -> float:
+        # one locked draw per call keeps the sequence reproducible across threads
+        with self._lock:
+            self.calls += 1
+            first_token_s = self._sample_latency(self._rng)
+            if self._rng.random() < self.tail_prob:
+                first_token_s *= self.tail_mult
+            fail = self._rng.random() < self.error_rate
+            code = self._rng.choice((429, 503))
+        if fail:
+            time.sleep(first_token_s)
+            raise FakeLLMError(code)
+        return first_token_s
+
+    def _chunks(self, text: str) -> list:
+        words = text.split(" ")
+        return [w + " " for w in words[:-1]] + words[-1:]
+
+    def count_tokens(self, text: str) -> int:
+        """Rough Gemini-like token count (~4 characters per token)."""
+        return (len(text) + 3) // 4
+
+    def json_for(self, prompt: str, response_schema: Dict[str, Any]) -> str:
+        """A JSON object with one deterministic text per STRING property."""
+        fields = {name: self.text_for(f"{prompt}\0{name}")
+                  for name in response_schema.get("properties", {})}
+        return json.dumps(fields)
+
+    def _capped(self, chunks: list, max_output_tokens: Optional[int]) -> list:
+        """The chunks that fit in max_output_tokens (all of them if None)."""
+        if not max_output_tokens:
+            return chunks
+        budget = max_output_tokens * 4  # count_tokens' characters per token
+        kept = []
+        for chunk in chunks:
+            budget -= len(chunk)
+            if budget < 0:
+                break
+            kept.append(chunk)
+        return kept
+
+    def generate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None,
+                 max_output_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """With response_schema, the text is JSON for it (truncated, i.e.
+        invalid, with probability bad_json_rate). Answers longer than
+        max_output_tokens are cut off with finish_reason MAX_TOKENS."""
+        first_token_s = self._plan()
+        if response_schema:
+            text = self.json_for(prompt, response_schema)
+            with self._lock:
+                bad = self._rng.random() < self.bad_json_rate
+            if bad:
+                text = text[: len(text) // 2]
+        else:
+            text = self.text_for(prompt)
+        chunks = self._chunks(text)
+        kept = self._capped(chunks, max_output_tokens)
+        text = "".join(kept)
+        time.sleep(first_token_s + len(kept) / self.tokens_per_s)
+        return {"text": text, "prompt_tokens": self.count_tokens(prompt), "output_tokens": self.count_tokens(text),
+                "finish_reason": "STOP" if len(kept) == len(chunks) else "MAX_TOKENS"}
+
+    def stream(self, prompt: str, max_output_tokens: Optional[int] = None) -> Iterator[str]:
+        time.sleep(self._plan())
+        delay = 1.0 / self.tokens_per_s
+        for i, chunk in enumerate(self._capped(self._chunks(self.text_for(prompt)), max_output_tokens)):
+            if i:
+                time.sleep(delay)
+            yield chunk
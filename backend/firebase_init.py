@@ -1,16 +1,66 @@
+# firebase_init.py
+"""The one place that connects to Firebase / Firestore.
+
+Nothing is created at import. The Firebase Admin app and the Firestore
+client are built on first use and shared by every caller in the process
+(settings.get_db, db_ops, firestore_utils, auth in home.py). The async
+client used by db_ops_async shares the app's credentials.
+"""
 import os, base64, json
+import threading
 import firebase_admin
 from firebase_admin import credentials
+from settings import PROJECT_ID, GOOGLE_APPLICATION_CREDENTIALS
+
+_lock = threading.Lock()
+_app = None
+_db = None
+_async_db = None
+
+def _credentials():
+    encoded = os.getenv("FIREBASE_CREDENTIALS")
+    if encoded:
+        creds_dict = json.loads(base64.b64decode(encoded).decode("utf-8"))
+        return credentials.Certificate(creds_dict)
+    if GOOGLE_APPLICATION_CREDENTIALS and os.path.exists(GOOGLE_APPLICATION_CREDENTIALS):
+        return credentials.Certificate(GOOGLE_APPLICATION_CREDENTIALS)
+    # Cloud Run uses Application Default Credentials automatically
+    return credentials.ApplicationDefault()
 
 def ensure_firebase_initialized():
-    if not firebase_admin._apps:
-        encoded = os.getenv("FIREBASE_CREDENTIALS")
-        if encoded:
-            creds_dict = json.loads(base64.b64decode(encoded).decode("utf-8"))
-            cred = credentials.Certificate(creds_dict)
-        else:
-            cred = credentials.ApplicationDefault()
-        firebase_admin.initialize_app(cred)
-    return firebase_admin.get_app()
+    global _app
+    if _app is not None:
+        return _app
+    with _lock:
+        if _app is None:
+            if firebase_admin._apps:
+                _app = firebase_admin.get_app()
+            else:
+                _app = firebase_admin.initialize_app(_credentials(), {"projectId": PROJECT_ID} if PROJECT_ID else None)
+    return _app
+
+def get_firestore():
+    """The process-wide google.cloud.firestore.Client."""
+    global _db
+    if _db is not None:
+        return _db
+    app = ensure_firebase_initialized()
+    with _lock:
+        if _db is None:
+            from firebase_admin import firestore
+            _db = firestore.client(app)
+    return _db
 
-firebase_app = ensure_firebase_initialized()
+def get_async_firestore():
+    """The process-wide google.cloud.firestore.AsyncClient (use it only from
+    the db_ops_async event loop)."""
+    global _async_db
+    if _async_db is not None:
+        return _async_db
+    app = ensure_firebase_initialized()
+    with _lock:
+        if _async_db is None:
+            from google.cloud import firestore as gcf
+            _async_db = gcf.AsyncClient(project=app.project_id or PROJECT_ID,
+                                        credentials=app.credential.get_credential())
+    return _async_db
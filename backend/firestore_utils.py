@@ -1,16 +1,10 @@
 from typing import Dict, Any
 from google.cloud import firestore
-import firebase_init
-# Firestore uses Application Default Credentials (ADC).
-# Locally: your GOOGLE_APPLICATION_CREDENTIALS key.
-# On Cloud Run: the service account you deployed with.
-_db = None
+from firebase_init import get_firestore
+# Shares the process-wide client from firebase_init (ADC locally and on Cloud Run).
 
 def _client() -> firestore.Client:
-    global _db
-    if _db is None:
-        _db = firestore.Client()  # auto-detects project from ADC
-    return _db
+    return get_firestore()
 
 def save_log(event_type: str, payload: Dict[str, Any]) -> str:
     """Write a single event to Firestore. Returns the document id."""
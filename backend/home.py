@@ -1,4 +1,5 @@
 import os
+import time
 import uuid
 import datetime
 # import streamlit.web.server.websocket_headers as st_ws
@@ -6,29 +7,41 @@ import streamlit as st
 
 # Must be first Streamlit call
 st.set_page_config(page_title="Genie-Hi: Write your first Hi", page_icon="💌")
+_RERUN_T0 = time.perf_counter()
 
 # Safe to import after page_config
 from firebase_admin import auth as admin_auth
 import firebase_init
 from db_ops import (
-    ensure_user_profile,
-    create_session,
+    uid_from_email,
+    start_session,
     save_letter,
-    upsert_final_and_metric,
-    save_feedback,
+    persist_edit_snapshot,
+    submit_feedback,
     log_interaction,
 )
-from core_llm import generate_cover_letter, build_prompt_cover_letter, build_prompt_suggestion
+from core_llm import (
+    submit_generation,
+    stream_cover_letter,
+    stale_outputs,
+    input_fingerprint,
+    build_prompt_cover_letter,
+    build_prompt_suggestion,
+    record_usage,
+    usage_totals,
+    generation_mode,
+    generate_combined,
+    choose_route,
+)
+from autosave import AutosaveScheduler
+from admission import AdmissionRejected
+from circuit_breaker import BreakerOpen
+import metrics
+from settings import AUTOSAVE_WINDOW_S, AUTOSAVE_MAX_WAIT_S, DEV_USER_EMAIL
+from settings import METRICS_PORT, METRICS_FILE, METRICS_FILE_INTERVAL_S, DEBUG_METRICS
 import streamlit as st
-import firebase_admin
-from firebase_admin import auth, credentials
 import urllib.parse
 
-# --- Initialize Firebase Admin only once ---
-if not firebase_admin._apps:
-    cred = credentials.Certificate("service-account-genie-hi-front.json")
-    firebase_admin.initialize_app(cred)
-
 # --- Try reading id_token from URL ---
 query_params = st.query_params
 id_token = query_params.get("id_token")
@@ -83,33 +96,78 @@ def _set_cookie_js(token: str | None):
             unsafe_allow_html=True,
         )
 
-def _autosave_final(action: str):
+@st.cache_resource
+def _autosaver() -> AutosaveScheduler:
+    # one scheduler per process, shared by all sessions
+    return AutosaveScheduler(persist_edit_snapshot, window_s=AUTOSAVE_WINDOW_S, max_wait_s=AUTOSAVE_MAX_WAIT_S)
+
+@st.cache_resource
+def _metrics_exporters() -> bool:
+    # once per process; both are no-ops unless configured
+    if METRICS_PORT:
+        try:
+            metrics.start_http_server(METRICS_PORT)
+        except OSError as e:
+            print("Metrics endpoint failed:", e)
+    if METRICS_FILE:
+        metrics.start_file_exporter(METRICS_FILE, METRICS_FILE_INTERVAL_S)
+    return True
+
+def _record_rerun():
+    metrics.observe("home.rerun", (time.perf_counter() - _RERUN_T0) * 1000)
+
+def _metrics_panel():
+    with st.sidebar.expander("Latency metrics (debug)"):
+        rows = [{"op": op, **row} for op, row in metrics.snapshot().items()]
+        st.dataframe(rows, hide_index=True)
+        st.caption("LLM usage: this user / this instance")
+        st.json({"user": usage_totals(st.session_state.get("user", {}).get("uid")), "global": usage_totals()},
+                expanded=False)
+
+def _autosave_key(session_id: str, gen_id: str) -> str:
+    return f"{session_id}/{gen_id}"
+
+def _autosave_final(action: str, thumb: int, reason: str = ""):
+    """Thumbs click: flush pending edits, then save the feedback and the
+    final (+ edit-distance metric) together in one round-trip."""
     sid = st.session_state.get("SESSION_ID")
     if not sid:
         return None
     final_text = (st.session_state.get("EDIT_DRAFT", "") or st.session_state.get("DRAFT_TEXT", "")).strip()
+    # persist any edit still waiting in the autosave window first
+    saved = _autosaver().flush(_autosave_key(sid, st.session_state.get("GEN_ID") or "no_gen")) if final_text else None
+    already_saved = bool(saved and saved.get("edit_distance") is not None and saved["text"].strip() == final_text)
+    edit_distance = submit_feedback(
+        UID, user_email, sid, thumb=thumb, reason=reason,
+        final_text=None if already_saved else final_text,
+        draft_text=st.session_state.get("DRAFT_TEXT"),
+    )
+    if already_saved:
+        edit_distance = saved["edit_distance"]
     if not final_text:
         return None
-    edit_distance = upsert_final_and_metric(UID, sid, final_text)
     try:
         log_interaction(
             UID,
             user_email,
             sid,
             "final_saved",
-            {"final_text": final_text, "edit_distance": edit_distance, "triggered_by": action},
+            {"gen_id": st.session_state.get("GEN_ID"), "final_text": final_text,
+             "edit_distance": edit_distance, "triggered_by": action},
         )
     except Exception as e:
         print("Logging final_saved failed:", e)
     return {"final_text": final_text, "edit_distance": edit_distance}
 
 # ---------- unified auth restore (session → URL token → cookie) ----------
+@metrics.timed("auth.restore_from_session")
 def _try_restore_from_session():
     user = st.session_state.get("user")
     if user and user.get("uid"):
         return user
     return None
 
+@metrics.timed("auth.restore_from_url_token")
 def _try_restore_from_url_token():
     token = None
     try:
@@ -119,7 +177,7 @@ def _try_restore_from_url_token():
     if not token:
         return None
     try:
-        decoded = admin_auth.verify_id_token(token)
+        decoded = admin_auth.verify_id_token(token, app=firebase_init.ensure_firebase_initialized())
         user_info = {"uid": decoded["uid"], "email": decoded.get("email", "")}
         st.session_state["user"] = user_info
         _set_cookie_js(token)
@@ -127,12 +185,13 @@ def _try_restore_from_url_token():
     except Exception:
         return None
 
+@metrics.timed("auth.restore_from_cookie")
 def _try_restore_from_cookie():
     raw = _get_cookie()
     if not raw:
         return None
     try:
-        decoded = admin_auth.verify_id_token(raw)  # JWT -> claims
+        decoded = admin_auth.verify_id_token(raw, app=firebase_init.ensure_firebase_initialized())  # JWT -> claims
         user_info = {"uid": decoded["uid"], "email": decoded.get("email", "")}
         st.session_state["user"] = user_info
         return user_info
@@ -141,14 +200,25 @@ def _try_restore_from_cookie():
         _set_cookie_js(None)
         return None
 
+@metrics.timed("auth.restore_from_dev_user")
+def _try_restore_from_dev_user():
+    # offline storage backends only (settings blanks DEV_USER_EMAIL for firestore)
+    if not DEV_USER_EMAIL:
+        return None
+    user_info = {"uid": uid_from_email(DEV_USER_EMAIL), "email": DEV_USER_EMAIL}
+    st.session_state["user"] = user_info
+    return user_info
+
 def restore_user():
-    for fn in (_try_restore_from_session, _try_restore_from_url_token, _try_restore_from_cookie):
+    for fn in (_try_restore_from_session, _try_restore_from_dev_user, _try_restore_from_url_token,
+               _try_restore_from_cookie):
         user = fn()
         if user:
             return user
     return None
 
 # ---------- page setup ----------
+_metrics_exporters()
 st.sidebar.caption("made with curiosity and love — by Gabrielle Yang")
 st.sidebar.markdown(
     """
@@ -174,17 +244,17 @@ if not firebase_user:
         """,
         unsafe_allow_html=True,
     )
+    _record_rerun()
     st.stop()
 
 UID = firebase_user["uid"]
 user_email = firebase_user.get("email", "")
 st.write(f"Welcome back, {user_email}" if user_email else "Welcome back!")
 
-ensure_user_profile(UID, user_email)
-
+# first run of a browser session: profile upsert + new session in one round-trip
 sid = st.session_state.get("SESSION_ID")
 if not sid:
-    sid = create_session(UID, resume_text="", jd_text="")
+    sid = start_session(UID, user_email, resume_text="", jd_text="")
     st.session_state["SESSION_ID"] = sid
 
 # --------------------------
@@ -212,6 +282,8 @@ with c2:
     )
 
 highlights = st.text_input("Highlights (comma-separated)")
+# identical inputs are served from the LLM cache unless the user asks for a fresh take
+force_regen = st.checkbox("Write a fresh version (ignore previous results)", key="force_regen")
 
 st.session_state.setdefault("DRAFT_TEXT", "")
 st.session_state.setdefault("FINAL_TEXT", "")
@@ -223,52 +295,158 @@ if st.button("✨ Generate Draft", key="gen_btn"):
     st.session_state["GEN_NUM"] = (st.session_state.get("GEN_NUM", 0) or 0) + 1
     gen_num = st.session_state["GEN_NUM"]
 
-    prompt_cover_letter = build_prompt_cover_letter(
-        resume=resume, jd=jd, highlights=highlights, length_style=length_pref, format_style=format_choice
-    )
-    draft = generate_cover_letter(prompt_cover_letter)
-
-    save_letter(UID, sid, draft, "draft")
-    st.session_state["DRAFT_TEXT"] = draft
-    st.session_state["_LAST_EDIT_SNAPSHOT"] = draft
-    st.session_state["EDIT_DRAFT"] = draft
-    st.session_state["EDIT_VERSION"] = 0
-    st.session_state["_NO_EDIT_LOGGED"] = False
-
-    prompt_suggestions = build_prompt_suggestion(
+    prompt_inputs = dict(
         resume=resume, jd=jd, highlights=highlights, length_style=length_pref, format_style=format_choice
     )
-    suggestions = generate_cover_letter(prompt_suggestions)
-    # view-only; no DB write
-    st.session_state["SUGGESTIONS_TEXT"] = suggestions
-    st.session_state["_LAST_EDIT_SNAPSHOT_SUGGESTIONS"] = suggestions
-    st.session_state["EDIT_SUGGESTIONS"] = suggestions
-    st.session_state["EDIT_VERSION_SUGGESTIONS"] = 0
-    st.session_state["_NO_EDIT_LOGGED_SUGGESTIONS"] = True
+    compaction = {"draft": {}, "suggestions": {}, "combined": {}}
+    # suggestions only read resume + JD; keep the current ones unless those changed
+    stale = stale_outputs(prompt_inputs, st.session_state.get("_OUTPUT_FINGERPRINTS", {}))
+    regen_suggestions = force_regen or "suggestions" in stale or not st.session_state.get("SUGGESTIONS_TEXT")
+    # one JSON-mode call only pays off when both outputs are needed
+    gen_mode = generation_mode(UID) if regen_suggestions else "two_call"
+    fallback_reason = None
+    combined_usage = None
+    draft_route = None
+
+    t_gen = time.perf_counter()
+    if gen_mode == "combined":
+        with st.spinner("Writing your draft and suggestions..."):
+            combined = generate_combined(prompt_inputs, force=force_regen, report=compaction["combined"], uid=UID)
+        draft_res, sugg_res = combined["draft"], combined["suggestions"]
+        draft_stats = {"cached": draft_res.get("cached"), "degraded": draft_res.get("degraded"),
+                       "route": draft_res.get("route"), "usage": draft_res.get("usage")}
+        combined_usage, fallback_reason = combined["usage"], combined["fallback_reason"]
+        gen_mode = combined["mode"] if not fallback_reason else "combined_fallback"
+    else:
+        # draft and suggestions are independent: suggestions run in the background
+        # while the draft streams onto the page token by token
+        prompt_cover_letter = build_prompt_cover_letter(**prompt_inputs, report=compaction["draft"])
+        # short formats go to a lighter model with a tight output cap
+        draft_route = choose_route(format_choice, length_pref, prompt_cover_letter)
+        sugg_future = None
+        if regen_suggestions:
+            sugg_future = submit_generation(
+                build_prompt_suggestion(**prompt_inputs, report=compaction["suggestions"]), force=force_regen, uid=UID
+            )
+        draft_res = {"text": "", "error": None}
+        draft_stats = {}
+        stream_box = st.empty()
+        try:
+            with stream_box.container():
+                streamed = st.write_stream(
+                    stream_cover_letter(prompt_cover_letter, draft_stats, force=force_regen, uid=UID,
+                                        route=draft_route)
+                )
+            draft_res["text"] = (streamed if isinstance(streamed, str) else "".join(map(str, streamed))).strip()
+        except (AdmissionRejected, BreakerOpen) as e:
+            draft_res["error"] = f"{type(e).__name__}: {e}"
+            draft_res["retry_after_s"] = e.retry_after_s
+            draft_res["provider_unavailable"] = isinstance(e, BreakerOpen)
+        except Exception as e:
+            draft_res["error"] = f"{type(e).__name__}: {e}"
+        draft_res["latency_ms"] = draft_stats.get("latency_ms", round((time.perf_counter() - t_gen) * 1000, 1))
+        # the edit box below renders the full draft; drop the streaming preview
+        stream_box.empty()
+        if sugg_future is not None:
+            sugg_res = sugg_future.result()
+        else:
+            # inputs the suggestions read are unchanged: keep the ones on screen
+            sugg_res = {"text": st.session_state["SUGGESTIONS_TEXT"], "error": None, "latency_ms": 0.0,
+                        "cached": False, "reused": True}
+    wall_ms = round((time.perf_counter() - t_gen) * 1000, 1)
+    for usage in (draft_stats.get("usage"), sugg_res.get("usage"), combined_usage):
+        record_usage(UID, usage)
+
+    if draft_res.get("retry_after_s") is not None:
+        # turned away by admission control or the circuit breaker: say so right away
+        print("Draft generation rejected:", draft_res["error"])
+        retry_in = max(5, round(draft_res["retry_after_s"]))
+        if draft_res.get("provider_unavailable"):
+            st.warning(f"Our writing service is having trouble right now. Please try again in about {retry_in} seconds.")
+        else:
+            st.warning(f"Genie-Hi is helping a lot of people right now. Please try again in about {retry_in} seconds.")
+    elif draft_res["error"]:
+        print("Draft generation failed:", draft_res["error"])
+        st.error("Sorry, we couldn't generate a draft right now. Please try again.")
+    else:
+        draft = draft_res["text"]
+        save_letter(UID, sid, draft, "draft")
+        st.session_state["DRAFT_TEXT"] = draft
+        st.session_state["_LAST_EDIT_SNAPSHOT"] = draft
+        st.session_state["EDIT_DRAFT"] = draft
+        st.session_state["_NO_EDIT_LOGGED"] = False
+
+        fingerprints = dict(st.session_state.get("_OUTPUT_FINGERPRINTS", {}))
+        fingerprints["draft"] = input_fingerprint("draft", prompt_inputs)
+        if sugg_res["error"]:
+            print("Suggestions generation failed:", sugg_res["error"])
+            fingerprints.pop("suggestions", None)
+        elif regen_suggestions:
+            fingerprints["suggestions"] = input_fingerprint("suggestions", prompt_inputs)
+        st.session_state["_OUTPUT_FINGERPRINTS"] = fingerprints
+
+        suggestions = sugg_res["text"]
+        if regen_suggestions:
+            # view-only; no DB write
+            st.session_state["SUGGESTIONS_TEXT"] = suggestions
+            st.session_state["_LAST_EDIT_SNAPSHOT_SUGGESTIONS"] = suggestions
+            st.session_state["EDIT_SUGGESTIONS"] = suggestions
+            st.session_state["EDIT_VERSION_SUGGESTIONS"] = 0
+            st.session_state["_NO_EDIT_LOGGED_SUGGESTIONS"] = True
 
-    try:
-        log_interaction(
-            UID,
-            user_email,
-            sid,
-            "draft_generated",
-            {
-                "gen_id": gen_id,
-                "gen_num": gen_num,
-                "resume": resume,
-                "job_description": jd,
-                "highlights": highlights,
-                "length_pref": length_pref,
-                "format_choice": format_choice,
-                "model": os.getenv("VERTEX_MODEL", "gemini-2.5-flash"),
-                "draft_text": draft,
-                "suggestions_text": suggestions,
-            },
-        )
-    except Exception as e:
-        print("Logging draft_generated failed:", e)
+        try:
+            log_interaction(
+                UID,
+                user_email,
+                sid,
+                "draft_generated",
+                {
+                    "gen_id": gen_id,
+                    "gen_num": gen_num,
+                    "resume": resume,
+                    "job_description": jd,
+                    "highlights": highlights,
+                    "length_pref": length_pref,
+                    "format_choice": format_choice,
+                    # model that wrote the draft (routed / degraded); coalesced calls carry no usage
+                    "model": ((draft_stats.get("usage") or combined_usage or {}).get("model")
+                              or (draft_route or {}).get("model") or os.getenv("VERTEX_MODEL", "gemini-2.5-flash")),
+                    "draft_text": draft,
+                    "suggestions_text": suggestions,
+                    "suggestions_error": sugg_res["error"],
+                    "suggestions_regenerated": regen_suggestions,
+                    "cached": {"draft": draft_stats.get("cached"), "suggestions": sugg_res.get("cached")},
+                    # joined an identical in-flight call (double click / second tab)
+                    "coalesced": {"draft": draft_stats.get("coalesced"), "suggestions": sugg_res.get("coalesced")},
+                    # circuit breaker open: served from the cache ("cache") or the smaller model ("model")
+                    "degraded": {"draft": draft_stats.get("degraded"), "suggestions": sugg_res.get("degraded")},
+                    "force_regen": force_regen,
+                    # tokens / model / region / finish_reason / cost per call (llm_usage.make_usage)
+                    "usage": {"draft": draft_stats.get("usage"), "suggestions": sugg_res.get("usage"),
+                              "combined": combined_usage},
+                    # two_call | combined | combined_fallback (JSON call failed, then two calls)
+                    "generation_mode": gen_mode,
+                    # core_llm.ROUTES row that served the draft (model / output cap / temperature)
+                    "route": draft_stats.get("route"),
+                    "combined_fallback_reason": fallback_reason,
+                    # estimated input tokens before/after compaction, dropped sections
+                    "compaction": compaction,
+                    "timings_ms": {
+                        "draft": draft_res["latency_ms"],
+                        "draft_ttft": draft_stats.get("ttft_ms"),
+                        "suggestions": sugg_res["latency_ms"],
+                        "wall": wall_ms,
+                    },
+                },
+            )
+        except Exception as e:
+            print("Logging draft_generated failed:", e)
 
-    st.success("Draft generated. You can edit and save your final below.")
+        st.success("Draft generated. You can edit and save your final below.")
+        if draft_stats.get("degraded") == "cache":
+            st.info("Our writing service is having trouble, so this is your previous draft for these inputs.")
+        elif draft_stats.get("degraded") == "model":
+            st.info("Our writing service is having trouble, so this draft came from a faster backup model.")
 
 st.markdown("### Draft Preview & Edit")
 
@@ -282,33 +460,22 @@ edited_text = st.text_area(
 
 prev_snapshot = st.session_state.get("_LAST_EDIT_SNAPSHOT", original_text)
 if edited_text.strip() != prev_snapshot.strip():
-    version_num = (st.session_state.get("EDIT_VERSION", 0) or 0) + 1
-    st.session_state["EDIT_VERSION"] = version_num
     st.session_state["_LAST_EDIT_SNAPSHOT"] = edited_text
-    try:
-        save_letter(UID, sid, edited_text, kind=f"edit_v{version_num}")
-    except Exception as e:
-        print("Saving edit version failed:", e)
-    try:
-        upsert_final_and_metric(UID, sid, edited_text)
-    except Exception as e:
-        print("Autosave (upsert_final_and_metric) failed:", e)
-    try:
-        log_interaction(
-            UID,
-            user_email,
-            sid,
-            "edit_version",
-            {
-                "gen_id": st.session_state.get("GEN_ID"),
-                "gen_num": st.session_state.get("GEN_NUM"),
-                "version": version_num,
-                "timestamp": _utc_now_iso(),
-                "edited_text": edited_text,
-            },
-        )
-    except Exception as e:
-        print("Logging edit_version failed:", e)
+    gen_id = st.session_state.get("GEN_ID") or "no_gen"
+    # coalesced in the background: only the latest text per window is written
+    _autosaver().submit(
+        _autosave_key(sid, gen_id),
+        {
+            "uid": UID,
+            "user_email": user_email,
+            "sid": sid,
+            "gen_id": gen_id,
+            "gen_num": st.session_state.get("GEN_NUM"),
+            "timestamp": _utc_now_iso(),
+            "text": edited_text,
+        },
+        base_text=original_text,
+    )
 else:
     if not st.session_state.get("_NO_EDIT_LOGGED"):
         try:
@@ -343,10 +510,9 @@ st.session_state["feedback"] = reason
 c4, c5 = st.columns(2)
 with c4:
     if st.button("👍 Looks good", key="thumbs_up"):
-        final_info = _autosave_final("thumbs_up")
         sid = st.session_state.get("SESSION_ID")
         if sid:
-            save_feedback(UID, user_email, sid, thumb=1, reason=reason.strip())
+            final_info = _autosave_final("thumbs_up", thumb=1, reason=reason.strip())
             try:
                 log_interaction(
                     UID,
@@ -354,6 +520,7 @@ with c4:
                     sid,
                     "feedback_submitted",
                     {
+                        "gen_id": st.session_state.get("GEN_ID"),
                         "thumb": 1,
                         "feedback": reason.strip(),
                         "final_text": (final_info or {}).get("final_text", st.session_state.get("FINAL_TEXT", "")),
@@ -366,10 +533,9 @@ with c4:
             st.info("Generate a draft first.")
 with c5:
     if st.button("👎 Needs work", key="thumbs_down"):
-        final_info = _autosave_final("thumbs_down")
         sid = st.session_state.get("SESSION_ID")
         if sid:
-            save_feedback(UID, user_email, sid, thumb=-1, reason=reason.strip())
+            final_info = _autosave_final("thumbs_down", thumb=-1, reason=reason.strip())
             try:
                 log_interaction(
                     UID,
@@ -377,6 +543,7 @@ with c5:
                     sid,
                     "feedback_submitted",
                     {
+                        "gen_id": st.session_state.get("GEN_ID"),
                         "thumb": -1,
                         "feedback": reason.strip(),
                         "final_text": (final_info or {}).get("final_text", st.session_state.get("FINAL_TEXT", "")),
@@ -387,3 +554,7 @@ with c5:
             st.success("Noted. Saved internally.")
         else:
             st.info("Generate a draft first.")
+
+if DEBUG_METRICS:
+    _metrics_panel()
+_record_rerun()
@@ -0,0 +1,182 @@
+# input_compaction.py
+"""Shrink pasted resume / JD text before it goes into a prompt.
+
+Pasted inputs carry a lot of dead weight: whitespace runs, the same line
+copied twice, job-board navigation ("Apply now", "Save job") and JD
+boilerplate (EEO statements, privacy notices, benefits lists). compact()
+removes that, then enforces a token budget by dropping the lowest-value
+sections first (company blurb before nice-to-haves; the resume's hobbies
+before education before projects) and, only if still over, cutting the
+longest remaining sections (usually the oldest roles) from the end.
+
+    out = compact(resume, jd, budget_tokens=6000, overhead_tokens=800)
+    -> {"resume", "jd", "tokens_before", "tokens_after", "tokens_saved",
+        "dropped": ["jd:benefits", ...], "truncated": bool}
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+# ---------- token estimate ----------
+def estimate_tokens(text: str) -> int:
+    """Fast Gemini-ish token estimate (~4 characters per token for English)."""
+    return (len(text) + 3) // 4
+
+# ---------- normalization ----------
+_INVISIBLE = re.compile("[\u200b\u200c\u200d\u2060\ufeff\u00ad]")
+_INLINE_SPACE = re.compile("[ \t\u00a0\u2000-\u200a\u202f\u3000]+")
+_BLANK_RUNS = re.compile(r"\n{3,}")
+
+def normalize_whitespace(text: str) -> str:
+    text = _INVISIBLE.sub("", (text or "").replace("\r\n", "\n").replace("\r", "\n"))
+    lines = [_INLINE_SPACE.sub(" ", line).strip() for line in text.split("\n")]
+    return _BLANK_RUNS.sub("\n\n", "\n".join(lines)).strip()
+
+# job-board chrome that comes along when a posting is copied from the browser
+_NAV_LINE = re.compile(
+    r"^(apply( now| for this job)?|easy apply|save( job)?|saved|share( this job)?|report( this)? job|"
+    r"sign in|log in|join now|show (more|less)|see (more|less)|back to (search|jobs|results)|"
+    r"\d+ (applicants|clicks)|posted \d+ \w+ ago|promoted|actively recruiting|"
+    r"(home|jobs|careers|about|menu)( [|/•·] ?(home|jobs|careers|about|menu|contact))+)[.!]?$",
+    re.IGNORECASE,
+)
+# repeated short lines are usually legitimate (two roles titled "Data Analyst")
+DEDUPE_MIN_CHARS = 30
+
+def dedupe_lines(text: str) -> str:
+    """Drop navigation lines, consecutive repeats, and later copies of long lines."""
+    seen, out = set(), []
+    for line in text.split("\n"):
+        key = line.casefold()
+        if line and _NAV_LINE.match(line):
+            continue
+        if line and out and out[-1].casefold() == key:
+            continue
+        if len(line) >= DEDUPE_MIN_CHARS:
+            if key in seen:
+                continue
+            seen.add(key)
+        out.append(line)
+    return _BLANK_RUNS.sub("\n\n", "\n".join(out)).strip()
+
+# ---------- sections ----------
+# (kind, heading pattern, value). Higher value survives the budget longer;
+# value < 0 means boilerplate that is always stripped.
+JD_SECTIONS = [
+    ("eeo", r"equal (employment )?opportunity|eeo\b|diversity (statement|&|and inclusion)|accommodations?", -1),
+    ("legal", r"privacy|e-verify|pay transparency|applicant notice|legal|disclaimer|right to work", -1),
+    ("benefits", r"benefits|perks|what we offer|what you.ll get|compensation|salary|pay range|total rewards", -1),
+    ("how_to_apply", r"how to apply|application process|next steps|interview process", -1),
+    ("responsibilities", r"responsibilities|what you.ll do|the role|about the (role|job|position)|"
+                         r"job (summary|description)|duties|day to day|your impact|overview", 9),
+    ("nice_to_have", r"(preferred|bonus|nice to have|plus)( qualifications| skills)?", 6),
+    ("qualifications", r"(minimum |basic |required )?qualifications|requirements|what you.ll (need|bring)|"
+                       r"who you are|skills|experience|you have", 8),
+    # after the role headings so "About the role" isn't taken for a company blurb
+    ("about_company", r"about (us|the company|the team|[a-z0-9&.' -]{2,30})|who we are|our (mission|story|values)|life at", 3),
+]
+RESUME_SECTIONS = [
+    ("references", r"references", -1),
+    ("interests", r"interests|hobbies|activities|personal", 1),
+    ("publications", r"publications|patents|talks|presentations", 2),
+    ("volunteer", r"volunteer(ing)?|community|leadership activities", 2),
+    ("awards", r"awards|honou?rs|achievements", 3),
+    ("certifications", r"certifications?|licen[sc]es|courses|training", 3),
+    ("education", r"education|academic", 4),
+    ("projects", r"projects|portfolio", 5),
+    ("skills", r"(technical |core )?skills|technologies|tools|competencies|languages", 6),
+    ("summary", r"summary|profile|objective|about me", 7),
+    ("experience", r"(work |professional |relevant )?experience|employment|work history|career", 8),
+]
+# text before the first recognised heading (job title / candidate name and contact)
+PREAMBLE_VALUE = {"jd": 9, "resume": 7}
+_BOILERPLATE_SENTENCE = re.compile(
+    r"(equal (employment )?opportunity employer|without regard to (race|age|sex)|"
+    r"reasonable accommodation|e-verify|references available upon request)", re.IGNORECASE)
+
+_compiled = {}
+
+def _heading_rules(kind: str):
+    rules = _compiled.get(kind)
+    if rules is None:
+        table = JD_SECTIONS if kind == "jd" else RESUME_SECTIONS
+        rules = _compiled[kind] = [(name, re.compile(rf"^[#*\s]*(?:{pat})[\s:*#-]*$", re.IGNORECASE), value)
+                                   for name, pat, value in table]
+    return rules
+
+def _classify_heading(line: str, kind: str) -> Optional[Tuple[str, int]]:
+    if not line or len(line) > 60:
+        return None
+    for name, pattern, value in _heading_rules(kind):
+        if pattern.match(line):
+            return name, value
+    return None
+
+def split_sections(text: str, kind: str) -> List[Dict]:
+    """[{"name", "value", "lines"}] in document order; kind is "jd" or "resume"."""
+    sections = [{"name": "preamble", "value": PREAMBLE_VALUE[kind], "lines": []}]
+    for line in text.split("\n"):
+        heading = _classify_heading(line, kind)
+        if heading:
+            sections.append({"name": heading[0], "value": heading[1], "lines": [line]})
+        else:
+            sections[-1]["lines"].append(line)
+    return [s for s in sections if any(s["lines"])]
+
+def _strip_boilerplate(sections: List[Dict], kind: str, dropped: List[str]) -> List[Dict]:
+    kept = []
+    for s in sections:
+        if s["value"] < 0:
+            dropped.append(f"{kind}:{s['name']}")
+            continue
+        # one-paragraph EEO blurbs often sit under no heading at all
+        s["lines"] = [line for line in s["lines"] if not _BOILERPLATE_SENTENCE.search(line)]
+        kept.append(s)
+    return kept
+
+def _join(sections: List[Dict]) -> str:
+    return _BLANK_RUNS.sub("\n\n", "\n".join("\n".join(s["lines"]) for s in sections)).strip()
+
+# ---------- entry point ----------
+def compact(resume: str, jd: str, budget_tokens: int = 0, overhead_tokens: int = 0) -> Dict:
+    """Normalize, de-duplicate and strip boilerplate from both inputs, then
+    trim to budget_tokens (whole prompt, template overhead included; 0 = no
+    budget). Returns the compacted texts and what was saved."""
+    tokens_before = estimate_tokens(resume or "") + estimate_tokens(jd or "")
+    dropped: List[str] = []
+    docs = {
+        "resume": _strip_boilerplate(split_sections(dedupe_lines(normalize_whitespace(resume)), "resume"),
+                                     "resume", dropped),
+        "jd": _strip_boilerplate(split_sections(dedupe_lines(normalize_whitespace(jd)), "jd"), "jd", dropped),
+    }
+
+    truncated = False
+    if budget_tokens:
+        # budget in characters, matching estimate_tokens (a joined line costs len + 1)
+        excess = sum(len(_join(v)) for v in docs.values()) - max(budget_tokens - overhead_tokens, 0) * 4
+        # drop low-value sections whole, lowest first (the JD's blurbs before the resume's)
+        optional = sorted(((s["value"], 0 if k == "jd" else 1, k, s) for k, v in docs.items() for s in v
+                           if s["value"] < PREAMBLE_VALUE["resume"]), key=lambda c: c[:2])
+        for _, _, kind, section in optional:
+            if excess <= 0:
+                break
+            docs[kind].remove(section)
+            dropped.append(f"{kind}:{section['name']}")
+            excess -= sum(len(line) + 1 for line in section["lines"])
+        # then cut the longest core sections from the end (older roles, trailing bullets)
+        core = sorted((s for v in docs.values() for s in v), key=lambda s: -sum(map(len, s["lines"])))
+        for section in core:
+            while len(section["lines"]) > 1 and excess > 0:
+                excess -= len(section["lines"].pop()) + 1
+                truncated = True
+
+    resume_out, jd_out = _join(docs["resume"]), _join(docs["jd"])
+    tokens_after = estimate_tokens(resume_out) + estimate_tokens(jd_out)
+    return {
+        "resume": resume_out,
+        "jd": jd_out,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+        "dropped": dropped,
+        "truncated": truncated,
+    }
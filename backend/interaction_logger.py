@@ -0,0 +1,123 @@
+# interaction_logger.py
+"""Write-behind pipeline for analytics events.
+
+Callers enqueue documents and return immediately; a daemon thread drains
+the queue and hands lists of up to `batch_size` docs to `commit_batch`
+(Firestore caps a WriteBatch at 500 writes). A batch is committed when it
+is full or `flush_interval_s` after its first doc arrived, whichever comes
+first. When the queue is full, submit() waits at most `put_timeout_s` and
+then drops the event rather than stalling the Streamlit rerun.
+"""
+import atexit
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class _FlushMarker:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class BatchedWriter:
+    def __init__(self, commit_batch: Callable[[List[dict]], None], max_queue: int = 10000,
+                 batch_size: int = 500, flush_interval_s: float = 1.0, put_timeout_s: float = 0.01):
+        self._commit_batch = commit_batch
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.put_timeout_s = put_timeout_s
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._counters = {"enqueued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+        self._latency_ms_total = 0.0
+        self._latency_ms_max = 0.0
+
+    def submit(self, doc: dict) -> bool:
+        """Queue one doc for writing. Returns False if it was dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put((time.monotonic(), doc), timeout=self.put_timeout_s)
+        except queue.Full:
+            with self._lock:
+                self._counters["dropped"] += 1
+            return False
+        with self._lock:
+            self._counters["enqueued"] += 1
+        return True
+
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """Block until everything queued before this call is committed."""
+        if self._thread is None:
+            return True
+        marker = _FlushMarker()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            written = self._counters["written"]
+            return {
+                **self._counters,
+                "queue_depth": self._queue.qsize(),
+                "avg_latency_ms": round(self._latency_ms_total / written, 1) if written else 0.0,
+                "max_latency_ms": round(self._latency_ms_max, 1),
+            }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="interaction-logger", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            batch, markers = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval_s
+            while True:
+                if isinstance(item, _FlushMarker):
+                    markers.append(item)
+                    break  # flush requested: commit what we have now
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for m in markers:
+                m.done.set()
+
+    def _write(self, batch: list):
+        docs = [doc for _, doc in batch]
+        for attempt in (1, 2):
+            try:
+                self._commit_batch(docs)
+                break
+            except Exception as e:
+                print(f"Interaction log batch commit failed (attempt {attempt}):", e)
+        else:
+            with self._lock:
+                self._counters["failed"] += len(docs)
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._counters["written"] += len(docs)
+            self._counters["batches"] += 1
+            for enqueued_at, _ in batch:
+                latency = (now - enqueued_at) * 1000
+                self._latency_ms_total += latency
+                self._latency_ms_max = max(self._latency_ms_max, latency)
@@ -0,0 +1,155 @@
+# llm_cache.py
+"""Content-addressed cache for LLM responses.
+
+Keys are a hash of (prompt version, model, rendered prompt), so identical
+inputs map to the same entry no matter which session produced them. The
+in-memory tier is an LRU bounded by entry count, total bytes and a TTL; an
+optional SQLite file keeps responses across restarts.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict
+
+
+def cache_key(prompt: str, model: str, prompt_version: str) -> str:
+    h = hashlib.sha256()
+    for part in (prompt_version, model, prompt):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class SQLiteTier:
+    """Persistent second tier: one row per key, expired rows ignored on read.
+    Expired rows are deleted at startup and, at most every prune_interval_s,
+    on put; the newest max_rows are kept."""
+
+    def __init__(self, path: str, ttl_s: float, max_rows: int = 10000, prune_interval_s: float = 60.0):
+        self.ttl_s = ttl_s
+        self.max_rows = max_rows
+        self.prune_interval_s = prune_interval_s
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache (created)")
+        with self._lock:
+            self._prune()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT text, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_s:
+            return None
+        return row[0]
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, text, created) VALUES (?, ?, ?)",
+                (key, text, time.time()),
+            )
+            self._conn.commit()
+            if time.monotonic() - self._pruned_at >= self.prune_interval_s:
+                self._prune()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def _prune(self):
+        # caller holds self._lock
+        self._conn.execute("DELETE FROM llm_cache WHERE created < ?", (time.time() - self.ttl_s,))
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN "
+            "(SELECT key FROM llm_cache ORDER BY created DESC LIMIT -1 OFFSET ?)", (self.max_rows,),
+        )
+        self._conn.commit()
+        self._pruned_at = time.monotonic()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+
+class LLMCache:
+    """Thread-safe LRU with TTL and byte budget, optionally backed by SQLiteTier."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_s: float,
+                 persistent: Optional[SQLiteTier] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.persistent = persistent
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (text, size, stored_at)
+        self._bytes = 0
+        self._counters = {"hits": 0, "misses": 0, "persistent_hits": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.monotonic() - entry[2] <= self.ttl_s:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return entry[0]
+                self._drop(key)
+                self._counters["expirations"] += 1
+        text = self.persistent.get(key) if self.persistent else None
+        with self._lock:
+            if text is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["persistent_hits"] += 1
+            self._store(key, text)
+        return text
+
+    def put(self, key: str, text: str):
+        if not text:
+            return
+        with self._lock:
+            self._store(key, text)
+        if self.persistent:
+            try:
+                self.persistent.put(key, text)
+            except sqlite3.Error as e:
+                print("LLM cache persistent write failed:", e)
+
+    def discard(self, key: str):
+        """Forget an entry (e.g. an answer that turned out to be unusable)."""
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+        if self.persistent:
+            try:
+                self.persistent.delete(key)
+            except sqlite3.Error as e:
+                print("LLM cache persistent delete failed:", e)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._counters, "entries": len(self._entries), "bytes": self._bytes}
+
+    # --- callers hold self._lock ---
+    def _drop(self, key: str):
+        text, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _store(self, key: str, text: str):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (text, size, time.monotonic())
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self._counters["evictions"] += 1
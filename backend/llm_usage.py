@@ -0,0 +1,101 @@
+# llm_usage.py
+"""Token / latency / cost accounting for LLM calls.
+
+core_llm attaches a usage dict to every result:
+
+    {"model", "region", "prompt_tokens", "context_cached_tokens", "output_tokens",
+     "thinking_tokens", "total_tokens", "finish_reason", "latency_ms", "cost_usd", "cached"}
+
+context_cached_tokens is the part of prompt_tokens served from a Vertex
+context cache (see context_cache.py); it is billed at a discount.
+
+UsageAggregator keeps running totals for the whole process and per user
+(bounded LRU, so a long-lived instance doesn't grow without limit). The
+totals are per instance; the interaction logs carry the per-call records
+for anything cross-instance (see evaluate_logs.py).
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from settings import LLM_PRICE_INPUT_PER_M, LLM_PRICE_OUTPUT_PER_M
+
+# USD per 1M tokens (input, output incl. thinking); unknown models use the settings default
+PRICES_PER_M = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+}
+
+# context-cached input tokens cost this fraction of the input price (Gemini 2.5)
+CACHED_INPUT_PRICE_RATIO = 0.25
+
+
+def cost_usd(model: str, prompt_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    price_in, price_out = PRICES_PER_M.get(model, (LLM_PRICE_INPUT_PER_M, LLM_PRICE_OUTPUT_PER_M))
+    billed_in = prompt_tokens - cached_tokens * (1 - CACHED_INPUT_PRICE_RATIO)
+    return round((billed_in * price_in + output_tokens * price_out) / 1e6, 8)
+
+
+def make_usage(model: str, region: str, prompt_tokens: int = 0, output_tokens: int = 0,
+               thinking_tokens: int = 0, finish_reason: Optional[str] = None,
+               latency_ms: Optional[float] = None, cached: bool = False,
+               context_cached_tokens: int = 0) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "region": region,
+        "prompt_tokens": int(prompt_tokens),
+        "context_cached_tokens": int(context_cached_tokens),
+        "output_tokens": int(output_tokens),
+        "thinking_tokens": int(thinking_tokens),
+        "total_tokens": int(prompt_tokens + output_tokens + thinking_tokens),
+        "finish_reason": finish_reason,
+        "latency_ms": latency_ms,
+        "cost_usd": cost_usd(model, prompt_tokens, output_tokens + thinking_tokens, context_cached_tokens),
+        "cached": cached,
+    }
+
+
+_FIELDS = ("prompt_tokens", "context_cached_tokens", "output_tokens", "thinking_tokens", "total_tokens",
+           "cost_usd")
+
+
+def _empty() -> Dict[str, float]:
+    return {"calls": 0, "cached_calls": 0, "latency_ms": 0.0, **{f: 0 for f in _FIELDS}}
+
+
+class UsageAggregator:
+    def __init__(self, max_users: int = 4096):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._global = _empty()
+        self._users: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+
+    def record(self, uid: Optional[str], usage: Optional[Dict[str, Any]]):
+        if not usage:
+            return
+        with self._lock:
+            targets = [self._global]
+            if uid:
+                totals = self._users.get(uid)
+                if totals is None:
+                    totals = self._users[uid] = _empty()
+                    while len(self._users) > self.max_users:
+                        self._users.popitem(last=False)
+                self._users.move_to_end(uid)
+                targets.append(totals)
+            for t in targets:
+                t["calls"] += 1
+                t["cached_calls"] += bool(usage.get("cached"))
+                t["latency_ms"] += usage.get("latency_ms") or 0.0
+                for f in _FIELDS:
+                    t[f] += usage.get(f) or 0
+
+    def totals(self, uid: Optional[str] = None) -> Dict[str, float]:
+        """Running totals (plus mean latency) for one user, or the whole process."""
+        with self._lock:
+            t = dict(self._users.get(uid, _empty()) if uid else self._global)
+        t["cost_usd"] = round(t["cost_usd"], 6)
+        t["mean_latency_ms"] = round(t["latency_ms"] / t["calls"], 1) if t["calls"] else 0.0
+        return t
@@ -0,0 +1,209 @@
+# metrics.py
+"""In-process latency histograms and counters, Prometheus text format.
+
+    @timed("db_ops.save_letter")          # decorator
+    with timer("auth.verify_id_token"):   # context manager
+    observe("home.rerun", elapsed_ms)     # direct
+
+Recording costs two perf_counter_ns() calls, a lock and a bisect, which
+is a few microseconds at most. Other modules can expose their own stats
+dicts (cache counters, queue depth, ...) with register_collector(). Read
+the results with render(), a local HTTP endpoint (METRICS_PORT), or a file
+rewritten every few seconds (METRICS_FILE).
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+# upper bounds in ms; the last bucket is +Inf
+BUCKETS_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum_ms", "count", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.sum_ms = 0.0
+        self.count = 0
+        self.errors = 0
+
+
+_lock = threading.Lock()
+_histograms: Dict[str, _Histogram] = {}
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+
+def observe(name: str, elapsed_ms: float, error: bool = False):
+    i = bisect.bisect_left(BUCKETS_MS, elapsed_ms)
+    with _lock:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = _Histogram()
+        h.counts[i] += 1
+        h.sum_ms += elapsed_ms
+        h.count += 1
+        if error:
+            h.errors += 1
+
+
+def inc(name: str, n: float = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+
+def register_collector(prefix: str, fn: Callable[[], Dict[str, float]]):
+    """fn() is called at render time; numeric values become gauges named prefix_key."""
+    _collectors[prefix] = fn
+
+
+@contextmanager
+def timer(name: str):
+    t0 = time.perf_counter_ns()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        observe(name, (time.perf_counter_ns() - t0) / 1e6, error)
+
+
+def timed(name: Optional[str] = None):
+    """Decorator recording the wrapped function's latency and exceptions."""
+    def wrap(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            t0 = time.perf_counter_ns()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                observe(label, (time.perf_counter_ns() - t0) / 1e6, True)
+                raise
+            observe(label, (time.perf_counter_ns() - t0) / 1e6)
+            return result
+        return inner
+    return wrap
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """{op: {count, errors, mean_ms, p50_ms, p95_ms, p99_ms}} (percentiles are bucket bounds)."""
+    with _lock:
+        items = [(k, list(h.counts), h.sum_ms, h.count, h.errors) for k, h in _histograms.items()]
+    out = {}
+    for name, counts, sum_ms, count, errors in sorted(items):
+        def pct(q):
+            target, seen = q * count, 0
+            for i, c in enumerate(counts):
+                seen += c
+                if seen >= target:
+                    return BUCKETS_MS[i] if i < len(BUCKETS_MS) else float("inf")
+            return float("inf")
+        out[name] = {"count": count, "errors": errors, "mean_ms": round(sum_ms / count, 3) if count else 0.0,
+                     "p50_ms": pct(0.5), "p95_ms": pct(0.95), "p99_ms": pct(0.99)}
+    return out
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _metric_name(raw: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in raw)
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    with _lock:
+        hists = [(k, list(h.counts), h.sum_ms, h.count, h.errors) for k, h in sorted(_histograms.items())]
+        counters = sorted(_counters.items())
+        gauges = dict(_gauges)
+    for prefix, fn in list(_collectors.items()):
+        try:
+            for key, value in fn().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges[f"{prefix}_{key}"] = value
+        except Exception as e:
+            print(f"metrics collector {prefix} failed:", e)
+
+    lines = ["# TYPE genie_latency_ms histogram"]
+    for name, counts, sum_ms, count, _ in hists:
+        op = _label(name)
+        running = 0
+        for bound, c in zip(BUCKETS_MS + ("+Inf",), counts):
+            running += c
+            lines.append(f'genie_latency_ms_bucket{{op="{op}",le="{bound}"}} {running}')
+        lines.append(f'genie_latency_ms_sum{{op="{op}"}} {sum_ms:.3f}')
+        lines.append(f'genie_latency_ms_count{{op="{op}"}} {count}')
+    lines.append("# TYPE genie_errors_total counter")
+    for name, _, _, _, errors in hists:
+        lines.append(f'genie_errors_total{{op="{_label(name)}"}} {errors}')
+    for name, value in counters:
+        lines.append(f"# TYPE genie_{_metric_name(name)}_total counter")
+        lines.append(f"genie_{_metric_name(name)}_total {value}")
+    for name, value in sorted(gauges.items()):
+        lines.append(f"# TYPE genie_{_metric_name(name)} gauge")
+        lines.append(f"genie_{_metric_name(name)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- exposition ----------
+_exporters_started = set()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1"):
+    """Serve render() at http://host:port/ (idempotent per process)."""
+    with _lock:
+        if ("http", port) in _exporters_started:
+            return
+        _exporters_started.add(("http", port))
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+
+
+def start_file_exporter(path: str, interval_s: float = 10.0):
+    """Rewrite `path` with render() every interval_s (idempotent per process)."""
+    with _lock:
+        if ("file", path) in _exporters_started:
+            return
+        _exporters_started.add(("file", path))
+
+    def loop():
+        while True:
+            time.sleep(interval_s)
+            try:
+                with open(path + ".tmp", "w") as f:
+                    f.write(render())
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                print("metrics file export failed:", e)
+
+    threading.Thread(target=loop, name="metrics-file", daemon=True).start()
@@ -7,9 +7,26 @@ Original file is located at
     https://colab.research.google.com/drive/1jtil55wJ1XegMHPninAiEZCmBTpmN7aI
 """
 
-BASE_PROMPT = """You are a helpful assistant that writes tailored application letters.
+# Bump whenever a template below changes; it is part of the LLM cache key
+PROMPT_VERSION = "p1.1"
 
-Write a {length_style} {format_style} for the following job, emphasizing: {highlights}.
+# Resume and JD come first and are identical in every template, so they form
+# a stable prefix: core_llm can reuse one Vertex context cache for the draft,
+# the suggestions and every regeneration. Only the text after INPUTS_END
+# varies between templates.
+INPUTS_END = "=== END OF INPUTS ==="
+
+INPUT_PREFIX = """=== RESUME ===
+{resume}
+
+=== JOB DESCRIPTION ===
+{jd}
+
+""" + INPUTS_END + "\n\n"
+
+DRAFT_INSTRUCTIONS = """You are a helpful assistant that writes tailored application letters.
+
+Write a {length_style} {format_style} for the job above, emphasizing: {highlights}.
 
 Tone: professional, concise, positive
 
@@ -19,17 +36,10 @@ Start with a friendly greetings, depends on the context of who the user wants to
 
 if either the resume or job description is obviously random or empty or generic, draft a funny note to call out there is nothing for it to write a draft for. 
 
-prioritize the user input for the length: {length_style}, emphasizing: {highlights}, format: {format_style}. 
-
-=== RESUME ===
-{resume}
-
-=== JOB DESCRIPTION ===
-{jd}
+prioritize the user input for the length: {length_style}, emphasizing: {highlights}, format: {format_style}.
 """
 
-SUGGESTION_PROMPT = """
-You are a professional career coach and hiring specialist.
+SUGGESTION_INSTRUCTIONS = """You are a professional career coach and hiring specialist.
 Given the job post and the candidate’s resume, provide only practical suggestions to improve the cover letter or resume.
 
 The suggestion should focus on the person's work experience in the resume. 
@@ -91,11 +101,32 @@ work experience: what to improve and a brief why (1-2 sentences).
 ;
 
 The suggestion does not need to cover all parts of the resume, especially the optional parts, only include them if there is something relevant to improve there;
+"""
 
-=== RESUME ===
-{resume}
+BASE_PROMPT = INPUT_PREFIX + DRAFT_INSTRUCTIONS
 
-=== JOB DESCRIPTION ===
-{jd}
+SUGGESTION_PROMPT = INPUT_PREFIX + SUGGESTION_INSTRUCTIONS
+
+# One call for both outputs (GENERATION_MODE=combined): the two instruction
+# sets above after the same prefix, and a JSON object back.
+COMBINED_PROMPT = INPUT_PREFIX + (
+    "You will produce two things for the resume and job description above:\n"
+    "a tailored letter (\"draft\") and resume suggestions (\"suggestions\").\n\n"
+    "##### INSTRUCTIONS FOR \"draft\" #####\n"
+    + DRAFT_INSTRUCTIONS.strip()
+    + "\n\n##### INSTRUCTIONS FOR \"suggestions\" #####\n"
+    + SUGGESTION_INSTRUCTIONS.strip()
+    + """
 
+##### OUTPUT #####
+Return a single JSON object with exactly two string fields:
+{{"draft": "<the letter>", "suggestions": "<the suggestions, markdown allowed>"}}
 """
+)
+
+# Gemini response_schema (OpenAPI subset) enforcing the shape above
+COMBINED_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"draft": {"type": "STRING"}, "suggestions": {"type": "STRING"}},
+    "required": ["draft", "suggestions"],
+}
@@ -9,27 +9,137 @@ Original file is located at
 
 # settings.py
 import os
-import firebase_init  # ensures Firebase Admin is initialized
 from dotenv import load_dotenv
 load_dotenv()  # harmless on Cloud Run
 
+# Storage backend: firestore (production) | memory | sqlite (offline, see storage.py)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "genie_hi.sqlite3")
+# Offline runs only: sign everyone in as this email (ignored with the firestore backend)
+DEV_USER_EMAIL = os.getenv("DEV_USER_EMAIL", "") if STORAGE_BACKEND != "firestore" else ""
+
 PROJECT_ID = "genie-hi-front"#os.getenv("FIREBASE_PROJECT_ID", "")
 GOOGLE_APPLICATION_CREDENTIALS = "service-account-genie-hi-front.json"#os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 
-# LLM provider — default to Vertex (you don’t have openai in requirements)
+# LLM provider — default to Vertex (you don’t have openai in requirements).
+# FAKE = deterministic offline stand-in for benchmarks (see fake_llm.py)
 LLM_PROVIDER = (os.getenv("LLM_PROVIDER") or "VERTEX").upper()
 VERTEX_REGION = os.getenv("VERTEX_REGION", "us-central1")
 VERTEX_MODEL  = os.getenv("VERTEX_MODEL", "gemini-2.5-flash")
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "lognormal:0.6,0.4")
+FAKE_LLM_TAIL_PROB = float(os.getenv("FAKE_LLM_TAIL_PROB", "0.02"))
+FAKE_LLM_TAIL_MULT = float(os.getenv("FAKE_LLM_TAIL_MULT", "6"))
+FAKE_LLM_TOKENS_PER_S = float(os.getenv("FAKE_LLM_TOKENS_PER_S", "120"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+FAKE_LLM_BAD_JSON_RATE = float(os.getenv("FAKE_LLM_BAD_JSON_RATE", "0"))
+# two_call = draft + suggestions prompts; combined = one JSON-mode call for both
+# (falls back to two_call if the JSON is unusable); ab = split users 50/50 by uid
+GENERATION_MODE = (os.getenv("GENERATION_MODE") or "two_call").lower()
+# Model routing (core_llm.ROUTES): chat messages and referral blurbs go to
+# LLM_LIGHT_MODEL with tight output caps unless the prompt is over
+# LLM_LIGHT_MAX_INPUT_TOKENS; LLM_ROUTING=0 sends everything to VERTEX_MODEL uncapped
+LLM_ROUTING = os.getenv("LLM_ROUTING", "1").lower() in ("1", "true", "yes")
+LLM_LIGHT_MODEL = os.getenv("LLM_LIGHT_MODEL", "gemini-2.5-flash-lite")
+LLM_LIGHT_MAX_INPUT_TOKENS = int(os.getenv("LLM_LIGHT_MAX_INPUT_TOKENS", "6000"))
+# Threads shared by all sessions for concurrent LLM calls (draft + suggestions)
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "8"))
+# USD per 1M tokens for models missing from llm_usage.PRICES_PER_M
+LLM_PRICE_INPUT_PER_M = float(os.getenv("LLM_PRICE_INPUT_PER_M", "0.30"))
+LLM_PRICE_OUTPUT_PER_M = float(os.getenv("LLM_PRICE_OUTPUT_PER_M", "2.50"))
+
+# Resume/JD clean-up before prompting (see input_compaction.py) and the
+# per-prompt input budget in estimated tokens, template included (0 = no limit)
+INPUT_COMPACTION = os.getenv("INPUT_COMPACTION", "1").lower() in ("1", "true", "yes")
+PROMPT_TOKEN_BUDGET_DRAFT = int(os.getenv("PROMPT_TOKEN_BUDGET_DRAFT", "8000"))
+PROMPT_TOKEN_BUDGET_SUGGESTIONS = int(os.getenv("PROMPT_TOKEN_BUDGET_SUGGESTIONS", "8000"))
+
+# Vertex context caching of the resume/JD prefix (context_cache.py); a local
+# stand-in is used with LLM_PROVIDER=FAKE. Prefixes under the minimum are
+# sent inline (Vertex rejects small caches).
+CONTEXT_CACHE = os.getenv("CONTEXT_CACHE", "1").lower() in ("1", "true", "yes")
+CONTEXT_CACHE_TTL_S = float(os.getenv("CONTEXT_CACHE_TTL_S", "900"))
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "64"))
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "1024"))
+
+# Admission control in front of the LLM (admission.py): instance-wide
+# requests/tokens per minute (0 = unlimited), each uid's slice of the RPM,
+# and how long a call may queue before it is rejected with a "busy" message
+LLM_RPM = float(os.getenv("LLM_RPM", "300"))
+LLM_TPM = float(os.getenv("LLM_TPM", "2000000"))
+LLM_USER_SHARE = float(os.getenv("LLM_USER_SHARE", "0.2"))
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "100"))
+LLM_ADMISSION_DEADLINE_S = float(os.getenv("LLM_ADMISSION_DEADLINE_S", "10"))
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "1000"))
+
+# Resilient provider calls (call_policy.py): attempts per call, each with its
+# own deadline (streams: until the first chunk), full-jitter exponential
+# backoff between them, regions tried after VERTEX_REGION (comma-separated),
+# and hedging: a call still running at the recent p95 latency gets a twin in
+# the next region, for at most LLM_HEDGE_MAX_RATIO of calls (off unless
+# LLM_FALLBACK_REGIONS names another region). LLM_CALL_DEADLINE_S also
+# bounds the rest of a stream after its first chunk.
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_ATTEMPT_TIMEOUT_S = float(os.getenv("LLM_ATTEMPT_TIMEOUT_S", "60"))
+LLM_STREAM_FIRST_CHUNK_TIMEOUT_S = float(os.getenv("LLM_STREAM_FIRST_CHUNK_TIMEOUT_S", "20"))
+LLM_CALL_DEADLINE_S = float(os.getenv("LLM_CALL_DEADLINE_S", "120"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "8"))
+LLM_FALLBACK_REGIONS = [r.strip() for r in os.getenv("LLM_FALLBACK_REGIONS", "").split(",") if r.strip()]
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1").lower() in ("1", "true", "yes")
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.05"))
+
+# Circuit breaker around the provider (circuit_breaker.py): opens when, over
+# the last LLM_BREAKER_WINDOW_S, at least LLM_BREAKER_MIN_CALLS attempts ran
+# and the error (or slow-call) rate reached its threshold; after
+# LLM_BREAKER_OPEN_S, LLM_BREAKER_PROBES successful probes close it again.
+# While open: the cached answer, else LLM_DEGRADED_MODEL ("" = none), else "try again"
+LLM_BREAKER = os.getenv("LLM_BREAKER", "1").lower() in ("1", "true", "yes")
+LLM_BREAKER_WINDOW_S = float(os.getenv("LLM_BREAKER_WINDOW_S", "60"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_SLOW_CALL_S = float(os.getenv("LLM_BREAKER_SLOW_CALL_S", "30"))
+LLM_BREAKER_SLOW_RATE = float(os.getenv("LLM_BREAKER_SLOW_RATE", "0.8"))
+LLM_BREAKER_OPEN_S = float(os.getenv("LLM_BREAKER_OPEN_S", "30"))
+LLM_BREAKER_PROBES = int(os.getenv("LLM_BREAKER_PROBES", "2"))
+LLM_DEGRADED_MODEL = os.getenv("LLM_DEGRADED_MODEL", "gemini-2.5-flash-lite")
+# the degraded model shares the provider, so it gets a short timeout and its
+# own breaker: after LLM_DEGRADED_MIN_CALLS failures in the window it is
+# skipped too (a provider-wide outage) and requests get "try again" at once
+LLM_DEGRADED_TIMEOUT_S = float(os.getenv("LLM_DEGRADED_TIMEOUT_S", "2"))
+LLM_DEGRADED_MIN_CALLS = int(os.getenv("LLM_DEGRADED_MIN_CALLS", "3"))
+
+# LLM response cache (in-memory LRU; set LLM_CACHE_DB to a file path for a SQLite tier)
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", "3600"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")
+LLM_CACHE_DB_MAX_ROWS = int(os.getenv("LLM_CACHE_DB_MAX_ROWS", "10000"))  # newest rows kept in the SQLite tier
+
+# Write-behind interaction logging (Firestore WriteBatch holds at most 500 writes)
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+LOG_BATCH_SIZE = min(int(os.getenv("LOG_BATCH_SIZE", "500")), 500)
+LOG_FLUSH_INTERVAL_S = float(os.getenv("LOG_FLUSH_INTERVAL_S", "1.0"))
+LOG_PUT_TIMEOUT_S = float(os.getenv("LOG_PUT_TIMEOUT_S", "0.01"))
+
+# Edit history: store a full copy every N versions, diffs in between
+EDIT_KEYFRAME_INTERVAL = max(1, int(os.getenv("EDIT_KEYFRAME_INTERVAL", "10")))
+# Edit distances above this are recorded as cutoff + 1 (keeps autosave cost bounded)
+EDIT_DISTANCE_CUTOFF = int(os.getenv("EDIT_DISTANCE_CUTOFF", "5000"))
+
+# Autosave: persist an edit once the user pauses this long (or at most this late)
+AUTOSAVE_WINDOW_S = float(os.getenv("AUTOSAVE_WINDOW_S", "3"))
+AUTOSAVE_MAX_WAIT_S = float(os.getenv("AUTOSAVE_MAX_WAIT_S", "15"))
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+# Latency metrics: serve Prometheus text on 127.0.0.1:METRICS_PORT and/or
+# rewrite METRICS_FILE periodically (0 / blank = off); DEBUG_METRICS shows a sidebar panel
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_FILE_INTERVAL_S = float(os.getenv("METRICS_FILE_INTERVAL_S", "10"))
+DEBUG_METRICS = os.getenv("DEBUG_METRICS", "").lower() in ("1", "true", "yes")
 
 def get_db():
-    if not firebase_admin._apps:
-        if GOOGLE_APPLICATION_CREDENTIALS and os.path.exists(GOOGLE_APPLICATION_CREDENTIALS):
-            cred = credentials.Certificate(GOOGLE_APPLICATION_CREDENTIALS)
-            firebase_admin.initialize_app(cred, {"projectId": PROJECT_ID} if PROJECT_ID else None)
-        else:
-            # Cloud Run uses Application Default Credentials automatically
-            firebase_admin.initialize_app()
-    return firestore.client()
+    # kept for existing callers; the client itself lives in firebase_init
+    from firebase_init import get_firestore
+    return get_firestore()
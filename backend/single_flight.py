@@ -0,0 +1,68 @@
+# single_flight.py
+"""Coalesce concurrent identical calls into one (Go's singleflight).
+
+The first caller for a key becomes the leader and does the work; callers
+arriving while it is in flight wait for the leader's outcome instead of
+repeating the call, and share its result or its exception. Nothing is
+remembered afterwards; that is the response cache's job.
+
+    result, shared = flights.do(key, lambda: expensive(prompt))
+
+For work that can't be wrapped in one call (a stream), use begin()/end().
+"""
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._counters = {"leaders": 0, "coalesced": 0, "shared_errors": 0}
+
+    def begin(self, key: str) -> Tuple[Future, bool]:
+        """(future, is_leader). The leader must call end() exactly once."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self._counters["leaders"] += 1
+            return future, True
+
+    def end(self, key: str, future: Future, result: Any = None, error: BaseException = None):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def wait(self, future: Future) -> Any:
+        """A follower's view of the leader's outcome (re-raises its error)."""
+        try:
+            return future.result()
+        except BaseException:
+            with self._lock:
+                self._counters["shared_errors"] += 1
+            raise
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(result, shared); shared=True means another caller's call produced it."""
+        future, leader = self.begin(key)
+        if not leader:
+            return self.wait(future), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self.end(key, future, error=e)
+            raise
+        self.end(key, future, result=result)
+        return result, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._counters, "in_flight": len(self._calls)}
@@ -0,0 +1,244 @@
+# storage.py
+"""Pluggable document storage behind db_ops_async.
+
+db_ops_async addresses data by Firestore-style slash paths
+("users/{uid}/sessions/{sid}/letters/latest_final"). Every backend
+implements the same small async interface over those paths:
+
+  firestore - the production store (google.cloud.firestore.AsyncClient)
+  memory    - a dict in this process; nothing persists
+  sqlite    - a local file (WAL mode, batched writes); no GCP needed
+
+Pick one with STORAGE_BACKEND. Non-Firestore backends let the whole
+home.py flow run offline for load tests and profiling.
+"""
+import asyncio
+import copy
+import json
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from settings import STORAGE_BACKEND, SQLITE_PATH
+
+
+class _ServerTimestamp:
+    def __repr__(self):
+        return "SERVER_TIMESTAMP"
+
+# use in place of firestore.SERVER_TIMESTAMP; each backend resolves it on write
+SERVER_TIMESTAMP = _ServerTimestamp()
+
+Write = Tuple[str, dict]  # (document path, data)
+
+
+def _parent(path: str) -> str:
+    return path.rsplit("/", 1)[0]
+
+
+def _stamp(data: dict, now) -> dict:
+    return {k: (now if v is SERVER_TIMESTAMP else v) for k, v in data.items()}
+
+
+class Storage(ABC):
+    """Async document store. Paths alternate collection/doc like Firestore."""
+
+    name = "base"
+
+    def new_id(self) -> str:
+        return uuid.uuid4().hex[:20]
+
+    @abstractmethod
+    async def set(self, path: str, data: dict, merge: bool = False):
+        ...
+
+    async def add(self, collection: str, data: dict) -> str:
+        doc_id = self.new_id()
+        await self.set(f"{collection}/{doc_id}", data)
+        return doc_id
+
+    @abstractmethod
+    async def get(self, path: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def get_many(self, paths: List[str]) -> Dict[str, dict]:
+        """{path: data} for the paths that exist."""
+
+    @abstractmethod
+    async def latest(self, collection: str, field: str, value, order_by: str) -> Optional[dict]:
+        """Newest doc in `collection` with data[field] == value, by `order_by`."""
+
+    @abstractmethod
+    async def commit(self, writes: Iterable[Write]):
+        """Write several documents (full overwrite) in one round-trip."""
+
+
+class FirestoreStorage(Storage):
+    name = "firestore"
+
+    def __init__(self):
+        from google.cloud import firestore as gcf
+        from firebase_init import get_async_firestore
+        self._gcf = gcf
+        self._client = get_async_firestore
+
+    def _resolve(self, data: dict) -> dict:
+        return _stamp(data, self._gcf.SERVER_TIMESTAMP)
+
+    async def set(self, path: str, data: dict, merge: bool = False):
+        await self._client().document(path).set(self._resolve(data), merge=merge)
+
+    async def get(self, path: str) -> Optional[dict]:
+        snap = await self._client().document(path).get()
+        return snap.to_dict() if snap.exists else None
+
+    async def get_many(self, paths: List[str]) -> Dict[str, dict]:
+        client = self._client()
+        refs = [client.document(p) for p in paths]
+        return {snap.reference.path: snap.to_dict() async for snap in client.get_all(refs) if snap.exists}
+
+    async def latest(self, collection: str, field: str, value, order_by: str) -> Optional[dict]:
+        docs = await self._client().collection(collection).where(field, "==", value) \
+            .order_by(order_by, direction=self._gcf.Query.DESCENDING).limit(1).get()
+        return docs[0].to_dict() if docs else None
+
+    async def commit(self, writes: Iterable[Write]):
+        client = self._client()
+        batch = client.batch()
+        for path, data in writes:
+            batch.set(client.document(path), self._resolve(data))
+        await batch.commit()
+
+
+class MemoryStorage(Storage):
+    name = "memory"
+
+    def __init__(self):
+        self._docs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    async def set(self, path: str, data: dict, merge: bool = False):
+        data = _stamp(copy.deepcopy(data), datetime.utcnow())
+        with self._lock:
+            if merge and path in self._docs:
+                self._docs[path].update(data)
+            else:
+                self._docs[path] = data
+
+    async def get(self, path: str) -> Optional[dict]:
+        with self._lock:
+            doc = self._docs.get(path)
+            return copy.deepcopy(doc) if doc is not None else None
+
+    async def get_many(self, paths: List[str]) -> Dict[str, dict]:
+        with self._lock:
+            return {p: copy.deepcopy(self._docs[p]) for p in paths if p in self._docs}
+
+    async def latest(self, collection: str, field: str, value, order_by: str) -> Optional[dict]:
+        with self._lock:
+            matches = [d for p, d in self._docs.items() if _parent(p) == collection and d.get(field) == value]
+        if not matches:
+            return None
+        return copy.deepcopy(max(matches, key=lambda d: d.get(order_by) or datetime.min))
+
+    async def commit(self, writes: Iterable[Write]):
+        now = datetime.utcnow()
+        staged = [(path, _stamp(copy.deepcopy(data), now)) for path, data in writes]
+        with self._lock:
+            self._docs.update(staged)
+
+    def count(self, collection_prefix: str = "") -> int:
+        with self._lock:
+            return sum(1 for p in self._docs if p.startswith(collection_prefix))
+
+
+class SQLiteStorage(Storage):
+    """One `docs` table keyed by path. Calls run in a worker thread so the
+    event loop is never blocked; commit() is a single executemany transaction."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs (path TEXT PRIMARY KEY, parent TEXT NOT NULL, data TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS docs_parent ON docs (parent)")
+        self._conn.commit()
+
+    @staticmethod
+    def _dump(data: dict) -> str:
+        return json.dumps(_stamp(data, datetime.utcnow()), default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v))
+
+    def _set_sync(self, path: str, data: dict, merge: bool):
+        with self._lock, self._conn:
+            if merge:
+                row = self._conn.execute("SELECT data FROM docs WHERE path = ?", (path,)).fetchone()
+                if row:
+                    data = {**json.loads(row[0]), **data}
+            self._conn.execute(
+                "INSERT OR REPLACE INTO docs (path, parent, data) VALUES (?, ?, ?)",
+                (path, _parent(path), self._dump(data)),
+            )
+
+    def _select(self, sql: str, args: tuple) -> list:
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def _commit_sync(self, writes: List[Write]):
+        rows = [(path, _parent(path), self._dump(data)) for path, data in writes]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO docs (path, parent, data) VALUES (?, ?, ?)", rows)
+
+    async def set(self, path: str, data: dict, merge: bool = False):
+        await asyncio.to_thread(self._set_sync, path, data, merge)
+
+    async def get(self, path: str) -> Optional[dict]:
+        rows = await asyncio.to_thread(self._select, "SELECT data FROM docs WHERE path = ?", (path,))
+        return json.loads(rows[0][0]) if rows else None
+
+    async def get_many(self, paths: List[str]) -> Dict[str, dict]:
+        if not paths:
+            return {}
+        marks = ",".join("?" * len(paths))
+        rows = await asyncio.to_thread(self._select, f"SELECT path, data FROM docs WHERE path IN ({marks})", tuple(paths))
+        return {p: json.loads(d) for p, d in rows}
+
+    async def latest(self, collection: str, field: str, value, order_by: str) -> Optional[dict]:
+        rows = await asyncio.to_thread(
+            self._select,
+            "SELECT data FROM docs WHERE parent = ? AND json_extract(data, ?) = ? "
+            "ORDER BY json_extract(data, ?) DESC LIMIT 1",
+            (collection, f"$.{field}", value, f"$.{order_by}"),
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    async def commit(self, writes: Iterable[Write]):
+        await asyncio.to_thread(self._commit_sync, list(writes))
+
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+def get_storage() -> Storage:
+    """The process-wide backend selected by STORAGE_BACKEND."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == "memory":
+                    _storage = MemoryStorage()
+                elif STORAGE_BACKEND == "sqlite":
+                    _storage = SQLiteStorage(SQLITE_PATH)
+                elif STORAGE_BACKEND == "firestore":
+                    _storage = FirestoreStorage()
+                else:
+                    raise ValueError(f"Unsupported STORAGE_BACKEND={STORAGE_BACKEND}")
+    return _storage
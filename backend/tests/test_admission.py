@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def test_admits_within_burst_then_rejects_past_deadline():
+    # 60 rpm with a 2 s burst: two calls fit, the third would wait ~1 s
+    controller = AdmissionController(rpm=60, tpm=0, user_share=0, burst_s=2)
+    controller.admit("u", 10)
+    controller.admit("u", 10)
+    with pytest.raises(AdmissionRejected) as e:
+        controller.admit("u", 10, deadline_s=0.1)
+    assert e.value.retry_after_s > 0.1
+    stats = controller.stats()
+    assert stats["admitted"] == 2
+    assert stats["rejected_deadline"] == 1
+
+
+def test_queues_until_capacity_frees_up():
+    controller = AdmissionController(rpm=600, tpm=0, user_share=0, burst_s=0.1)  # 1-call burst, 0.1 s/call
+    controller.admit("u", 10)
+    t0 = time.monotonic()
+    controller.admit("u", 10, deadline_s=1.0)
+    assert time.monotonic() - t0 >= 0.05
+    assert controller.stats()["queued"] == 1
+
+
+def test_rejects_when_wait_queue_is_full():
+    controller = AdmissionController(rpm=60, tpm=0, user_share=0, burst_s=1, max_queue=1)
+    controller.admit("u", 10)
+    waiter = threading.Thread(target=controller.admit, args=("u", 10, 5.0), daemon=True)
+    waiter.start()
+    stop = time.monotonic() + 2
+    while controller.stats()["queue_depth"] == 0 and time.monotonic() < stop:
+        time.sleep(0.01)
+    with pytest.raises(AdmissionRejected):
+        controller.admit("u", 10)
+    assert controller.stats()["rejected_queue_full"] == 1
+
+
+def test_per_user_share_limits_one_user_only():
+    controller = AdmissionController(rpm=60, tpm=0, user_share=0.5, burst_s=4)  # user bucket holds 2
+    controller.admit("a", 10)
+    controller.admit("a", 10)
+    with pytest.raises(AdmissionRejected):
+        controller.admit("a", 10, deadline_s=0)
+    controller.admit("b", 10, deadline_s=0)
+
+
+def test_try_admit_never_waits_or_counts_a_rejection():
+    controller = AdmissionController(rpm=60, tpm=0, user_share=0, burst_s=1)
+    assert controller.try_admit("u", 10) is not None
+    assert controller.try_admit("u", 10) is None
+    stats = controller.stats()
+    assert stats["admitted"] == 1
+    assert stats["rejected_deadline"] == stats["rejected_queue_full"] == 0
+
+
+def test_release_refunds_the_reservation():
+    controller = AdmissionController(rpm=60, tpm=6000, user_share=0, burst_s=1)
+    ticket = controller.try_admit("u", 100)
+    assert controller.try_admit("u", 100) is None
+    ticket.release()
+    assert controller.try_admit("u", 100) is not None
+    assert controller.stats()["released"] == 1
+
+
+def test_settle_charges_actual_tokens():
+    # 600 tpm with a 1 s burst: 10 tokens of capacity
+    controller = AdmissionController(rpm=0, tpm=600, user_share=0, burst_s=1)
+    controller.try_admit(None, 2).settle(9)
+    assert controller.try_admit(None, 2) is None
@@ -0,0 +1,66 @@
+import time
+
+from autosave import AutosaveScheduler
+
+
+def _scheduler(saved, **kwargs):
+    def persist(snapshot, version, prev_text):
+        saved.append((snapshot["key"], version, snapshot["text"], prev_text))
+        return {"text": snapshot["text"], "version": version}
+    return AutosaveScheduler(persist, window_s=60, max_wait_s=60, **kwargs)
+
+
+def _wait_until(cond, timeout_s=2.0):
+    stop = time.monotonic() + timeout_s
+    while not cond() and time.monotonic() < stop:
+        time.sleep(0.01)
+
+
+def test_rapid_edits_coalesce_into_one_version():
+    saved = []
+    autosave = _scheduler(saved)
+    for text in ("a", "ab", "abc"):
+        autosave.submit("k", {"key": "k", "text": text}, base_text="draft")
+    assert autosave.flush("k") == {"text": "abc", "version": 1}
+    assert saved == [("k", 1, "abc", "draft")]
+
+
+def test_edits_after_idle_eviction_continue_the_version_chain():
+    saved = []
+    autosave = _scheduler(saved, idle_evict_s=0.05)
+    autosave.submit("k", {"key": "k", "text": "a"}, base_text="draft")
+    autosave.flush("k")
+    autosave.submit("k", {"key": "k", "text": "ab"}, base_text="draft")
+    autosave.flush("k")
+
+    time.sleep(0.1)
+    autosave.submit("o", {"key": "o", "text": "x"}, base_text="")  # wakes the thread, which evicts "k"
+    _wait_until(lambda: autosave.stats()["checkpoints"] == 1)
+    assert autosave.stats()["checkpoints"] == 1
+    assert autosave.flush("k") == {"text": "ab", "version": 2}
+
+    autosave.submit("k", {"key": "k", "text": "abc"}, base_text="draft")
+    autosave.flush("k")
+    assert [s for s in saved if s[0] == "k"] == [
+        ("k", 1, "a", "draft"),
+        ("k", 2, "ab", "a"),
+        ("k", 3, "abc", "ab"),
+    ]
+
+
+def test_checkpoints_are_capped_and_expire():
+    saved = []
+    autosave = _scheduler(saved, idle_evict_s=0.05, max_checkpoints=2, checkpoint_ttl_s=0.3)
+    for key in ("a", "b", "c"):
+        autosave.submit(key, {"key": key, "text": key}, base_text="")
+        autosave.flush(key)
+
+    time.sleep(0.1)
+    autosave.submit("w", {"key": "w", "text": "x"})  # wakes the thread: evicts a/b/c, keeps the newest two
+    _wait_until(lambda: autosave.stats()["checkpoints"] == 2)
+    assert autosave.stats()["checkpoints"] == 2
+
+    time.sleep(0.35)
+    autosave.submit("w", {"key": "w", "text": "xy"})
+    _wait_until(lambda: autosave.stats()["checkpoints"] == 0)
+    assert autosave.stats()["checkpoints"] == 0
@@ -0,0 +1,68 @@
+import time
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def _breaker(transitions=None, **kwargs):
+    kwargs = {"window_s": 60, "min_calls": 4, "error_rate": 0.5, "slow_call_s": 10, "open_s": 0.05,
+              "probes": 2, **kwargs}
+    if transitions is not None:
+        kwargs["on_transition"] = lambda old, new, details: transitions.append((old, new))
+    return CircuitBreaker(**kwargs)
+
+
+def _open(breaker):
+    for ok in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(ok, 0.1)
+
+
+def test_stays_closed_below_min_calls():
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_opens_at_error_rate_and_rejects():
+    transitions = []
+    breaker = _breaker(transitions)
+    _open(breaker)
+    assert breaker.state == OPEN
+    assert transitions == [(CLOSED, OPEN)]
+    assert not breaker.allow()
+    assert breaker.rejecting()
+    assert breaker.stats()["rejected"] == 2
+
+
+def test_opens_on_slow_calls():
+    breaker = _breaker(slow_rate=0.75)
+    for _ in range(4):
+        breaker.record(True, 11)
+    assert breaker.state == OPEN
+
+
+def test_probes_close_it_after_cool_down():
+    transitions = []
+    breaker = _breaker(transitions)
+    _open(breaker)
+    time.sleep(0.06)
+    assert not breaker.rejecting()
+    assert breaker.allow() and breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # both probes are out
+    breaker.record(True, 0.1)
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+    assert transitions == [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)]
+
+
+def test_failed_probe_opens_it_again():
+    breaker = _breaker()
+    _open(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["opened"] == 2
@@ -0,0 +1,33 @@
+import time
+
+from context_cache import ContextCacheManager, LocalContextBackend
+
+
+def _wait_until(cond, timeout_s=2.0):
+    stop = time.monotonic() + timeout_s
+    while not cond() and time.monotonic() < stop:
+        time.sleep(0.01)
+
+
+def test_create_runs_in_background_and_later_calls_hit():
+    backend = LocalContextBackend()
+    manager = ContextCacheManager(backend, ttl_s=60, max_entries=4)
+    assert manager.lookup("m", "prefix", 100) is None  # first sighting
+    assert manager.lookup("m", "prefix", 100) is None  # create started, this call goes uncached
+    _wait_until(lambda: manager.stats()["creates"] == 1)
+
+    handle = manager.lookup("m", "prefix", 100)
+    assert handle is not None and backend.contents[handle] == "prefix"
+    assert manager.stats()["hits"] == 1 and manager.stats()["cached_tokens"] == 100
+
+
+def test_failed_create_is_forgotten():
+    class Failing(LocalContextBackend):
+        def create(self, model_name, prefix, ttl_s):
+            raise RuntimeError("quota")
+
+    manager = ContextCacheManager(Failing(), ttl_s=60)
+    manager.lookup("m", "prefix")
+    manager.lookup("m", "prefix")
+    _wait_until(lambda: manager.stats()["create_failures"] == 1)
+    assert manager.stats()["entries"] == 0
@@ -0,0 +1,59 @@
+import pytest
+
+import db_ops_async
+import storage
+from settings import EDIT_KEYFRAME_INTERVAL
+
+UID, SID, GEN = "u1", "s1", "g1"
+
+
+@pytest.fixture
+def store(monkeypatch):
+    memory = storage.MemoryStorage()
+    monkeypatch.setattr(storage, "_storage", memory)
+    return memory
+
+
+def _texts(n):
+    words = ["I am excited to apply for the role and bring five years of backend work to your team."]
+    for v in range(1, n + 1):
+        words.append(words[-1].replace("excited", f"excited ({v})", 1) if v % 2 else words[-1] + f" Edit {v}.")
+    return words  # words[0] is the draft, words[v] is version v
+
+
+def _save_all(texts, force_full_at=()):
+    bodies = {}
+    for v in range(1, len(texts)):
+        bodies[v] = db_ops_async.run(db_ops_async.save_edit_version(
+            UID, SID, GEN, v, texts[v], texts[v - 1], force_full=v in force_full_at))
+    return bodies
+
+
+def _get(v):
+    return db_ops_async.run(db_ops_async.get_edit_version(UID, SID, GEN, v))
+
+
+def test_every_version_round_trips_across_keyframes(store):
+    last = EDIT_KEYFRAME_INTERVAL + 3
+    forced = EDIT_KEYFRAME_INTERVAL // 2
+    texts = _texts(last)
+    bodies = _save_all(texts, force_full_at={forced})
+
+    keyframes = {v for v, body in bodies.items() if body["encoding"] == "full"}
+    assert keyframes == {1, forced, EDIT_KEYFRAME_INTERVAL + 1}
+    for v in range(1, last + 1):
+        assert _get(v) == texts[v], v
+
+
+def test_missing_version_returns_none(store):
+    texts = _texts(EDIT_KEYFRAME_INTERVAL + 3)
+    _save_all(texts)
+    assert _get(len(texts)) is None
+
+    # a hole in the delta chain breaks the versions after it, up to the next keyframe
+    letters = f"users/{UID}/sessions/{SID}/letters"
+    del store._docs[f"{letters}/{GEN}_edit_v3"]
+    assert _get(2) == texts[2]
+    assert _get(3) is None
+    assert _get(4) is None
+    assert _get(EDIT_KEYFRAME_INTERVAL + 2) == texts[EDIT_KEYFRAME_INTERVAL + 2]
@@ -0,0 +1,42 @@
+from evaluate_logs import route_report
+
+
+def _draft(gen_id, route, finish_reason="STOP"):
+    return {"event": "draft_generated", "gen_id": gen_id, "route": route,
+            "usage": {"draft": {"finish_reason": finish_reason}}}
+
+
+def test_route_report_counts_kept_drafts_from_edits_not_no_edit_events():
+    records = [
+        # lite/a: no_edit on the generation rerun, then edited and rated down
+        _draft("a", "lite"),
+        {"event": "no_edit", "gen_id": "a"},
+        {"event": "edit_version", "gen_id": "a", "version": 1},
+        {"event": "final_saved", "gen_id": "a", "edit_distance": 12},
+        {"event": "feedback_submitted", "gen_id": "a", "thumb": -1},
+        # lite/b: kept as generated and rated up; an edit after the rating doesn't count
+        _draft("b", "lite", finish_reason="MAX_TOKENS"),
+        {"event": "no_edit", "gen_id": "b"},
+        {"event": "final_saved", "gen_id": "b", "edit_distance": 0},
+        {"event": "feedback_submitted", "gen_id": "b", "thumb": 1},
+        {"event": "edit_version", "gen_id": "b", "version": 1},
+        # default/c: edited only at the thumbs click (flushed final differs from the draft)
+        _draft("c", "default"),
+        {"event": "no_edit", "gen_id": "c"},
+        {"event": "final_saved", "details": {"gen_id": "c", "edit_distance": 3}},
+        {"event": "feedback_submitted", "details": {"gen_id": "c", "thumb": 1}},
+        # default/d: never edited or rated
+        _draft("d", "default"),
+        {"event": "no_edit", "gen_id": "d"},
+        # unrelated events
+        {"event": "edit_version", "gen_id": "unknown", "version": 1},
+        {"event": "llm_breaker", "state": "open"},
+    ]
+    table = route_report(records)
+    assert table["lite"] == {"n": 2, "rated": 2, "thumbs_up_rate": 0.5, "no_edit_rate": 0.5, "truncated_rate": 0.5}
+    assert table["default"] == {"n": 2, "rated": 1, "thumbs_up_rate": 1.0, "no_edit_rate": 0.5,
+                                "truncated_rate": 0.0}
+
+
+def test_route_report_without_drafts_is_empty():
+    assert route_report([{"event": "no_edit", "gen_id": "a"}]) == {}
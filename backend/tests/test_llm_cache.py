@@ -0,0 +1,23 @@
+import time
+
+from llm_cache import SQLiteTier
+
+
+def test_sqlite_tier_prunes_expired_rows_on_startup(tmp_path):
+    path = str(tmp_path / "cache.db")
+    tier = SQLiteTier(path, ttl_s=0.05)
+    tier.put("old", "a")
+    time.sleep(0.1)
+    assert tier.get("old") is None
+    assert tier.count() == 1  # ignored on read, still on disk
+
+    assert SQLiteTier(path, ttl_s=0.05).count() == 0
+
+
+def test_sqlite_tier_keeps_newest_rows_on_put(tmp_path):
+    tier = SQLiteTier(str(tmp_path / "cache.db"), ttl_s=3600, max_rows=3, prune_interval_s=0)
+    for i in range(5):
+        tier.put(f"k{i}", str(i))
+        time.sleep(0.002)
+    assert tier.count() == 3
+    assert [tier.get(f"k{i}") for i in range(5)] == [None, None, "2", "3", "4"]
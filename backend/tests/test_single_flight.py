@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def _run_followers(flights, key, fn, n):
+    results = []
+
+    def follower():
+        try:
+            results.append(flights.do(key, fn))
+        except Exception as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=follower, daemon=True) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results
+
+
+def test_concurrent_calls_share_one_result():
+    flights = SingleFlight()
+    calls = []
+    future, leader = flights.begin("k")  # hold the flight open so the others coalesce
+    assert leader
+    threads, results = _run_followers(flights, "k", lambda: calls.append(1) or "own", 3)
+    while flights.stats()["coalesced"] < 3:
+        threads[0].join(0.01)
+    flights.end("k", future, result="shared")
+    for t in threads:
+        t.join(2)
+    assert results == [("shared", True)] * 3
+    assert calls == []
+    assert flights.stats() == {"leaders": 1, "coalesced": 3, "shared_errors": 0, "in_flight": 0}
+
+
+def test_leader_error_is_shared():
+    flights = SingleFlight()
+    future, _ = flights.begin("k")
+    threads, results = _run_followers(flights, "k", lambda: "own", 2)
+    while flights.stats()["coalesced"] < 2:
+        threads[0].join(0.01)
+    flights.end("k", future, error=ValueError("boom"))
+    for t in threads:
+        t.join(2)
+    assert [type(r) for r in results] == [ValueError, ValueError]
+    assert flights.stats()["shared_errors"] == 2
+
+
+def test_nothing_is_remembered_after_the_call():
+    flights = SingleFlight()
+    assert flights.do("k", lambda: 1) == (1, False)
+    assert flights.do("k", lambda: 2) == (2, False)
+    with pytest.raises(RuntimeError):
+        flights.do("k", lambda: (_ for _ in ()).throw(RuntimeError("x")))
+    assert flights.do("k", lambda: 3) == (3, False)
+    assert flights.stats()["in_flight"] == 0
@@ -0,0 +1,15 @@
+import pytest
+
+import storage
+
+
+def test_incomplete_backend_fails_at_construction():
+    class NoCommit(storage.Storage):
+        async def set(self, path, data, merge=False): ...
+        async def get(self, path): ...
+        async def get_many(self, paths): ...
+        async def latest(self, collection, field, value, order_by): ...
+
+    with pytest.raises(TypeError):
+        NoCommit()
+    storage.MemoryStorage()
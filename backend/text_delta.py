@@ -0,0 +1,37 @@
+# text_delta.py
+"""Compact text diffs for edit history.
+
+A delta is a JSON list of [start, end, replacement] ops against the old
+text (non-overlapping, ascending): old[start:end] becomes replacement.
+Unchanged spans are not stored, so a one-word edit to a 5 KB letter costs
+a few dozen bytes.
+"""
+import json
+from Levenshtein import opcodes
+
+
+def make_delta(old: str, new: str) -> str:
+    ops = [[i1, i2, new[j1:j2]] for tag, i1, i2, j1, j2 in opcodes(old, new) if tag != "equal"]
+    return json.dumps(_merge(ops), ensure_ascii=False, separators=(",", ":"))
+
+
+def apply_delta(old: str, delta: str) -> str:
+    out, pos = [], 0
+    for start, end, replacement in json.loads(delta):
+        out.append(old[pos:start])
+        out.append(replacement)
+        pos = end
+    out.append(old[pos:])
+    return "".join(out)
+
+
+def _merge(ops: list) -> list:
+    # opcodes emits char-level runs; adjacent ones collapse into one op
+    merged = []
+    for op in ops:
+        if merged and merged[-1][1] == op[0]:
+            merged[-1][1] = op[1]
+            merged[-1][2] += op[2]
+        else:
+            merged.append(op)
+    return merged